@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+parser = argparse.ArgumentParser(description='env and learner throughput of Ape-X DQN per actor count')
+parser.add_argument('--num_actors', type=str, default='1,2,4,8',
+                    help='comma separated actor counts (default: 1,2,4,8)')
+parser.add_argument('--iters', type=int, default=20,
+                    help='learner iterations per run (default: 20)')
+args = parser.parse_args()
+
+
+def run(num_actors):
+    logdir = tempfile.mkdtemp(prefix='apex_')
+    cmd = [sys.executable, os.path.join(root, 'cartpole', 'dqn', 'apex.py'),
+           '--num_actors', str(num_actors), '--max_iter_num', str(args.iters),
+           '--goal_score', '100000', '--log_interval', '1', '--iter_updates', '100',
+           '--log_backend', 'jsonl', '--logdir', logdir]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, cwd=logdir)
+
+    with open(os.path.join(logdir, 'metrics.jsonl')) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    rates = {}
+    for name in ('samples', 'updates'):
+        # the first report includes start-up
+        values = [row['value'] for row in rows if row['tag'] == 'perf/{}_per_sec'.format(name)][1:]
+        rates[name] = float(np.median(values)) if values else float('nan')
+    # time the learner spent waiting for sampled batches, per update
+    waits = [row['value'] for row in rows if row['tag'] == 'time/replay.wait'][1:]
+    rates['wait'] = float(np.median(waits)) / 100 if waits else float('nan')
+    return rates
+
+
+if __name__ == '__main__':
+    print('{} cpus'.format(os.cpu_count()))
+    for num_actors in [int(n) for n in args.num_actors.split(',')]:
+        rates = run(num_actors)
+        print('{:3d} actors: {:9.0f} env steps/s {:7.0f} updates/s {:7.2f} ms replay wait/update'.format(
+            num_actors, rates['samples'], rates['updates'], 1000 * rates['wait']))
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.batched_envs import BATCHED_ENVS, Discrete, make_batched
+
+parser = argparse.ArgumentParser(description='parity check and throughput of the batched numpy envs')
+parser.add_argument('--env_names', type=str, default=','.join(BATCHED_ENVS),
+                    help='comma separated env ids (default: all batched envs)')
+parser.add_argument('--episodes', type=int, default=20,
+                    help='gym episodes replayed for the parity check (default: 20)')
+parser.add_argument('--num_envs', type=str, default='1,16,256',
+                    help='batch sizes timed against gym (default: 1,16,256)')
+parser.add_argument('--steps', type=int, default=20000,
+                    help='environment steps per timing run (default: 20000)')
+parser.add_argument('--atol', type=float, default=1e-8)
+args = parser.parse_args()
+
+
+def random_actions(env, rng, n):
+    if isinstance(env.action_space, Discrete):
+        return rng.randint(env.action_space.n, size=n)
+    low, high = env.action_space.low, env.action_space.high
+    # slightly outside the bounds so that clipping is exercised too
+    return rng.uniform(1.2 * low, 1.2 * high, size=(n,) + env.action_space.shape)
+
+def check_parity(env_name):
+    # replays gym episodes from gym's own initial states with the same
+    # actions and compares every observation, reward and done flag
+    import gym
+
+    gym_env = gym.make(env_name)
+    env = make_batched(env_name, 1)
+    rng = np.random.RandomState(0)
+    max_error = 0.0
+    steps = 0
+
+    for episode in range(args.episodes):
+        gym_env.seed(episode)
+        gym_obs = gym_env.reset()
+        env.reset()
+        env.set_state(np.array(gym_env.unwrapped.state, dtype=np.float64))
+        obs = env.observe(env.state)[0]
+        max_error = max(max_error, np.abs(obs - gym_obs).max())
+
+        done = False
+        while not done:
+            action = random_actions(env, rng, 1)
+            gym_obs, gym_reward, done, _ = gym_env.step(action[0])
+            obs, rewards, dones, info = env.step(action)
+            steps += 1
+
+            if dones[0]:
+                obs = info['terminal_observation']
+            error = max(np.abs(obs[0] - gym_obs).max(),
+                        abs(rewards[0] - np.asarray(gym_reward).reshape(-1)[0]))
+            max_error = max(max_error, error)
+
+            if bool(dones[0]) != bool(done):
+                raise AssertionError('{}: done flags differ at step {} of episode {}'.format(
+                    env_name, steps, episode))
+
+    gym_env.close()
+    if max_error > args.atol:
+        raise AssertionError('{}: max abs error {:.3e} over {} steps'.format(
+            env_name, max_error, steps))
+    return steps, max_error
+
+def time_gym(env_name):
+    import gym
+
+    env = gym.make(env_name)
+    env.seed(0)
+    rng = np.random.RandomState(0)
+    actions = random_actions(make_batched(env_name, 1), rng, args.steps)
+    env.reset()
+
+    start = time.perf_counter()
+    for action in actions:
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    return args.steps / (time.perf_counter() - start)
+
+def time_batched(env_name, num_envs):
+    env = make_batched(env_name, num_envs, seed=0)
+    rng = np.random.RandomState(0)
+    num_steps = max(1, args.steps // num_envs)
+    actions = [random_actions(env, rng, num_envs) for _ in range(num_steps)]
+    env.reset()
+
+    start = time.perf_counter()
+    for action in actions:
+        env.step(action)
+    return num_steps * num_envs / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    for env_name in args.env_names.split(','):
+        steps, max_error = check_parity(env_name)
+        print('{:26s} parity ok over {} steps (max abs error {:.1e})'.format(
+            env_name, steps, max_error))
+
+        gym_rate = time_gym(env_name)
+        print('{:26s} gym         : {:12.0f} steps/s'.format('', gym_rate))
+        for num_envs in [int(n) for n in args.num_envs.split(',')]:
+            rate = time_batched(env_name, num_envs)
+            print('{:26s} batched {:4d}: {:12.0f} steps/s ({:.1f}x)'.format(
+                '', num_envs, rate, rate / gym_rate))
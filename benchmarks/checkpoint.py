@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+import torch
+import torch.nn as nn
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from common.checkpoint import CheckpointManager, load_checkpoint
+
+parser = argparse.ArgumentParser(description='training thread cost of a checkpoint, torch.save vs CheckpointManager')
+parser.add_argument('--hidden_size', type=int, default=1024,
+                    help='hidden units of the checkpointed MLPs (default: 1024)')
+parser.add_argument('--saves', type=int, default=20,
+                    help='checkpoints written per method (default: 20)')
+parser.add_argument('--work', type=float, default=0.05,
+                    help='seconds of simulated training between checkpoints (default: 0.05)')
+args = parser.parse_args()
+
+
+def make_state():
+    def mlp():
+        return nn.Sequential(nn.Linear(64, args.hidden_size), nn.Tanh(),
+                             nn.Linear(args.hidden_size, args.hidden_size), nn.Tanh(),
+                             nn.Linear(args.hidden_size, 8))
+    return {'actor': mlp().state_dict(), 'critic': mlp().state_dict(),
+            'z_filter_n': 1000, 'z_filter_m': np.zeros(64), 'z_filter_s': np.ones(64)}
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def run_sync(directory, state):
+    costs = []
+    for step in range(args.saves):
+        busy(args.work)
+        start = time.perf_counter()
+        torch.save(state, os.path.join(directory, 'ckpt_{}.pth.tar'.format(step)))
+        costs.append(time.perf_counter() - start)
+    return costs
+
+def run_manager(directory, state):
+    checkpoints = CheckpointManager(directory, keep_best=3, keep_last=2)
+    costs = []
+    for step in range(args.saves):
+        busy(args.work)
+        start = time.perf_counter()
+        checkpoints.save(state, step, score=float(step % 7))
+        costs.append(time.perf_counter() - start)
+    checkpoints.close()
+    return costs, checkpoints.latest()
+
+
+if __name__ == '__main__':
+    state = make_state()
+    size = sum(t.numel() * t.element_size() for part in ('actor', 'critic') for t in state[part].values())
+    print('checkpoint of {:.1f} MB, {} saves'.format(size / 2 ** 20, args.saves))
+
+    sync_costs = run_sync(tempfile.mkdtemp(prefix='ckpt_sync_'), state)
+    directory = tempfile.mkdtemp(prefix='ckpt_manager_')
+    manager_costs, latest = run_manager(directory, state)
+    for name, costs in (('torch.save', sync_costs), ('manager', manager_costs)):
+        print('{:12s} {:8.2f} ms per checkpoint in the training thread'.format(
+            name, 1000 * float(np.median(costs))))
+    print('files kept by the manager:', len([f for f in os.listdir(directory) if f.endswith('.pth.tar')]))
+
+    for mmap in (False, True):
+        start = time.perf_counter()
+        for _ in range(10):
+            load_checkpoint(latest, mmap=mmap)
+        print('load mmap={:5s} {:8.2f} ms'.format(str(mmap), 100 * (time.perf_counter() - start)))
@@ -0,0 +1,83 @@
+import sys
+import json
+import argparse
+
+parser = argparse.ArgumentParser(description='compare two benchmark suite results')
+parser.add_argument('baseline', type=str, help='JSON written by suite.py for the reference commit')
+parser.add_argument('candidate', type=str, help='JSON written by suite.py for the commit under test')
+parser.add_argument('--threshold', type=float, default=0.1,
+                    help='relative change counted as a regression (default: 0.1)')
+
+# metric: True when higher is better
+METRICS = {
+    'env_steps_per_sec': True,
+    'updates_per_sec': True,
+    'peak_rss_mb': False,
+    'time_to_goal': False,
+}
+
+
+def relative_change(old, new, higher_is_better):
+    # positive is an improvement, negative a regression
+    if old == 0:
+        return 0.0
+    change = (new - old) / abs(old)
+    return change if higher_is_better else -change
+
+def compare(baseline, candidate, threshold):
+    rows = []
+    regressions = []
+
+    for key in sorted(set(baseline['results']) & set(candidate['results'])):
+        old = baseline['results'][key]
+        new = candidate['results'][key]
+
+        if new['returncode'] != 0 and old['returncode'] == 0:
+            regressions.append('{}: run failed'.format(key))
+            continue
+        if new['returncode'] != 0 or old['returncode'] != 0:
+            continue
+
+        for metric, higher_is_better in METRICS.items():
+            old_value, new_value = old.get(metric), new.get(metric)
+
+            if metric == 'time_to_goal' and old_value is not None and new_value is None:
+                regressions.append('{}: goal score no longer reached'.format(key))
+                continue
+            if old_value is None or new_value is None:
+                continue
+
+            change = relative_change(old_value, new_value, higher_is_better)
+            rows.append((key, metric, old_value, new_value, change))
+            if change < -threshold:
+                regressions.append('{}: {} {:.2f} -> {:.2f} ({:+.1f}%)'.format(
+                    key, metric, old_value, new_value, 100 * change))
+
+    return rows, regressions
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print('baseline : {}'.format(baseline.get('commit')))
+    print('candidate: {}'.format(candidate.get('commit')))
+    if baseline.get('scale') != candidate.get('scale'):
+        print('warning: runs used different budget scales')
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+
+    for key, metric, old_value, new_value, change in rows:
+        print('{:20s} {:18s} {:12.2f} {:12.2f} {:+8.1f}%'.format(
+            key, metric, old_value, new_value, 100 * change))
+
+    if regressions:
+        print('\n{} regression(s) beyond {:.0f}%:'.format(len(regressions), 100 * args.threshold))
+        for regression in regressions:
+            print('  ' + regression)
+        sys.exit(1)
+    print('\nno regressions beyond {:.0f}%'.format(100 * args.threshold))
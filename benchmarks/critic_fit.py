@@ -0,0 +1,76 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import algorithms
+from common.critic_fit import CRITIC_FIT_METHODS
+
+parser = argparse.ArgumentParser(description='sample-efficiency curves of the Pendulum TRPO-GAE/TNPG critic fits')
+parser.add_argument('--algos', type=str, default='pendulum/trpo_gae,pendulum/tnpg',
+                    help='comma separated trainers (default: pendulum/trpo_gae,pendulum/tnpg)')
+parser.add_argument('--methods', type=str, default=','.join(CRITIC_FIT_METHODS),
+                    help='comma separated critic fits (default: {})'.format(','.join(CRITIC_FIT_METHODS)))
+parser.add_argument('--iterations', type=int, default=50,
+                    help='training iterations per run (default: 50)')
+parser.add_argument('--critic_fit_iters', type=int, default=20)
+parser.add_argument('--points', type=int, default=10,
+                    help='rows of the printed curves (default: 10)')
+parser.add_argument('--output', type=str, default=None,
+                    help='CSV of the full curves: algo, method, iteration, samples, score, critic_loss')
+args = parser.parse_args()
+
+
+def read_curve(logdir):
+    # log/score and log/critic_loss per iteration from the jsonl metrics
+    curve = {}
+    with open(os.path.join(logdir, 'metrics.jsonl')) as f:
+        for line in f:
+            row = json.loads(line)
+            if row['tag'] in ('log/score', 'log/critic_loss'):
+                curve.setdefault(row['step'], {})[row['tag'][4:]] = row['value']
+    return [curve[step] for step in sorted(curve)]
+
+def run(algo, method):
+    module = algorithms.load(algo)
+    with tempfile.TemporaryDirectory() as logdir:
+        config = algorithms.make_config(algo, max_iter_num=args.iterations, log_backend='jsonl',
+                                        logdir=logdir, log_interval=1, goal_score=0,
+                                        critic_fit=method, critic_fit_iters=args.critic_fit_iters)
+        start = time.perf_counter()
+        module.train(config)
+        seconds = time.perf_counter() - start
+        curve = read_curve(logdir)
+    samples = config.total_sample_size
+    return [dict(point, algo=algo, method=method, iteration=i, samples=(i + 1) * samples)
+            for i, point in enumerate(curve)], seconds
+
+
+if __name__ == '__main__':
+    rows = []
+    for algo in args.algos.split(','):
+        curves = {}
+        for method in args.methods.split(','):
+            curve, seconds = run(algo, method)
+            curves[method] = (curve, seconds)
+            rows += curve
+
+        # score at evenly spaced sample counts, then the wall time of each run
+        print('{} | score by samples, one seed'.format(algo))
+        print('{:>8s} '.format('samples') + ' '.join('{:>11s}'.format(method) for method in curves))
+        length = min(len(curve) for curve, _ in curves.values())
+        for i in sorted(set(int(round(k * (length - 1) / max(args.points - 1, 1))) for k in range(args.points))):
+            line = '{:8d} '.format(curves[next(iter(curves))][0][i]['samples'])
+            print(line + ' '.join('{:11.1f}'.format(curve[i]['score']) for curve, _ in curves.values()))
+        print('{:>8s} '.format('seconds') + ' '.join('{:11.1f}'.format(seconds) for _, seconds in curves.values()))
+        print()
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['algo', 'method', 'iteration', 'samples', 'score', 'critic_loss'])
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+parser = argparse.ArgumentParser(description='wall time per iteration of data-parallel MuJoCo PPO')
+parser.add_argument('--env_name', type=str, default='HopperStandIn-v0',
+                    help='env of every rank (default: HopperStandIn-v0)')
+parser.add_argument('--world_sizes', type=str, default='1,2,4',
+                    help='comma separated numbers of ranks (default: 1,2,4)')
+parser.add_argument('--total_sample_size', type=int, default=2048,
+                    help='samples per iteration over all ranks (default: 2048)')
+parser.add_argument('--iters', type=int, default=5,
+                    help='iterations timed per world size (default: 5)')
+parser.add_argument('--port', type=int, default=29600,
+                    help='first rendezvous port, one per run (default: 29600)')
+args = parser.parse_args()
+
+
+def run(world_size, iters, port):
+    cmd = [sys.executable, os.path.join(root, 'mujoco', 'ppo', 'main.py'),
+           '--env_name', args.env_name, '--max_iter_num', str(iters),
+           '--total_sample_size', str(args.total_sample_size), '--log_backend', 'none',
+           '--world_size', str(world_size), '--spawn_ranks',
+           '--dist_url', 'tcp://127.0.0.1:{}'.format(port)]
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, cwd=os.getcwd())
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    print('{} samples per iteration on {} cpus'.format(args.total_sample_size, os.cpu_count()))
+    port = args.port
+    baseline = None
+    for world_size in [int(w) for w in args.world_sizes.split(',')]:
+        # the difference of two run lengths cancels start-up and rendezvous
+        short = run(world_size, 1, port)
+        full = run(world_size, 1 + args.iters, port + 1)
+        port += 2
+        per_iter = (full - short) / args.iters
+        baseline = baseline or per_iter
+        print('world size {:3d}: {:7.3f} s/iter ({:.2f}x)'.format(world_size, per_iter, baseline / per_iter))
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+import torch
+import torch.optim as optim
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import algorithms
+from common.batched_envs import make_batched
+from common.ensemble import Ensemble, StackedReplay
+from common.rollout_policy import RolloutPolicy
+from common.runner import ReplayBuffer, transition_dtypes
+
+parser = argparse.ArgumentParser(description='throughput of multi-seed DQN ensembles against one seed per process')
+parser.add_argument('--algo', type=str, default='cartpole/dqn',
+                    help='cartpole/dqn or cartpole/ddqn (default: cartpole/dqn)')
+parser.add_argument('--num_seeds', type=str, default='1,2,4,8,16,32',
+                    help='comma separated ensemble sizes (default: 1,2,4,8,16,32)')
+parser.add_argument('--steps', type=int, default=2000,
+                    help='env steps with an update each, per run (default: 2000)')
+parser.add_argument('--threads', type=int, default=1,
+                    help='torch threads, 1 measures throughput per core (default: 1)')
+args = parser.parse_args()
+
+
+def fill(env, num_envs, n):
+    # random transitions so every timed step also trains
+    rng = np.random.RandomState(0)
+    state = env.reset()
+    for _ in range(n):
+        actions = rng.randint(2, size=num_envs)
+        next_state, rewards, dones, _ = env.step(actions)
+        yield state, actions, rewards, next_state, 1 - dones
+        state = next_state
+
+def time_single(module, config):
+    # the per-process path: one QNet acting through a RolloutPolicy, a
+    # ReplayBuffer and train_model
+    env = make_batched('CartPole-v1', 1, seed=0)
+    q_net = module.QNet(4, 2, config)
+    target_q_net = module.QNet(4, 2, config)
+    optimizer = optim.Adam(q_net.parameters(), lr=0.001)
+    replay = ReplayBuffer(10000, transition_dtypes('float32', np.int8))
+    for state, action, reward, next_state, mask in fill(env, 1, config.batch_size):
+        replay.append((state, action[0], reward[0], next_state, mask[0]))
+
+    policy = RolloutPolicy(q_net, 'epsilon_greedy', (1, 4), squeeze=True, epsilon=lambda: 0.1)
+    state = env.reset()
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        action = policy(state)
+        next_state, reward, done, _ = env.step(np.array([action]))
+        replay.append((state, action, reward[0], next_state, 1 - done[0]))
+        state = next_state
+
+        mini_batch = replay.sample(config.batch_size)
+        module.train_model(q_net, target_q_net, optimizer, mini_batch, config)
+    return args.steps / (time.perf_counter() - start)
+
+def time_ensemble(module, config, num_seeds, use_vmap):
+    env = make_batched('CartPole-v1', num_seeds, seed=0)
+    make_q_net = lambda: module.QNet(4, 2, config)
+    q_nets = Ensemble.from_factory(make_q_net, num_seeds, seed=0, use_vmap=use_vmap)
+    target_q_nets = Ensemble.from_factory(make_q_net, num_seeds, seed=0, use_vmap=use_vmap)
+    optimizer = optim.Adam(q_nets.parameters(), lr=0.001)
+    replay = StackedReplay(num_seeds, 10000, {
+        'state': ((4,), np.float32), 'action': ((), np.int64), 'reward': ((), np.float32),
+        'next_state': ((4,), np.float32), 'mask': ((), np.float32)}, seed=0)
+    for state, actions, rewards, next_state, masks in fill(env, num_seeds, config.batch_size):
+        replay.append(state=state, action=actions, reward=rewards, next_state=next_state, mask=masks)
+
+    rng = np.random.RandomState(0)
+    state = env.reset()
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        with torch.no_grad():
+            actions = q_nets(torch.Tensor(state)).argmax(1).numpy()
+        explore = rng.rand(num_seeds) <= 0.1
+        actions[explore] = rng.randint(2, size=explore.sum())
+        next_state, rewards, dones, _ = env.step(actions)
+        replay.append(state=state, action=actions, reward=rewards, next_state=next_state,
+                      mask=1 - dones)
+        state = next_state
+
+        batch = replay.sample(config.batch_size)
+        module.train_seeds_model(q_nets, target_q_nets, optimizer, batch, config)
+    return args.steps * num_seeds / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    torch.set_num_threads(args.threads)
+    module = algorithms.load(args.algo)
+    config = module.Config()
+
+    single = time_single(module, config)
+    print('{} on {} thread(s), one env step and one update per seed and step'.format(
+        args.algo, args.threads))
+    print('one seed per process : {:10.0f} seed-steps/s'.format(single))
+    for num_seeds in [int(n) for n in args.num_seeds.split(',')]:
+        for name, use_vmap in (('bmm', False), ('vmap', True)):
+            rate = time_ensemble(module, config, num_seeds, use_vmap)
+            print('ensemble of {:4d} {:4s}: {:10.0f} seed-steps/s ({:5.1f}x, {:3.0f}% of linear)'.format(
+                num_seeds, name, rate, rate / single, 100 * rate / (single * num_seeds)))
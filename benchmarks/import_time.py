@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.append(root)
+from common.algorithms import ALGORITHMS
+
+parser = argparse.ArgumentParser(description='cold-start cost of importing every algorithm')
+parser.add_argument('--algos', type=str, default='all',
+                    help='comma separated algorithm keys (default: all)')
+parser.add_argument('--repeat', type=int, default=3,
+                    help='fresh interpreters per measurement, the minimum is reported (default: 3)')
+
+# optional dependencies the training modules only import once train() runs
+HEAVY_MODULES = ['gym', 'tensorboardX', 'cvxpy', 'pylab']
+
+# runs in a fresh interpreter: time one import and list the heavy modules it pulled in
+PROBE = '''
+import sys, time, json
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [m for m in {heavy!r} if m in sys.modules]]))
+'''
+
+
+def probe(statement, repeat):
+    best, loaded = None, []
+    for _ in range(repeat):
+        code = PROBE.format(root=root, statement=statement, heavy=HEAVY_MODULES)
+        output = subprocess.run([sys.executable, '-c', code], cwd=root, check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True).stdout
+        elapsed, loaded = json.loads(output.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best, loaded
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    names = list(ALGORITHMS) if args.algos == 'all' else args.algos.split(',')
+
+    # what an import paid before train() was split out, per dependency
+    deferred = {}
+    for module in HEAVY_MODULES:
+        try:
+            deferred[module], _ = probe('import ' + module, args.repeat)
+        except subprocess.CalledProcessError:
+            deferred[module] = None
+    torch_time, _ = probe('import torch', args.repeat)
+
+    print('baseline: import torch {:.3f} s'.format(torch_time))
+    for module, seconds in deferred.items():
+        print('deferred: import {:12s} {}'.format(
+            module, 'not installed' if seconds is None else '{:.3f} s'.format(seconds)))
+    print()
+
+    for name in names:
+        seconds, loaded = probe('from common.algorithms import load; load({!r})'.format(name), args.repeat)
+        print('{:20s} {:.3f} s  heavy modules loaded: {}'.format(name, seconds, ', '.join(loaded) or 'none'))
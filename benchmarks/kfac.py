@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+import torch
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(root)
+sys.path.insert(0, os.path.join(root, 'mujoco', 'tnpg'))
+
+from model import Actor
+from utils.utils import hessian_vector_product
+from common.conjugate_gradient import ConjugateGradient
+from common.kfac import KFAC
+from common.natural_gradient import fisher_solve
+
+parser = argparse.ArgumentParser(description='natural gradient of the MuJoCo TNPG/TRPO actor: 10 CG steps against KFAC')
+parser.add_argument('--hidden_sizes', type=str, default='16,32,64,128,256',
+                    help='comma separated actor hidden sizes (default: 16,32,64,128,256)')
+parser.add_argument('--samples', type=int, default=2048,
+                    help='states per update (default: 2048)')
+parser.add_argument('--state_size', type=int, default=11,
+                    help='Hopper observation size (default: 11)')
+parser.add_argument('--action_size', type=int, default=3,
+                    help='Hopper action size (default: 3)')
+parser.add_argument('--exact_max_params', type=int, default=6000,
+                    help='largest actor compared against the exact solve (default: 6000)')
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--threads', type=int, default=1)
+args = parser.parse_args()
+
+
+class ActorArgs:
+    def __init__(self, hidden_size):
+        self.hidden_size = hidden_size
+
+def median_time(fn):
+    fn()
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return 1e3 * float(np.median(times))
+
+def cosine(x, y):
+    return float(torch.dot(x, y) / (x.norm() * y.norm()))
+
+def measure(hidden_size):
+    torch.manual_seed(0)
+    actor = Actor(args.state_size, args.action_size, ActorArgs(hidden_size))
+    states = torch.randn(args.samples, args.state_size)
+    num_params = sum(param.numel() for param in actor.parameters())
+    # a policy gradient rather than a random vector, so the comparison
+    # weighs the directions the updates actually take
+    mu, _ = actor(states)
+    g = torch.autograd.grad((mu * torch.randn_like(mu)).mean(), actor.parameters())
+    g = torch.cat([grad.reshape(-1) for grad in g])
+
+    cg_solve = lambda: ConjugateGradient().solve(
+        lambda p: hessian_vector_product(actor, states, p, cg_damping=1e-1), g)
+
+    kfac = KFAC(actor, stat_decay=0.0)
+    def kfac_step():
+        kfac.update_factors(states)
+        return kfac.solve(g)
+
+    cg = median_time(cg_solve)
+    kf = median_time(kfac_step)
+    line = '{:6d} {:7d} | cg {:8.1f} ms | kfac {:7.1f} ms | {:5.1f}x'.format(
+        hidden_size, num_params, cg, kf, cg / kf)
+
+    # (F + 0.1 I) x = g solved exactly, when the Fisher still fits
+    x_cg, x_kfac = cg_solve(), kfac_step()
+    if num_params <= args.exact_max_params:
+        exact = fisher_solve(actor, states, g)
+        line += ' | cosine to exact: cg {:.3f}, kfac {:.3f}'.format(cosine(x_cg, exact), cosine(x_kfac, exact))
+    else:
+        line += ' | cosine kfac to cg {:.3f}'.format(cosine(x_kfac, x_cg))
+    residual = hessian_vector_product(actor, states, x_kfac, cg_damping=1e-1) - g
+    print(line + ' | kfac residual {:.2f}'.format(float(residual.norm() / g.norm())))
+
+
+if __name__ == '__main__':
+    torch.set_num_threads(args.threads)
+    print('hidden  params | median of {} natural gradients over {} states'.format(args.repeat, args.samples))
+    for hidden_size in args.hidden_sizes.split(','):
+        measure(int(hidden_size))
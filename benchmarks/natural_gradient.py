@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+import torch
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(root)
+sys.path.insert(0, os.path.join(root, 'pendulum', 'trpo'))
+
+from model import Actor
+from utils import hessian_vector_product
+from common.conjugate_gradient import ConjugateGradient
+from common.natural_gradient import DIRECT_MAX_SIZE, fisher_solve
+
+parser = argparse.ArgumentParser(description='natural gradient solve: 10 CG steps against the explicit Fisher and Cholesky')
+parser.add_argument('--hidden_sizes', type=str, default='4,8,16,24,32,48,64',
+                    help='comma separated actor hidden sizes, at the full batch (default: 4,8,16,24,32,48,64)')
+parser.add_argument('--batch_sizes', type=str, default='128,256,512,1024',
+                    help='comma separated batch sizes, at hidden_size 64 (default: 128,256,512,1024)')
+parser.add_argument('--samples', type=int, default=2048,
+                    help='states per update for the hidden size sweep (default: 2048)')
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--threads', type=int, default=1)
+args = parser.parse_args()
+
+
+class ActorArgs:
+    def __init__(self, hidden_size):
+        self.hidden_size = hidden_size
+
+def median_time(fn):
+    fn()
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return 1e3 * float(np.median(times))
+
+def residual(actor, states, x, b):
+    return float((hessian_vector_product(actor, states, x) - b).norm() / b.norm())
+
+def measure(hidden_size, samples):
+    torch.manual_seed(0)
+    actor = Actor(3, 1, ActorArgs(hidden_size))
+    states = torch.randn(samples, 3)
+    num_params = sum(param.numel() for param in actor.parameters())
+    b = torch.randn(num_params)
+    cg_solve = lambda: ConjugateGradient().solve(lambda p: hessian_vector_product(actor, states, p), b)
+
+    cg = median_time(cg_solve)
+    direct = median_time(lambda: fisher_solve(actor, states, b))
+    side = min(num_params, samples)
+    print('{:6d} {:7d} {:6d} {:6d} | cg {:8.1f} ms (residual {:.1e}) | direct {:8.1f} ms (residual {:.1e}) | {}'.format(
+        hidden_size, samples, num_params, side, cg,
+        residual(actor, states, cg_solve(), b),
+        direct, residual(actor, states, fisher_solve(actor, states, b), b),
+        'direct' if direct < cg else 'cg'))
+    return side, direct < cg
+
+
+if __name__ == '__main__':
+    torch.set_num_threads(args.threads)
+    print('hidden samples params  side | median of {} solves, residual |(F + 0.1 I) x - g| / |g|'.format(args.repeat))
+    results = [measure(int(h), args.samples) for h in args.hidden_sizes.split(',')]
+    results += [measure(64, int(n)) for n in args.batch_sizes.split(',')]
+
+    faster = [side for side, direct in results if direct]
+    slower = [side for side, direct in results if not direct]
+    print('direct faster up to a side of {}, cg faster from {}; auto switches at DIRECT_MAX_SIZE = {}'.format(
+        max(faster) if faster else None, min(slower) if slower else None, DIRECT_MAX_SIZE))
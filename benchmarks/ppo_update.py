@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+import torch
+import torch.optim as optim
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(root)
+sys.path.insert(0, os.path.join(root, 'mujoco', 'ppo'))
+
+from common.actor_critic import FusedActorCritic, evaluate
+from model import Actor, Critic
+from ppo import train_model, get_gae, ppo_loss
+from utils.utils import log_prob_density
+
+parser = argparse.ArgumentParser(description='PPO update micro-benchmark')
+parser.add_argument('--state_size', type=int, default=11)
+parser.add_argument('--action_size', type=int, default=3)
+parser.add_argument('--hidden_size', type=int, default=64)
+parser.add_argument('--total_sample_size', type=int, default=2048)
+parser.add_argument('--batch_size', type=int, default=64)
+parser.add_argument('--model_update_num', type=int, default=10)
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--compile', action="store_true", default=False,
+                    help='also time the torch.compile path')
+args = parser.parse_args()
+args.gamma, args.lamda, args.clip_param, args.max_is_weight = 0.99, 0.98, 0.2, 1.0
+args.l2_rate, args.target_kl = 1e-3, None
+
+
+def make_memory(n):
+    memory = np.empty((n, 4), dtype=object)
+    for i in range(n):
+        memory[i] = [np.random.randn(args.state_size), np.random.randn(args.action_size),
+                     np.random.randn(), float(np.random.rand() > 0.01)]
+    return memory
+
+def legacy_train_model(actor, critic, memory, actor_optim, critic_optim):
+    # the previous update: tensors rebuilt from numpy for every minibatch
+    # and the joint loss backpropagated twice
+    states = np.vstack(memory[:, 0])
+    actions = np.vstack(memory[:, 1])
+    rewards = list(memory[:, 2])
+    masks = list(memory[:, 3])
+
+    old_values = critic(torch.Tensor(states))
+    returns, advants = get_gae(rewards, masks, old_values, args)
+
+    mu, std = actor(torch.Tensor(states))
+    old_policy = log_prob_density(torch.Tensor(actions), mu, std)
+
+    n = len(states)
+    arr = np.arange(n)
+
+    for _ in range(args.model_update_num):
+        np.random.shuffle(arr)
+
+        for i in range(n // args.batch_size):
+            batch_index = torch.LongTensor(arr[args.batch_size * i : args.batch_size * (i + 1)])
+
+            inputs = torch.Tensor(states)[batch_index]
+            actions_samples = torch.Tensor(actions)[batch_index]
+            loss, _ = ppo_loss(actor, critic, args, inputs, actions_samples,
+                               returns.unsqueeze(1)[batch_index],
+                               advants.unsqueeze(1)[batch_index],
+                               old_values[batch_index].detach(),
+                               old_policy.detach()[batch_index],
+                               torch.ones(len(batch_index), 1))
+
+            critic_optim.zero_grad()
+            actor_optim.zero_grad()
+            loss.backward(retain_graph=True)
+            loss.backward()
+            critic_optim.step()
+            actor_optim.step()
+
+def timeit(fn, memory):
+    actor = Actor(args.state_size, args.action_size, args)
+    critic = Critic(args.state_size, args)
+    actor_optim = optim.Adam(actor.parameters(), lr=3e-4)
+    critic_optim = optim.Adam(critic.parameters(), lr=3e-4)
+
+    fn(actor, critic, memory, actor_optim, critic_optim)  # warm-up
+
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        fn(actor, critic, memory, actor_optim, critic_optim)
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+def fused_engine(shared_trunk):
+    # the --actor_critic fused/shared learner step, including the copy back
+    def engine(actor, critic, memory, actor_optim, critic_optim):
+        args.compile = False
+        fused = FusedActorCritic(actor, critic, shared_trunk=shared_trunk)
+        train_model(fused, None, memory, optim.Adam(fused.parameters(), lr=3e-4), None, args)
+        fused.copy_to(actor, critic)
+    return engine
+
+def minibatch_costs(n=2000):
+    # forward and forward + backward of one minibatch through evaluate()
+    actor = Actor(args.state_size, args.action_size, args)
+    critic = Critic(args.state_size, args)
+    models = [('separate', actor, critic), ('fused', FusedActorCritic(actor, critic), None),
+              ('shared', FusedActorCritic(actor, critic, shared_trunk=True), None)]
+    inputs = torch.randn(args.batch_size, args.state_size)
+    costs = []
+    for name, model, value_model in models:
+        forward, backward = [], []
+        for _ in range(n):
+            start = time.perf_counter()
+            mu, std, values = evaluate(model, value_model, inputs)
+            middle = time.perf_counter()
+            (mu.sum() + values.sum()).backward()
+            end = time.perf_counter()
+            forward.append(middle - start)
+            backward.append(end - start)
+        costs.append((name, 1e6 * np.median(forward), 1e6 * np.median(backward)))
+    return costs
+
+
+if __name__ == '__main__':
+    torch.manual_seed(0)
+    np.random.seed(0)
+    memory = make_memory(args.total_sample_size)
+    run_compiled = args.compile
+
+    def engine(actor, critic, memory, actor_optim, critic_optim, compile=False):
+        args.compile = compile
+        train_model(actor, critic, memory, actor_optim, critic_optim, args)
+
+    legacy = timeit(legacy_train_model, memory)
+    fast = timeit(engine, memory)
+    print('legacy update : {:.3f} s'.format(legacy))
+    print('engine update : {:.3f} s ({:.2f}x)'.format(fast, legacy / fast))
+
+    for name, shared_trunk in (('fused', False), ('shared trunk', True)):
+        fused = timeit(fused_engine(shared_trunk), memory)
+        print('{:14s}: {:.3f} s ({:.2f}x)'.format(name, fused, legacy / fused))
+    for name, forward, backward in minibatch_costs():
+        print('minibatch {:8s} forward {:6.1f} us | forward + backward {:6.1f} us'.format(name, forward, backward))
+
+    if run_compiled:
+        compiled = timeit(lambda *a: engine(*a, compile=True), memory)
+        print('compiled      : {:.3f} s ({:.2f}x)'.format(compiled, legacy / compiled))
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from common.runner import ReplayBuffer
+from common.memmap_replay import MemmapReplayBuffer
+
+parser = argparse.ArgumentParser(description='sample latency of the in-RAM and memmap replay buffers per capacity')
+parser.add_argument('--capacities', type=str, default='10000,1000000,10000000,100000000',
+                    help='comma separated capacities (default: 1e4,1e6,1e7,1e8)')
+parser.add_argument('--ram_limit', type=int, default=1000000,
+                    help='largest capacity also run with the in-RAM buffer (default: 1000000)')
+parser.add_argument('--state_size', type=int, default=3,
+                    help='observation size, float32 (default: 3)')
+parser.add_argument('--batch_size', type=int, default=256)
+parser.add_argument('--samples', type=int, default=200,
+                    help='batches timed per configuration (default: 200)')
+parser.add_argument('--dir', type=str, default=None,
+                    help='directory for the memmap files (default: a temp directory)')
+args = parser.parse_args()
+
+
+def columns(n, offset=0):
+    states = np.arange(offset, offset + n, dtype=np.float32)[:, None].repeat(args.state_size, 1)
+    return [states, np.zeros((n, 1), dtype=np.float32), np.ones(n, dtype=np.float32),
+            states + 1, np.ones(n, dtype=np.int8)]
+
+def fill_memmap(replay, capacity):
+    chunk = 1000000
+    for start in range(0, capacity, chunk):
+        replay.extend(columns(min(chunk, capacity - start), start))
+    for column in replay.columns:
+        column.flush()
+
+def fill_ram(replay, capacity):
+    states, actions, rewards, next_states, masks = columns(capacity)
+    for i in range(capacity):
+        replay.append((states[i], actions[i], rewards[i], next_states[i], masks[i]))
+
+def latency(replay):
+    replay.sample(args.batch_size)
+    times = []
+    for _ in range(args.samples):
+        start = time.perf_counter()
+        replay.sample(args.batch_size)
+        times.append(time.perf_counter() - start)
+    return 1e6 * float(np.median(times)), 1e6 * float(np.percentile(times, 99))
+
+
+if __name__ == '__main__':
+    root = args.dir or tempfile.mkdtemp(prefix='replay_')
+    print('batch {}, {} float32 state, median / p99 us per sample()'.format(args.batch_size, args.state_size))
+    for capacity in [int(float(c)) for c in args.capacities.split(',')]:
+        results = []
+        if capacity <= args.ram_limit:
+            replay = ReplayBuffer(capacity)
+            fill_ram(replay, capacity)
+            results.append(('ram', latency(replay)))
+
+        directory = os.path.join(root, str(capacity))
+        replay = MemmapReplayBuffer(capacity, directory)
+        start = time.perf_counter()
+        fill_memmap(replay, capacity)
+        fill = time.perf_counter() - start
+        for sort_indices in (False, True):
+            replay.sort_indices = sort_indices
+            results.append(('memmap sorted' if sort_indices else 'memmap', latency(replay)))
+
+        line = '{:>11,d}: '.format(capacity)
+        line += ' | '.join('{} {:.0f}/{:.0f}'.format(name, median, p99) for name, (median, p99) in results)
+        print(line + ' | fill {:.1f} s'.format(fill))
+        del replay
+        shutil.rmtree(directory)
+    if args.dir is None:
+        shutil.rmtree(root)
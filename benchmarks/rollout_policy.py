@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import algorithms
+from common.rollout_policy import RolloutPolicy
+
+parser = argparse.ArgumentParser(description='per-step action latency of the old acting path against RolloutPolicy')
+parser.add_argument('--steps', type=int, default=20000,
+                    help='policy calls timed per path (default: 20000)')
+parser.add_argument('--num_envs', type=int, default=8,
+                    help='batch of the vectorized mujoco case (default: 8)')
+parser.add_argument('--threads', type=int, default=1,
+                    help='torch threads, acting runs in one (default: 1)')
+args = parser.parse_args()
+
+
+def latency(policy, states):
+    for state in states[:100]:
+        policy(state)
+    times = np.empty(len(states))
+    for i, state in enumerate(states):
+        start = time.perf_counter()
+        policy(state)
+        times[i] = time.perf_counter() - start
+    return 1e6 * float(np.median(times)), 1e6 * float(np.percentile(times, 99))
+
+def no_grad(policy):
+    # what EpisodeCollector and collect_vectorized did around the old path
+    def wrapped(state):
+        with torch.no_grad():
+            return policy(state)
+    return wrapped
+
+def cases():
+    # (name, old policy, new policy, input shape), the old policies are the
+    # trainers' closures from before RolloutPolicy
+    module = algorithms.load('pendulum/ppo')
+    actor = module.Actor(3, 1, module.Config())
+    def old(state):
+        mu, std = actor(torch.Tensor(state))
+        return torch.distributions.Normal(mu, std).sample().data.numpy()
+    yield 'pendulum/ppo gaussian', old, RolloutPolicy(actor, 'gaussian', (1, 3)), (1, 3)
+
+    module = algorithms.load('cartpole/dqn')
+    q_net = module.QNet(4, 2, module.Config())
+    def old(state):
+        q_values = q_net(torch.Tensor(state))
+        if np.random.rand() <= 0.1:
+            return random.randrange(2)
+        return torch.max(q_values, 1)[1].numpy()[0]
+    new = RolloutPolicy(q_net, 'epsilon_greedy', (1, 4), squeeze=True, epsilon=lambda: 0.1)
+    yield 'cartpole/dqn epsilon-greedy', old, new, (1, 4)
+
+    module = algorithms.load('mujoco/ppo')
+    actor = module.Actor(17, 6, module.Config())
+    def old(state):
+        mu, std = actor(torch.Tensor(state).unsqueeze(0))
+        return torch.normal(mu, std).data.numpy()[0]
+    yield 'mujoco/ppo gaussian 17x6', old, RolloutPolicy(actor, 'gaussian', (1, 17), squeeze=True), (17,)
+
+    def old(states):
+        mu, std = actor(torch.Tensor(np.stack(states)))
+        return torch.normal(mu, std).data.numpy()
+    new = RolloutPolicy(actor, 'gaussian', (args.num_envs, 17))
+    yield 'mujoco/ppo gaussian x{} envs'.format(args.num_envs), old, new, (args.num_envs, 17)
+
+
+if __name__ == '__main__':
+    torch.set_num_threads(args.threads)
+    rng = np.random.RandomState(0)
+    print('median / p99 us per policy call, {} calls'.format(args.steps))
+    for name, old, new, shape in cases():
+        states = list(rng.randn(args.steps, *shape))
+        results = [('autograd', latency(old, states)), ('no_grad', latency(no_grad(old), states)),
+                   ('RolloutPolicy', latency(new, states))]
+        line = '{:30s} '.format(name)
+        line += ' | '.join('{} {:.1f}/{:.1f}'.format(path, median, p99) for path, (median, p99) in results)
+        speedup = results[1][1][0] / results[2][1][0]
+        print(line + ' | {:.2f}x over no_grad'.format(speedup))
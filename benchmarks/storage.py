@@ -0,0 +1,67 @@
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from common.runner import ReplayBuffer, transition_dtypes
+
+parser = argparse.ArgumentParser(description='replay memory per transition and precision loss per storage dtype')
+parser.add_argument('--transitions', type=int, default=10000,
+                    help='transitions stored per configuration (default: 10000)')
+parser.add_argument('--scale', type=float, default=5.0,
+                    help='observations are uniform in [-scale, scale], 5 is the ZFilter clip (default: 5)')
+args = parser.parse_args()
+
+# worst relative rounding error of a normal number, half an ulp
+EPSILON = {'float64': 2.0 ** -53, 'float32': 2.0 ** -24, 'float16': 2.0 ** -11}
+
+def deque_bytes(transition):
+    # what one (state, action, reward, next_state, mask) tuple costs in a
+    # deque: the tuple, its numpy arrays and python numbers, and a pointer
+    size = sys.getsizeof(transition) + 8
+    for value in transition:
+        size += sys.getsizeof(value)
+    return size
+
+def transitions(state_size, discrete, rng):
+    for _ in range(args.transitions):
+        state = rng.uniform(-args.scale, args.scale, (1, state_size))
+        action = int(rng.randint(2)) if discrete else rng.uniform(-2, 2, 1)
+        yield (state, action, float(rng.randn()), state + rng.randn(1, state_size), int(rng.rand() < 0.99))
+
+def measure(name, state_size, discrete):
+    rng = np.random.RandomState(0)
+    data = list(transitions(state_size, discrete, rng))
+    print('{} ({} state values, {} actions)'.format(name, state_size, 'discrete' if discrete else 'continuous'))
+    print('  deque of tuples  {:5.0f} B/transition'.format(deque_bytes(data[0])))
+
+    failed = False
+    for precision in ('float64', 'float32', 'float16'):
+        replay = ReplayBuffer(args.transitions, transition_dtypes(precision, np.int8 if discrete else None))
+        for transition in data:
+            replay.append(transition)
+        per_transition = sum(column.nbytes for column in replay.columns) / replay.capacity
+
+        states = np.stack([t[0] for t in data])
+        stored = replay.columns[0].astype(np.float64)
+        error = np.abs(stored - states) / np.maximum(np.abs(states), 1e-12)
+        max_error = float(error[np.abs(states) > 2.0 ** -14].max())
+        exact = all(np.array_equal(replay.columns[i].astype(np.int64), [t[i] for t in data])
+                    for i in ((1, 4) if discrete else (4,)))
+        ok = max_error <= EPSILON[precision] and exact
+        failed |= not ok
+
+        batch = replay.sample(32)
+        print('  {:8s} columns {:5.0f} B/transition | max rel. state error {:.2e} (bound {:.2e}) '
+              '| actions/masks exact: {} | gathered as {}'.format(
+                  precision, per_transition, max_error, EPSILON[precision], exact,
+                  ', '.join(str(column.dtype) for column in batch)))
+    return failed
+
+
+if __name__ == '__main__':
+    failed = measure('CartPole DQN', 4, True)
+    failed |= measure('Pendulum DDPG/SAC', 3, False)
+    if failed:
+        sys.exit('precision loss above the rounding bound')
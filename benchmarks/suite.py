@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import importlib.util
+import numpy as np
+
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+parser = argparse.ArgumentParser(description='benchmark suite for every trainer in the repo')
+parser.add_argument('--algos', type=str, default='all',
+                    help='comma separated algorithm names or keys, e.g. "ppo,cartpole/dqn" (default: all)')
+parser.add_argument('--scale', type=float, default=1.0,
+                    help='multiplier on every iteration budget (default: 1.0)')
+parser.add_argument('--output', type=str, default='benchmark.json',
+                    help='path of the JSON result file (default: benchmark.json)')
+parser.add_argument('--timeout', type=float, default=3600,
+                    help='seconds before a single run is killed (default: 3600)')
+parser.add_argument('--keep_workdir', action="store_true", default=False,
+                    help='keep the per-run working directories for inspection')
+parser.add_argument('--list', action="store_true", default=False,
+                    help='print the registered benchmarks and exit')
+
+# key: (script, iteration budget, extra args, demonstrations)
+# the budget is in the script's own unit, episodes for the episodic
+# trainers and sampling iterations for the batch trainers
+BENCHMARKS = {
+    'cartpole/dqn': ('cartpole/dqn/train.py', 300, [], None),
+    'cartpole/ddqn': ('cartpole/ddqn/train.py', 300, [], None),
+    'cartpole/a2c': ('cartpole/a2c/train.py', 300, [], None),
+    'cartpole/apex': ('cartpole/dqn/apex.py', 30, ['--log_interval', '1'], None),
+    'cartpole/impala': ('cartpole/a2c/impala.py', 100, [], None),
+    'pendulum/ddpg': ('pendulum/ddpg/train.py', 50, [], None),
+    'pendulum/sac': ('pendulum/sac/train.py', 50, [], None),
+    'pendulum/ppo': ('pendulum/ppo/train.py', 20, ['--log_interval', '1'], None),
+    'pendulum/ppo_gae': ('pendulum/ppo_gae/train.py', 20, ['--log_interval', '1'], None),
+    'pendulum/trpo': ('pendulum/trpo/train.py', 20, ['--log_interval', '1'], None),
+    'pendulum/trpo_gae': ('pendulum/trpo_gae/train.py', 20, ['--log_interval', '1'], None),
+    'pendulum/tnpg': ('pendulum/tnpg/train.py', 20, ['--log_interval', '1'], None),
+    'mountaincar/ddpg': ('mountaincar/ddpg/train.py', 20, [], None),
+    'mountaincar/sac': ('mountaincar/sac/train.py', 20, [], None),
+    'mountaincar/app': ('mountaincar/app/train.py', 2001, [], 'npy'),
+    'mountaincar/maxent': ('mountaincar/maxent/train.py', 2001, [], 'npy'),
+    'mujoco/ppo': ('mujoco/ppo/main.py', 10, [], None),
+    'mujoco/trpo': ('mujoco/trpo/train.py', 10, [], None),
+    'mujoco/tnpg': ('mujoco/tnpg/train.py', 10, [], None),
+    'mujoco/gail': ('mujoco/gail/main.py', 10, [], 'pickle'),
+    'mujoco/vail': ('mujoco/vail/main.py', 10, [], 'pickle'),
+}
+
+
+def select(names):
+    if names == 'all':
+        return list(BENCHMARKS)
+    keys = []
+    for name in names.split(','):
+        name = name.strip()
+        matched = [key for key in BENCHMARKS if key == name or key.split('/')[1] == name]
+        if not matched:
+            raise ValueError('unknown benchmark: {}'.format(name))
+        keys.extend(key for key in matched if key not in keys)
+    return keys
+
+def mujoco_available():
+    return importlib.util.find_spec('mujoco_py') is not None
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=root,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def prepare_workdir(key, demo, workdir):
+    # trainers write checkpoints and demos relative to the working directory,
+    # so every run gets its own and the repo tree stays clean
+    algo_dir = os.path.join(root, key)
+    demo_dir = os.path.join(algo_dir, 'expert_demo')
+    for name in ('learning_curves', 'results'):
+        os.makedirs(os.path.join(workdir, name))
+
+    if demo is None:
+        return False
+    if os.path.isdir(demo_dir):
+        shutil.copytree(demo_dir, os.path.join(workdir, 'expert_demo'))
+        return False
+
+    # no recorded demonstrations: random state-action pairs are enough to
+    # time the discriminator, but the scores are meaningless
+    os.makedirs(os.path.join(workdir, 'expert_demo'))
+    demonstrations = np.random.RandomState(0).randn(5000, 11 + 3)
+    with open(os.path.join(workdir, 'expert_demo', 'expert_demo.p'), 'wb') as f:
+        pickle.dump((demonstrations, None), f)
+    return True
+
+def read_metrics(logdir):
+    path = os.path.join(logdir, 'metrics.jsonl')
+    rows = []
+    if os.path.exists(path):
+        with open(path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return rows
+
+def steady_rate(rows, tag):
+    # the first report includes warm-up (model construction, first
+    # allocations), so it only counts when there is nothing else
+    values = [row['value'] for row in rows if row['tag'] == tag]
+    if len(values) > 1:
+        values = values[1:]
+    return float(np.median(values)) if values else None
+
+def run(key, args, use_mujoco):
+    script, iters, extra, demo = BENCHMARKS[key]
+    iters = max(1, int(iters * args.scale))
+    workdir = tempfile.mkdtemp(prefix=key.replace('/', '_') + '_')
+    logdir = os.path.join(workdir, 'logs')
+
+    env_name = None
+    cmd = [sys.executable, os.path.join(root, script),
+           '--log_backend', 'jsonl', '--logdir', logdir, '--max_iter_num', str(iters)] + extra
+    if key.startswith('mujoco/'):
+        env_name = 'Hopper-v2' if use_mujoco else 'HopperStandIn-v0'
+        cmd += ['--env_name', env_name]
+
+    result = {'script': script, 'iterations': iters, 'env_name': env_name,
+              'synthetic_demo': prepare_workdir(key, demo, workdir)}
+
+    start = time.perf_counter()
+    time_to_goal = None
+    output = []
+    process = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, universal_newlines=True)
+    watchdog = threading.Timer(args.timeout, process.kill)
+    watchdog.start()
+    try:
+        for line in process.stdout:
+            output.append(line)
+            # every trainer with a goal score prints '... So end' when it is reached
+            if time_to_goal is None and 'So end' in line:
+                time_to_goal = time.perf_counter() - start
+    finally:
+        watchdog.cancel()
+        # wait4 reports the resource usage of this child only (ru_maxrss in KB on linux)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    rows = read_metrics(logdir)
+    scores = [row['value'] for row in rows if row['tag'] == 'log/score']
+
+    result.update({
+        'returncode': process.returncode,
+        'wall_time': time.perf_counter() - start,
+        'time_to_goal': time_to_goal,
+        'env_steps_per_sec': steady_rate(rows, 'perf/samples_per_sec'),
+        'updates_per_sec': steady_rate(rows, 'perf/updates_per_sec'),
+        'peak_rss_mb': usage.ru_maxrss / 1024.0,
+        'final_score': scores[-1] if scores else None,
+    })
+    if process.returncode != 0:
+        result['error'] = ''.join(output[-20:])
+
+    if args.keep_workdir:
+        result['workdir'] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    if args.list:
+        for key, (script, iters, _, _) in BENCHMARKS.items():
+            print('{:20s} {:32s} {} iterations'.format(key, script, iters))
+        sys.exit(0)
+
+    use_mujoco = mujoco_available()
+    if not use_mujoco:
+        print('mujoco_py not found, MuJoCo benchmarks run on HopperStandIn-v0')
+
+    report = {
+        'commit': git_commit(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'scale': args.scale,
+        'results': {},
+    }
+    try:
+        import torch
+        report['torch'] = torch.__version__
+    except ImportError:
+        report['torch'] = None
+
+    for key in select(args.algos):
+        result = run(key, args, use_mujoco)
+        report['results'][key] = result
+
+        if result['returncode'] == 0:
+            print('{:20s} {:>10} steps/s {:>10} updates/s {:8.1f} MB  goal: {}'.format(
+                key,
+                '-' if result['env_steps_per_sec'] is None else '{:.1f}'.format(result['env_steps_per_sec']),
+                '-' if result['updates_per_sec'] is None else '{:.1f}'.format(result['updates_per_sec']),
+                result['peak_rss_mb'],
+                '-' if result['time_to_goal'] is None else '{:.1f} s'.format(result['time_to_goal'])))
+        else:
+            print('{:20s} failed with exit code {}'.format(key, result['returncode']))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('results saved to {}'.format(args.output))
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.vec_env import SubprocVecEnv, make_gym_env
+
+parser = argparse.ArgumentParser(description='throughput of the shared-memory vector env against pickled pipes')
+parser.add_argument('--env_name', type=str, default='HopperStandIn-v0',
+                    help='gym id stepped by the workers (default: HopperStandIn-v0)')
+parser.add_argument('--num_workers', type=str, default='1,2,4,8,16',
+                    help='comma separated worker counts (default: 1,2,4,8,16)')
+parser.add_argument('--envs_per_worker', type=int, default=1,
+                    help='envs stepped by each worker (default: 1)')
+parser.add_argument('--steps', type=int, default=2000,
+                    help='vector steps per timing run (default: 2000)')
+parser.add_argument('--pin', action="store_true", default=False,
+                    help='pin worker i to cpu i modulo the cpu count')
+
+
+def pipe_worker(env_name, num_envs, seed, conn):
+    envs = [make_gym_env(env_name) for _ in range(num_envs)]
+    for i, env in enumerate(envs):
+        env.seed(seed + i)
+
+    while True:
+        command, data = conn.recv()
+        if command == 'close':
+            break
+        if command == 'reset':
+            conn.send([env.reset() for env in envs])
+            continue
+
+        results = []
+        for env, action in zip(envs, data):
+            obs, reward, done, info = env.step(action)
+            if done:
+                info['terminal_observation'] = obs
+                obs = env.reset()
+            results.append((obs, reward, done, info))
+        conn.send(results)
+
+
+class PipeVecEnv:
+    # the usual design: actions and (obs, reward, done, info) tuples are
+    # pickled through a pipe on every step
+    def __init__(self, env_name, num_envs, envs_per_worker=1, seed=0):
+        self.num_envs = num_envs
+        self.conns = []
+        self.processes = []
+        for start in range(0, num_envs, envs_per_worker):
+            parent_conn, child_conn = mp.Pipe()
+            process = mp.Process(target=pipe_worker,
+                                 args=(env_name, min(envs_per_worker, num_envs - start),
+                                       seed + start, child_conn))
+            process.daemon = True
+            process.start()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+        self.split = np.cumsum([0] + [min(envs_per_worker, num_envs - start)
+                                      for start in range(0, num_envs, envs_per_worker)])
+
+    def reset(self):
+        for conn in self.conns:
+            conn.send(('reset', None))
+        return np.stack([obs for conn in self.conns for obs in conn.recv()])
+
+    def step(self, actions):
+        for i, conn in enumerate(self.conns):
+            conn.send(('step', actions[self.split[i]:self.split[i + 1]]))
+        results = [result for conn in self.conns for result in conn.recv()]
+        obs, rewards, dones, infos = zip(*results)
+        return np.stack(obs), np.array(rewards), np.array(dones), infos
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(('close', None))
+        for process in self.processes:
+            process.join()
+
+
+def time_env(env, steps, action_shape):
+    rng = np.random.RandomState(0)
+    actions = rng.uniform(-1, 1, size=(steps, env.num_envs) + action_shape)
+    env.reset()
+
+    start = time.perf_counter()
+    for action in actions:
+        env.step(action)
+    rate = steps * env.num_envs / (time.perf_counter() - start)
+    env.close()
+    return rate
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    action_shape = make_gym_env(args.env_name).action_space.shape
+
+    print('{:>8s} {:>6s} {:>14s} {:>14s} {:>8s}'.format(
+        'workers', 'envs', 'pipe steps/s', 'shm steps/s', 'speedup'))
+    for num_workers in [int(n) for n in args.num_workers.split(',')]:
+        num_envs = num_workers * args.envs_per_worker
+        cpus = list(range(os.cpu_count())) if args.pin else None
+
+        pipe_rate = time_env(PipeVecEnv(args.env_name, num_envs, args.envs_per_worker),
+                             args.steps, action_shape)
+        shm_rate = time_env(SubprocVecEnv(args.env_name, num_envs, args.envs_per_worker, seed=0,
+                                          cpu_affinity=cpus),
+                            args.steps, action_shape)
+
+        print('{:8d} {:6d} {:14.0f} {:14.0f} {:7.2f}x'.format(
+            num_workers, num_envs, pipe_rate, shm_rate, shm_rate / pipe_rate))
@@ -0,0 +1,265 @@
+import os
+import sys
+import copy
+import queue
+import argparse
+import numpy as np
+
+import torch
+import torch.optim as optim
+import torch.multiprocessing as mp
+from torch.distributions import Categorical
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.config import config_class
+from common.metrics import make_writer
+from common.profiling import timers, Profiler
+from common.runner import save_state_dict
+from common.vtrace import vtrace
+
+from model import Actor, Critic
+
+parser = argparse.ArgumentParser(description='IMPALA actor-critic with V-trace')
+parser.add_argument('--env_name', type=str, default="CartPole-v1")
+parser.add_argument('--save_path', default='./save_model/', help='')
+parser.add_argument('--gamma', type=float, default=0.99)
+parser.add_argument('--hidden_size', type=int, default=64)
+parser.add_argument('--actor_lr', type=float, default=1e-3)
+parser.add_argument('--critic_lr', type=float, default=1e-3)
+parser.add_argument('--ent_coef', type=float, default=0.01)
+parser.add_argument('--num_actors', type=int, default=4,
+                    help='number of acting processes (default: 4)')
+parser.add_argument('--unroll_length', type=int, default=20,
+                    help='steps per unroll an actor sends to the learner (default: 20)')
+parser.add_argument('--batch_size', type=int, default=32,
+                    help='unrolls per learner update (default: 32)')
+parser.add_argument('--clip_rho', type=float, default=1.0,
+                    help='truncation of the importance weights in the V-trace targets (default: 1)')
+parser.add_argument('--clip_c', type=float, default=1.0,
+                    help='truncation of the trace coefficients (default: 1)')
+parser.add_argument('--iter_updates', type=int, default=10,
+                    help='learner updates per iteration (default: 10)')
+parser.add_argument('--max_iter_num', type=int, default=1000)
+parser.add_argument('--log_interval', type=int, default=10)
+parser.add_argument('--goal_score', type=int, default=400)
+parser.add_argument('--seed', type=int, default=500)
+parser.add_argument('--logdir', type=str, default='./logs',
+                    help='tensorboardx logs directory')
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+Config = config_class(parser, __name__)
+
+def put(target_queue, item, stop_event):
+    while not stop_event.is_set():
+        try:
+            target_queue.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+def actor_worker(rank, env_name, seed, args, shared_actor, version, lock,
+                 unroll_queue, stop_event):
+    import gym
+
+    torch.set_num_threads(1)
+    env = gym.make(env_name)
+    env.seed(seed + rank + 1)
+    torch.manual_seed(seed + rank + 1)
+
+    actor = copy.deepcopy(shared_actor)
+    local_version = -1
+    T = args.unroll_length
+    state_size = env.observation_space.shape[0]
+
+    state = env.reset()
+    score = 0
+    episode_steps = 0
+
+    while not stop_event.is_set():
+        # the policy is refreshed once per unroll, so it lags the learner
+        # by at most the updates made while the unroll was collected
+        if version.value != local_version:
+            with lock:
+                actor.load_state_dict(shared_actor.state_dict())
+                local_version = version.value
+
+        # states holds T + 1 entries, the last one bootstraps the unroll
+        unroll = {'state': np.zeros((T + 1, state_size), dtype=np.float32),
+                  'action': np.zeros(T, dtype=np.int64),
+                  'reward': np.zeros(T, dtype=np.float32),
+                  'mask': np.zeros(T, dtype=np.float32),
+                  'log_prob': np.zeros(T, dtype=np.float32)}
+        scores = []
+
+        for t in range(T):
+            unroll['state'][t] = state
+            with torch.no_grad():
+                policies = actor(torch.from_numpy(unroll['state'][t:t + 1]))
+                categorical = Categorical(policies)
+                action = categorical.sample()
+                unroll['log_prob'][t] = categorical.log_prob(action).item()
+            action = int(action.item())
+
+            next_state, reward, done, _ = env.step(action)
+            episode_steps += 1
+            score += reward
+            unroll['action'][t] = action
+            unroll['reward'][t] = reward if not done or episode_steps == 500 else -1
+            unroll['mask'][t] = 0 if done else 1
+
+            if done:
+                scores.append(score)
+                next_state = env.reset()
+                score = 0
+                episode_steps = 0
+            state = next_state
+        unroll['state'][T] = state
+
+        put(unroll_queue, (unroll, local_version, scores), stop_event)
+
+    env.close()
+
+def stack_unrolls(unrolls):
+    # B unrolls of T steps -> time major [T, B] tensors
+    return {name: torch.from_numpy(np.stack([unroll[name] for unroll in unrolls], axis=1))
+            for name in unrolls[0]}
+
+def train_model(actor, critic, actor_optimizer, critic_optimizer, batch, args):
+    states = batch['state']
+    T, B = batch['action'].shape
+    flat_states = states.view((T + 1) * B, -1)
+
+    policies = actor(flat_states[:T * B])
+    categorical = Categorical(policies)
+    log_probs = categorical.log_prob(batch['action'].view(-1)).view(T, B)
+    entropy = categorical.entropy().mean()
+
+    values = critic(flat_states).view(T + 1, B)
+    vs, pg_advantages = vtrace(batch['log_prob'], log_probs.detach(), batch['reward'],
+                               args.gamma * batch['mask'], values[:T].detach(),
+                               values[T].detach(), args.clip_rho, args.clip_c)
+
+    actor_loss = -(log_probs * pg_advantages).mean() - args.ent_coef * entropy
+    critic_loss = 0.5 * (vs - values[:T]).pow(2).mean()
+
+    actor_optimizer.zero_grad()
+    critic_optimizer.zero_grad()
+    (actor_loss + critic_loss).backward()
+    actor_optimizer.step()
+    critic_optimizer.step()
+
+    return actor_loss.item(), critic_loss.item(), entropy.item()
+
+
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+
+    env = gym.make(args.env_name)
+    state_size = env.observation_space.shape[0]
+    action_size = env.action_space.n
+    env.close()
+    torch.manual_seed(args.seed)
+    print('state size:', state_size)
+    print('action size:', action_size)
+
+    actor = Actor(state_size, action_size, args)
+    critic = Critic(state_size, args)
+    actor_optimizer = optim.Adam(actor.parameters(), lr=args.actor_lr)
+    critic_optimizer = optim.Adam(critic.parameters(), lr=args.critic_lr)
+
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
+
+    shared_actor = copy.deepcopy(actor)
+    shared_actor.share_memory()
+    version = mp.Value('l', 0, lock=False)
+    lock = mp.Lock()
+    stop_event = mp.Event()
+    # room for two batches, so the actors keep stepping during an update
+    unroll_queue = mp.Queue(maxsize=2 * args.batch_size)
+
+    processes = [mp.Process(target=actor_worker,
+                            args=(rank, args.env_name, args.seed, args, shared_actor,
+                                  version, lock, unroll_queue, stop_event))
+                 for rank in range(args.num_actors)]
+    for process in processes:
+        process.daemon = True
+        process.start()
+
+    running_score = 0
+    episodes = 0
+    updates = 0
+    solved = False
+
+    try:
+        for iteration in range(args.max_iter_num):
+            scores = []
+            lags = []
+            for _ in range(args.iter_updates):
+                unrolls = []
+                with timers('unroll.wait'):
+                    while len(unrolls) < args.batch_size:
+                        unroll, unroll_version, unroll_scores = unroll_queue.get()
+                        unrolls.append(unroll)
+                        lags.append(updates - unroll_version)
+                        scores.extend(unroll_scores)
+                timers.count('samples', args.batch_size * args.unroll_length)
+
+                actor.train(), critic.train()
+                with timers('train'):
+                    batch = stack_unrolls(unrolls)
+                    actor_loss, critic_loss, entropy = train_model(
+                        actor, critic, actor_optimizer, critic_optimizer, batch, args)
+                timers.count('updates')
+                updates += 1
+
+                with timers('publish'), lock:
+                    for shared_param, param in zip(shared_actor.parameters(), actor.parameters()):
+                        shared_param.data.copy_(param.data)
+                    version.value = updates
+
+            for score in scores:
+                running_score = 0.99 * running_score + 0.01 * score
+            episodes += len(scores)
+            if scores:
+                writer.add_scalar('log/score', float(np.mean(scores)), iteration)
+            writer.add_scalar('loss/actor', actor_loss, iteration)
+            writer.add_scalar('loss/critic', critic_loss, iteration)
+            writer.add_scalar('log/entropy', entropy, iteration)
+            writer.add_scalar('log/policy_lag', float(np.mean(lags)), iteration)
+
+            profiler.step()
+
+            if iteration % args.log_interval == 0:
+                print('{} iter | {} updates | {} episode | running_score: {:.2f} | policy lag: {:.2f}'.format(
+                    iteration, updates, episodes, running_score, np.mean(lags)))
+                print(timers.report(writer, iteration))
+
+            if running_score > args.goal_score:
+                with timers('checkpoint'):
+                    save_state_dict(actor, args.save_path + 'model.pth.tar')
+                print('Running score exceeds {}. So end'.format(args.goal_score))
+                solved = True
+                break
+    finally:
+        stop_event.set()
+        for process in processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+
+    profiler.close()
+    writer.close()
+
+    return {'iterations': iteration + 1, 'updates': updates, 'episodes': episodes,
+            'score': running_score, 'solved': solved, 'actor': actor, 'critic': critic}
+
+if __name__ == '__main__':
+    train(parser.parse_args())
@@ -1,5 +1,5 @@
 import os
-import gym
+import sys
 import argparse
 import numpy as np
 
@@ -7,8 +7,17 @@ import torch
 import torch.optim as optim
 from torch.distributions import Categorical
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.checkpoint import load_checkpoint
+from common.config import config_class
+from common.metrics import make_writer
+from common.profiling import Profiler
+from common.rollout_policy import RolloutPolicy
+from common.runner import (EpisodeCollector, OffPolicyRunner, LogCallback,
+                           ProfileCallback, GoalCallback, save_state_dict)
+from common.snapshot import SnapshotCallback
+
 from model import Actor, Critic
-from tensorboardX import SummaryWriter
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--env_name', type=str, default="CartPole-v1")
@@ -25,9 +34,21 @@ parser.add_argument('--log_interval', type=int, default=10)
 parser.add_argument('--goal_score', type=int, default=400)
 parser.add_argument('--logdir', type=str, default='./logs',
                     help='tensorboardx logs directory')
-args = parser.parse_args()
-
-def train_model(actor, critic, actor_optimizer, critic_optimizer, transition, policies):
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+parser.add_argument('--snapshot_dir', type=str, default='./snapshot',
+                    help='directory of the resumable training snapshot (default: ./snapshot)')
+parser.add_argument('--snapshot_interval', type=int, default=0,
+                    help='iterations between training snapshots, 0 to disable (default: 0)')
+parser.add_argument('--resume', action="store_true", default=False,
+                    help='continue from the snapshot in snapshot_dir if there is one')
+Config = config_class(parser, __name__)
+
+def train_model(actor, critic, actor_optimizer, critic_optimizer, transition, policies, args):
     state, action, reward, next_state, mask = transition
     
     # update critic 
@@ -63,7 +84,12 @@ def get_action(policies):
     return action
 
 
-def main():
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+
     env = gym.make(args.env_name)
     env.seed(500)
     torch.manual_seed(500)
@@ -79,55 +105,45 @@ def main():
     actor_optimizer = optim.Adam(actor.parameters(), lr=args.actor_lr)
     critic_optimizer = optim.Adam(critic.parameters(), lr=args.critic_lr)
 
-    writer = SummaryWriter(args.logdir)
-
-    running_score = 0
-
-    for episode in range(args.max_iter_num):
-        done = False
-        score = 0
-
-        state = env.reset()
-        state = np.reshape(state, [1, state_size])
-
-        while not done:
-            if args.render:
-                env.render()
-
-            policies = actor(torch.Tensor(state))
-            action = get_action(policies)
-
-            next_state, reward, done, _ = env.step(action)
-
-            next_state = np.reshape(next_state, [1, state_size])
-            reward = reward if not done or score == 499 else -1
-            mask = 0 if done else 1
-            
-            transition = [state, action, reward, next_state, mask]
-
-            actor.train(), critic.train()
-            train_model(actor, critic, actor_optimizer, critic_optimizer, 
-                        transition, policies)
-
-            state = next_state
-            score += reward
-
-        score = score if score == 500.0 else score + 1
-        running_score = 0.99 * running_score + 0.01 * score
-
-        if episode % args.log_interval == 0:
-            print('{} episode | running_score: {:.2f}'.format(episode, running_score))
-            writer.add_scalar('log/score', float(score), episode)
-
-        if running_score > args.goal_score:
-            if not os.path.isdir(args.save_path):
-                os.makedirs(args.save_path)
-    
-            ckpt_path = args.save_path + 'model.pth.tar'
-            torch.save(actor.state_dict(), ckpt_path)
-            print('Running score exceeds 400. So end')
-            break  
+    if args.load_model is not None:
+        actor.load_state_dict(load_checkpoint(os.path.join(args.save_path, args.load_model)))
+
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
+
+    policy = RolloutPolicy(actor, 'categorical', (1, state_size), squeeze=True)
+
+    def shape_reward(state, action, reward, done, t):
+        return reward if not done or t == 500 else -1
+
+    def learner(batch):
+        # online update on the latest transition; the policy is evaluated
+        # again with grad since the collector runs it under no_grad
+        transition = list(batch[0])
+        actor.train(), critic.train()
+        policies = actor(torch.Tensor(transition[0]))
+        train_model(actor, critic, actor_optimizer, critic_optimizer,
+                    transition, policies, args)
+
+    def save(runner):
+        save_state_dict(actor, args.save_path + 'model.pth.tar')
+
+    collector = EpisodeCollector(env, policy, reward_fn=shape_reward, render=args.render,
+                                 preprocess=lambda state: np.reshape(state, [1, state_size]))
+    goal = GoalCallback(args.goal_score, save=save, score=lambda runner: runner.running_score)
+    log = LogCallback(writer, args.log_interval,
+                      extra=lambda: {'running_score': runner.running_score})
+    snapshot = SnapshotCallback(args.snapshot_dir, args.snapshot_interval,
+                                {'actor': actor, 'critic': critic, 'actor_optimizer': actor_optimizer,
+                                 'critic_optimizer': critic_optimizer}, resume=args.resume)
+    runner = OffPolicyRunner(collector, learner, None, 1, args.max_iter_num,
+                             callbacks=[snapshot, ProfileCallback(profiler), log, goal])
+    runner.run()
+    writer.close()
+
+    return {'episodes': runner.episodes, 'score': runner.running_score,
+            'solved': goal.reached, 'actor': actor, 'critic': critic}
 
 if __name__=="__main__":
-    main()
+    train(parser.parse_args())
     
\ No newline at end of file
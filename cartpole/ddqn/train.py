@@ -1,15 +1,24 @@
 import os
-import gym
-import random
+import sys
 import argparse
 import numpy as np
-from collections import deque
 
 import torch
 import torch.optim as optim
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.batched_envs import make_batched
+from common.checkpoint import load_checkpoint
+from common.config import config_class
+from common.ensemble import Ensemble, StackedReplay, SeedMetrics
+from common.metrics import make_writer
+from common.profiling import timers, Profiler
+from common.rollout_policy import RolloutPolicy
+from common.runner import (EpisodeCollector, OffPolicyRunner, ReplayBuffer, LogCallback,
+                           ProfileCallback, GoalCallback, save_state_dict, transition_dtypes)
+from common.snapshot import SnapshotCallback
+
 from model import QNet
-from tensorboardX import SummaryWriter
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--env_name', type=str, default="CartPole-v1")
@@ -26,18 +35,32 @@ parser.add_argument('--update_target', type=int, default=100)
 parser.add_argument('--max_iter_num', type=int, default=1000)
 parser.add_argument('--log_interval', type=int, default=10)
 parser.add_argument('--goal_score', type=int, default=400)
+parser.add_argument('--num_seeds', type=int, default=1,
+                    help='independent seeds trained in lockstep as one vmapped ensemble on batched envs (default: 1)')
 parser.add_argument('--logdir', type=str, default='./logs',
                     help='tensorboardx logs directory')
-args = parser.parse_args()
-
-def train_model(q_net, target_q_net, optimizer, mini_batch):
-    mini_batch = np.array(mini_batch)
-    states = np.vstack(mini_batch[:, 0])
-    actions = list(mini_batch[:, 1]) 
-    rewards = list(mini_batch[:, 2]) 
-    next_states = np.vstack(mini_batch[:, 3])
-    masks = list(mini_batch[:, 4]) 
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+parser.add_argument('--storage_precision', type=str, default='float32',
+                    choices=['float64', 'float32', 'float16'],
+                    help='dtype of the states stored in the replay buffer (default: float32)')
+parser.add_argument('--snapshot_dir', type=str, default='./snapshot',
+                    help='directory of the resumable training snapshot (default: ./snapshot)')
+parser.add_argument('--snapshot_interval', type=int, default=0,
+                    help='iterations between training snapshots, 0 to disable (default: 0)')
+parser.add_argument('--resume', action="store_true", default=False,
+                    help='continue from the snapshot in snapshot_dir if there is one')
+Config = config_class(parser, __name__)
 
+def train_model(q_net, target_q_net, optimizer, mini_batch, args):
+    # the replay's columns, states stored as [batch, 1, state_size]
+    states, actions, rewards, next_states, masks = mini_batch
+    states = torch.Tensor(states).flatten(1)
+    next_states = torch.Tensor(next_states).flatten(1)
     actions = torch.LongTensor(actions)
     rewards = torch.Tensor(rewards)
     masks = torch.Tensor(masks)
@@ -45,14 +68,14 @@ def train_model(q_net, target_q_net, optimizer, mini_batch):
     criterion = torch.nn.MSELoss()
 
     # get Q-value
-    q_values = q_net(torch.Tensor(states))
+    q_values = q_net(states)
     q_value = q_values.gather(1, actions.unsqueeze(1)).view(-1)
     
     # get target
-    next_q_values = q_net(torch.Tensor(next_states))
+    next_q_values = q_net(next_states)
     next_q_value_index = next_q_values.max(1)[1]
 
-    target_next_q_values = target_q_net(torch.Tensor(next_states))
+    target_next_q_values = target_q_net(next_states)
     target_next_q_value = target_next_q_values.gather(1, next_q_value_index.unsqueeze(1)).view(-1)
     target = rewards + masks * args.gamma * target_next_q_value
 
@@ -61,18 +84,134 @@ def train_model(q_net, target_q_net, optimizer, mini_batch):
     loss.backward()
     optimizer.step()
 
-def get_action(q_values, action_size, epsilon):
-    if np.random.rand() <= epsilon:
-        return random.randrange(action_size)
-    else:
-        _, action = torch.max(q_values, 1)
-        return action.numpy()[0]
-
 def update_target_model(net, target_q_net):
     target_q_net.load_state_dict(net.state_dict())
 
 
-def main():
+def train_seeds_model(q_nets, target_q_nets, optimizer, batch, args):
+    # batch fields are [num_seeds, batch_size, ...]
+    states = torch.Tensor(batch['state'])
+    actions = torch.LongTensor(batch['action'])
+    rewards = torch.Tensor(batch['reward'])
+    next_states = torch.Tensor(batch['next_state'])
+    masks = torch.Tensor(batch['mask'])
+
+    q_value = q_nets(states).gather(2, actions.unsqueeze(2)).squeeze(2)
+    next_q_value_index = q_nets(next_states).max(2)[1]
+    target_next_q_value = target_q_nets(next_states).gather(2, next_q_value_index.unsqueeze(2)).squeeze(2)
+    target = rewards + masks * args.gamma * target_next_q_value
+
+    # mse per seed, summed so that every seed gets its own gradient
+    loss = (q_value - target.detach()).pow(2).mean(1).sum()
+    optimizer.zero_grad()
+    loss.backward()
+    optimizer.step()
+
+def train_seeds(args):
+    """
+    Trains num_seeds independent agents in lockstep: one batched env,
+    one vmapped ensemble of Q-networks and one replay buffer per seed.
+    Seeds that reach the goal score are saved and keep training until all
+    seeds are solved or have run max_iter_num episodes.
+    """
+    num_seeds = args.num_seeds
+    env = make_batched(args.env_name, num_seeds, seed=500)
+    state_size = env.observation_space.shape[0]
+    action_size = env.action_space.n
+    print('state size:', state_size)
+    print('action size:', action_size)
+    print('seeds:', num_seeds)
+
+    make_q_net = lambda: QNet(state_size, action_size, args)
+    q_nets = Ensemble.from_factory(make_q_net, num_seeds, seed=500)
+    target_q_nets = Ensemble.from_factory(make_q_net, num_seeds, seed=500)
+    target_q_nets.load_from(q_nets)
+    optimizer = optim.Adam(q_nets.parameters(), lr=0.001)
+
+    replay = StackedReplay(num_seeds, 10000, {
+        'state': ((state_size,), np.float32),
+        'action': ((), np.int64),
+        'reward': ((), np.float32),
+        'next_state': ((state_size,), np.float32),
+        'mask': ((), np.float32),
+    }, seed=500)
+
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
+    metrics = SeedMetrics(num_seeds, writer)
+
+    rng = np.random.RandomState(500)
+    solved = np.zeros(num_seeds, dtype=bool)
+    epsilon = args.epsilon
+    steps = 0
+    logged = 0
+
+    state = env.reset()
+    while metrics.episodes.min() < args.max_iter_num and not solved.all():
+        steps += 1
+
+        with timers('policy'), torch.no_grad():
+            actions = q_nets(torch.Tensor(state)).argmax(1).numpy()
+            explore = rng.rand(num_seeds) <= epsilon
+            actions[explore] = rng.randint(action_size, size=explore.sum())
+
+        with timers('env.step'):
+            next_state, rewards, dones, info = env.step(actions)
+        timers.count('samples', num_seeds)
+
+        # finished envs are already reset, learn from their last observation
+        terminal_state = info.get('terminal_observation', next_state)
+        shaped = np.where(dones & ~info['TimeLimit.truncated'], -1.0, rewards)
+        replay.append(state=state, action=actions, reward=shaped,
+                      next_state=np.where(dones[:, None], terminal_state, next_state),
+                      mask=1 - dones)
+        metrics.step(rewards, dones)
+        state = next_state
+
+        if steps > args.initial_exploration:
+            epsilon = max(epsilon - args.epsilon_decay, 0.1)
+
+            with timers('replay.sample'):
+                batch = replay.sample(args.batch_size)
+            with timers('train'):
+                train_seeds_model(q_nets, target_q_nets, optimizer, batch, args)
+            timers.count('updates', num_seeds)
+
+            if steps % args.update_target == 0:
+                target_q_nets.load_from(q_nets)
+
+        for i in np.nonzero(dones & ~solved & (metrics.running_scores > args.goal_score))[0]:
+            solved[i] = True
+            with timers('checkpoint'):
+                model = make_q_net()
+                model.load_state_dict(q_nets.member_state_dict(i))
+                save_state_dict(model, args.save_path + 'model_seed{}.pth.tar'.format(i))
+            print('seed {} | running score exceeds {} after {} episodes'.format(
+                i, args.goal_score, metrics.episodes[i]))
+
+        if dones.any() and metrics.episodes.min() >= logged + args.log_interval:
+            logged = metrics.episodes.min()
+            running = metrics.running_scores
+            print('{} episode | running_score min/mean/max: {:.2f}/{:.2f}/{:.2f} | solved: {} | epsilon: {:.2f}'.format(
+                logged, running.min(), running.mean(), running.max(), solved.sum(), epsilon))
+            print(timers.report(writer, steps))
+            profiler.step()
+
+    profiler.close()
+    writer.close()
+
+    return {'episodes': metrics.episodes.tolist(), 'score': metrics.running_scores.tolist(),
+            'solved': solved.tolist(), 'q_nets': q_nets}
+
+
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    if args.num_seeds > 1:
+        return train_seeds(args)
+    import gym
+
     env = gym.make(args.env_name)
     env.seed(500)
     torch.manual_seed(500)
@@ -85,70 +224,58 @@ def main():
     q_net = QNet(state_size, action_size, args)
     target_q_net = QNet(state_size, action_size, args)
     optimizer = optim.Adam(q_net.parameters(), lr=0.001)
+    if args.load_model is not None:
+        q_net.load_state_dict(load_checkpoint(os.path.join(args.save_path, args.load_model)))
 
     update_target_model(q_net, target_q_net)
     
-    writer = SummaryWriter(args.logdir)
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
 
-    replay_buffer = deque(maxlen=10000)
-    running_score = 0
-    steps = 0
-    
-    for episode in range(args.max_iter_num):
-        done = False
-        score = 0
+    epsilon = args.epsilon
 
-        state = env.reset()
-        state = np.reshape(state, [1, state_size])
+    policy = RolloutPolicy(q_net, 'epsilon_greedy', (1, state_size), squeeze=True,
+                           epsilon=lambda: epsilon)
 
-        while not done:
-            if args.render:
-                env.render()
+    def shape_reward(state, action, reward, done, t):
+        return reward if not done or t == 500 else -1
 
-            steps += 1
+    def learner(mini_batch):
+        nonlocal epsilon
+        epsilon = max(epsilon - args.epsilon_decay, 0.1)
 
-            q_values = q_net(torch.Tensor(state))
-            action = get_action(q_values, action_size, args.epsilon)
+        q_net.train(), target_q_net.train()
+        train_model(q_net, target_q_net, optimizer, mini_batch, args)
 
-            next_state, reward, done, _ = env.step(action)
+        if runner.steps % args.update_target == 0:
+            update_target_model(q_net, target_q_net)
 
-            next_state = np.reshape(next_state, [1, state_size])
-            reward = reward if not done or score == 499 else -1
-            mask = 0 if done else 1
-            
-            replay_buffer.append((state, action, reward, next_state, mask))
+    def save(runner):
+        save_state_dict(q_net, args.save_path + 'model.pth.tar')
 
-            state = next_state
-            score += reward
+    collector = EpisodeCollector(env, policy, reward_fn=shape_reward, render=args.render,
+                                 preprocess=lambda state: np.reshape(state, [1, state_size]))
+    goal = GoalCallback(args.goal_score, save=save, score=lambda runner: runner.running_score)
+    log = LogCallback(writer, args.log_interval,
+                      extra=lambda: {'running_score': runner.running_score, 'epsilon': epsilon})
 
-            if steps > args.initial_exploration:
-                args.epsilon -= args.epsilon_decay
-                args.epsilon = max(args.epsilon, 0.1)
+    def set_epsilon(extra):
+        nonlocal epsilon
+        epsilon = extra['epsilon']
 
-                mini_batch = random.sample(replay_buffer, args.batch_size)
-                
-                q_net.train(), target_q_net.train()
-                train_model(q_net, target_q_net, optimizer, mini_batch)
+    replay = ReplayBuffer(10000, transition_dtypes(args.storage_precision, np.int8))
+    snapshot = SnapshotCallback(args.snapshot_dir, args.snapshot_interval,
+                                {'q_net': q_net, 'target_q_net': target_q_net, 'optimizer': optimizer},
+                                replay=replay, get_extra=lambda: {'epsilon': epsilon},
+                                set_extra=set_epsilon, resume=args.resume)
+    runner = OffPolicyRunner(collector, learner, replay, args.batch_size,
+                             args.max_iter_num, update_after=args.initial_exploration,
+                             callbacks=[snapshot, ProfileCallback(profiler), log, goal])
+    runner.run()
+    writer.close()
 
-                if steps % args.update_target == 0:
-                    update_target_model(q_net, target_q_net)
-
-        score = score if score == 500.0 else score + 1
-        running_score = 0.99 * running_score + 0.01 * score
-
-        if episode % args.log_interval == 0:
-            print('{} episode | running_score: {:.2f} | epsilon: {:.2f}'.format(
-                episode, running_score, args.epsilon))
-            writer.add_scalar('log/score', float(score), episode)
-
-        if running_score > args.goal_score:
-            if not os.path.isdir(args.save_path):
-                os.makedirs(args.save_path)
-    
-            ckpt_path = args.save_path + 'model.pth.tar'
-            torch.save(q_net.state_dict(), ckpt_path)
-            print('Running score exceeds 400. So end')
-            break  
+    return {'episodes': runner.episodes, 'score': runner.running_score,
+            'solved': goal.reached, 'q_net': q_net}
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    train(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,327 @@
+import os
+import sys
+import copy
+import queue
+import argparse
+import numpy as np
+
+import torch
+import torch.optim as optim
+import torch.multiprocessing as mp
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.config import config_class
+from common.metrics import make_writer
+from common.profiling import timers, Profiler
+from common.prioritized_replay import PrioritizedReplay
+from common.runner import save_state_dict
+
+from model import QNet
+
+parser = argparse.ArgumentParser(description='Ape-X DQN')
+parser.add_argument('--env_name', type=str, default="CartPole-v1")
+parser.add_argument('--save_path', default='./save_model/', help='')
+parser.add_argument('--gamma', type=float, default=0.99)
+parser.add_argument('--hidden_size', type=int, default=64)
+parser.add_argument('--learning_rate', type=float, default=0.001)
+parser.add_argument('--num_actors', type=int, default=4,
+                    help='number of acting processes (default: 4)')
+parser.add_argument('--epsilon', type=float, default=0.4,
+                    help='base of the per-actor epsilons epsilon ** (1 + i / (K - 1) * epsilon_alpha) (default: 0.4)')
+parser.add_argument('--epsilon_alpha', type=float, default=7.0,
+                    help='spread of the per-actor epsilons (default: 7)')
+parser.add_argument('--send_size', type=int, default=50,
+                    help='transitions an actor prioritizes and sends at once (default: 50)')
+parser.add_argument('--replay_size', type=int, default=100000,
+                    help='capacity of the prioritized replay (default: 100000)')
+parser.add_argument('--priority_alpha', type=float, default=0.6)
+parser.add_argument('--priority_beta', type=float, default=0.4)
+parser.add_argument('--initial_exploration', type=int, default=1000,
+                    help='transitions in the replay before the learner starts (default: 1000)')
+parser.add_argument('--batch_size', type=int, default=128)
+parser.add_argument('--prefetch', type=int, default=4,
+                    help='sampled batches the replay process keeps ready (default: 4)')
+parser.add_argument('--publish_interval', type=int, default=50,
+                    help='learner updates between weight publications to the actors (default: 50)')
+parser.add_argument('--update_target', type=int, default=500,
+                    help='learner updates between target network copies (default: 500)')
+parser.add_argument('--iter_updates', type=int, default=100,
+                    help='learner updates per iteration (default: 100)')
+parser.add_argument('--max_iter_num', type=int, default=1000)
+parser.add_argument('--log_interval', type=int, default=10)
+parser.add_argument('--goal_score', type=int, default=400)
+parser.add_argument('--seed', type=int, default=500)
+parser.add_argument('--logdir', type=str, default='./logs',
+                    help='tensorboardx logs directory')
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+Config = config_class(parser, __name__)
+
+def get_epsilons(num_actors, epsilon, alpha):
+    # Ape-X: actor i explores with epsilon ** (1 + i / (K - 1) * alpha)
+    if num_actors == 1:
+        return [epsilon]
+    return [epsilon ** (1 + i / (num_actors - 1) * alpha) for i in range(num_actors)]
+
+def td_errors(q_net, target_q_net, states, actions, rewards, next_states, masks, gamma):
+    q_value = q_net(states).gather(1, actions.unsqueeze(1)).view(-1)
+    target = rewards + masks * gamma * target_q_net(next_states).max(1)[0]
+    return target.detach() - q_value
+
+def put(target_queue, item, stop_event):
+    while not stop_event.is_set():
+        try:
+            target_queue.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+def actor_worker(rank, env_name, seed, epsilon, args, shared_q_net, version, lock,
+                 transition_queue, stats_queue, stop_event):
+    import gym
+
+    torch.set_num_threads(1)
+    env = gym.make(env_name)
+    env.seed(seed + rank + 1)
+    torch.manual_seed(seed + rank + 1)
+    rng = np.random.RandomState(seed + rank + 1)
+
+    q_net = copy.deepcopy(shared_q_net)
+    local_version = -1
+    action_size = env.action_space.n
+
+    transitions = []
+    scores = []
+    state = env.reset()
+    score = 0
+    episode_steps = 0
+
+    while not stop_event.is_set():
+        if version.value != local_version:
+            with lock:
+                q_net.load_state_dict(shared_q_net.state_dict())
+                local_version = version.value
+
+        if rng.rand() <= epsilon:
+            action = rng.randint(action_size)
+        else:
+            with torch.no_grad():
+                action = int(q_net(torch.Tensor(state).unsqueeze(0)).argmax(1).item())
+
+        next_state, reward, done, _ = env.step(action)
+        episode_steps += 1
+        score += reward
+        reward = reward if not done or episode_steps == 500 else -1
+        transitions.append((state, action, reward, next_state, 0 if done else 1))
+        state = next_state
+
+        if done:
+            scores.append(score)
+            state = env.reset()
+            score = 0
+            episode_steps = 0
+
+        if len(transitions) >= args.send_size:
+            states, actions, rewards, next_states, masks = [np.array(x) for x in zip(*transitions)]
+            fields = {'state': states, 'action': actions, 'reward': rewards,
+                      'next_state': next_states, 'mask': masks}
+
+            # priorities from the actor's own copy of the network, as in Ape-X
+            with torch.no_grad():
+                td = td_errors(q_net, q_net, torch.Tensor(states), torch.LongTensor(actions),
+                               torch.Tensor(rewards), torch.Tensor(next_states),
+                               torch.Tensor(masks), args.gamma)
+            priorities = np.abs(td.numpy()) + 1e-6
+
+            put(transition_queue, (fields, priorities), stop_event)
+            put(stats_queue, (len(transitions), scores), stop_event)
+            transitions = []
+            scores = []
+
+    env.close()
+
+def replay_worker(state_size, args, transition_queue, sample_queue, priority_queue, stop_event):
+    # owns the prioritized replay: inserts actor batches, applies the
+    # learner's new priorities and keeps sampled batches ready
+    torch.set_num_threads(1)
+    replay = PrioritizedReplay(args.replay_size, {
+        'state': ((state_size,), np.float32),
+        'action': ((), np.int64),
+        'reward': ((), np.float32),
+        'next_state': ((state_size,), np.float32),
+        'mask': ((), np.float32),
+    }, alpha=args.priority_alpha, seed=args.seed)
+
+    while not stop_event.is_set():
+        busy = False
+        for _ in range(args.num_actors):
+            try:
+                fields, priorities = transition_queue.get_nowait()
+            except queue.Empty:
+                break
+            replay.add(fields, priorities)
+            busy = True
+
+        while True:
+            try:
+                indices, priorities = priority_queue.get_nowait()
+            except queue.Empty:
+                break
+            replay.update_priorities(indices, priorities)
+            busy = True
+
+        if len(replay) >= args.initial_exploration and not sample_queue.full():
+            batch, indices, weights = replay.sample(args.batch_size, args.priority_beta)
+            batch['index'] = indices
+            batch['weight'] = weights
+            put(sample_queue, batch, stop_event)
+            busy = True
+
+        if not busy:
+            try:
+                fields, priorities = transition_queue.get(timeout=0.01)
+                replay.add(fields, priorities)
+            except queue.Empty:
+                pass
+
+def train_model(q_net, target_q_net, optimizer, batch, args):
+    states = torch.from_numpy(batch['state'])
+    actions = torch.from_numpy(batch['action'])
+    rewards = torch.from_numpy(batch['reward'])
+    next_states = torch.from_numpy(batch['next_state'])
+    masks = torch.from_numpy(batch['mask'])
+    weights = torch.from_numpy(batch['weight'])
+
+    td = td_errors(q_net, target_q_net, states, actions, rewards, next_states, masks, args.gamma)
+    # importance weights undo the bias of prioritized sampling
+    loss = (weights * td.pow(2)).mean()
+    optimizer.zero_grad()
+    loss.backward()
+    optimizer.step()
+
+    return np.abs(td.detach().numpy()) + 1e-6
+
+def update_target_model(q_net, target_q_net):
+    target_q_net.load_state_dict(q_net.state_dict())
+
+
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+
+    env = gym.make(args.env_name)
+    state_size = env.observation_space.shape[0]
+    action_size = env.action_space.n
+    env.close()
+    torch.manual_seed(args.seed)
+    print('state size:', state_size)
+    print('action size:', action_size)
+
+    q_net = QNet(state_size, action_size, args)
+    target_q_net = QNet(state_size, action_size, args)
+    update_target_model(q_net, target_q_net)
+    optimizer = optim.Adam(q_net.parameters(), lr=args.learning_rate)
+
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
+
+    shared_q_net = copy.deepcopy(q_net)
+    shared_q_net.share_memory()
+    version = mp.Value('l', 0, lock=False)
+    lock = mp.Lock()
+    stop_event = mp.Event()
+    transition_queue = mp.Queue(maxsize=4 * args.num_actors)
+    stats_queue = mp.Queue()
+    sample_queue = mp.Queue(maxsize=args.prefetch)
+    priority_queue = mp.Queue()
+
+    epsilons = get_epsilons(args.num_actors, args.epsilon, args.epsilon_alpha)
+    print('actor epsilons:', ' '.join('{:.4f}'.format(epsilon) for epsilon in epsilons))
+
+    processes = [mp.Process(target=replay_worker,
+                            args=(state_size, args, transition_queue, sample_queue,
+                                  priority_queue, stop_event))]
+    for rank, epsilon in enumerate(epsilons):
+        processes.append(mp.Process(target=actor_worker,
+                                    args=(rank, args.env_name, args.seed, epsilon, args,
+                                          shared_q_net, version, lock,
+                                          transition_queue, stats_queue, stop_event)))
+    for process in processes:
+        process.daemon = True
+        process.start()
+
+    running_score = 0
+    episodes = 0
+    updates = 0
+    solved = False
+
+    try:
+        for iteration in range(args.max_iter_num):
+            for _ in range(args.iter_updates):
+                with timers('replay.wait'):
+                    batch = sample_queue.get()
+
+                q_net.train(), target_q_net.train()
+                with timers('train'):
+                    priorities = train_model(q_net, target_q_net, optimizer, batch, args)
+                timers.count('updates')
+                priority_queue.put((batch['index'], priorities))
+                updates += 1
+
+                if updates % args.publish_interval == 0:
+                    with timers('publish'), lock:
+                        for shared_param, param in zip(shared_q_net.parameters(), q_net.parameters()):
+                            shared_param.data.copy_(param.data)
+                        version.value = updates
+                if updates % args.update_target == 0:
+                    update_target_model(q_net, target_q_net)
+
+            scores = []
+            while True:
+                try:
+                    num_steps, actor_scores = stats_queue.get_nowait()
+                except queue.Empty:
+                    break
+                timers.count('samples', num_steps)
+                scores.extend(actor_scores)
+
+            for score in scores:
+                running_score = 0.99 * running_score + 0.01 * score
+            episodes += len(scores)
+            if scores:
+                writer.add_scalar('log/score', float(np.mean(scores)), iteration)
+
+            profiler.step()
+
+            if iteration % args.log_interval == 0:
+                print('{} iter | {} updates | {} episode | running_score: {:.2f}'.format(
+                    iteration, updates, episodes, running_score))
+                print(timers.report(writer, iteration))
+
+            if running_score > args.goal_score:
+                with timers('checkpoint'):
+                    save_state_dict(q_net, args.save_path + 'model.pth.tar')
+                print('Running score exceeds {}. So end'.format(args.goal_score))
+                solved = True
+                break
+    finally:
+        stop_event.set()
+        for process in processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+
+    profiler.close()
+    writer.close()
+
+    return {'iterations': iteration + 1, 'updates': updates, 'episodes': episodes,
+            'score': running_score, 'solved': solved, 'q_net': q_net}
+
+if __name__ == '__main__':
+    train(parser.parse_args())
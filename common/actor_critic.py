@@ -0,0 +1,154 @@
+import torch
+import torch.nn as nn
+
+
+class FusedActorCritic(nn.Module):
+    """
+    The Actor and Critic MLPs of the MuJoCo PPO/GAIL/VAIL trainers (fc1,
+    fc2, fc3 with tanh in between) evaluated as one network, so a
+    minibatch costs one forward and one backward pass instead of two.
+
+    Separately (shared_trunk=False) the two first layers are stacked into
+    one matmul, the second layers run as one batched matmul over the
+    [actor, critic] pair and each keeps its own output layer; the function
+    computed is exactly that of the two MLPs. With shared_trunk the critic
+    head sits on the actor's hidden layers and both heads are one matmul.
+
+    Weights are copied from the given actor and critic. state_dict() uses
+    their keys under 'actor.' and 'critic.' (what an nn.ModuleDict of the
+    two would save), actor_state_dict() and critic_state_dict() load into
+    plain Actor and Critic modules, so checkpoints stay interchangeable.
+    A shared trunk saves the trunk in both and loads it from the actor.
+    """
+
+    def __init__(self, actor, critic, shared_trunk=False):
+        super(FusedActorCritic, self).__init__()
+        self.shared_trunk = shared_trunk
+        self.hidden_size = actor.fc2.weight.shape[0]
+        self.num_outputs = actor.fc3.weight.shape[0]
+
+        hidden = self.hidden_size
+        num_inputs = actor.fc1.weight.shape[1]
+        if shared_trunk:
+            self.weight1 = nn.Parameter(torch.empty(hidden, num_inputs))
+            self.bias1 = nn.Parameter(torch.empty(hidden))
+            self.weight2 = nn.Parameter(torch.empty(hidden, hidden))
+            self.bias2 = nn.Parameter(torch.empty(hidden))
+            self.weight3 = nn.Parameter(torch.empty(self.num_outputs + 1, hidden))
+            self.bias3 = nn.Parameter(torch.empty(self.num_outputs + 1))
+        else:
+            self.weight1 = nn.Parameter(torch.empty(2 * hidden, num_inputs))
+            self.bias1 = nn.Parameter(torch.empty(2 * hidden))
+            self.weight2 = nn.Parameter(torch.empty(2, hidden, hidden))
+            self.bias2 = nn.Parameter(torch.empty(2, 1, hidden))
+            self.actor_weight3 = nn.Parameter(torch.empty(self.num_outputs, hidden))
+            self.actor_bias3 = nn.Parameter(torch.empty(self.num_outputs))
+            self.critic_weight3 = nn.Parameter(torch.empty(1, hidden))
+            self.critic_bias3 = nn.Parameter(torch.empty(1))
+        self.load_actor_critic(actor.state_dict(), critic.state_dict())
+
+        self.register_state_dict_post_hook(FusedActorCritic._split_state_dict)
+        self.register_load_state_dict_pre_hook(FusedActorCritic._fuse_state_dict)
+
+    def _slots(self):
+        # (key, actor slot, critic slot), a slot being the fused parameter
+        # and the index of that network's part of it
+        hidden, outputs = self.hidden_size, self.num_outputs
+        everything = slice(None)
+        if self.shared_trunk:
+            return [('fc1.weight', (self.weight1, everything), None),
+                    ('fc1.bias', (self.bias1, everything), None),
+                    ('fc2.weight', (self.weight2, everything), None),
+                    ('fc2.bias', (self.bias2, everything), None),
+                    ('fc3.weight', (self.weight3, slice(None, outputs)), (self.weight3, slice(outputs, None))),
+                    ('fc3.bias', (self.bias3, slice(None, outputs)), (self.bias3, slice(outputs, None)))]
+        return [('fc1.weight', (self.weight1, slice(None, hidden)), (self.weight1, slice(hidden, None))),
+                ('fc1.bias', (self.bias1, slice(None, hidden)), (self.bias1, slice(hidden, None))),
+                ('fc2.weight', (self.weight2, 0), (self.weight2, 1)),
+                ('fc2.bias', (self.bias2, (0, 0)), (self.bias2, (1, 0))),
+                ('fc3.weight', (self.actor_weight3, everything), (self.critic_weight3, everything)),
+                ('fc3.bias', (self.actor_bias3, everything), (self.critic_bias3, everything))]
+
+    def actor_state_dict(self):
+        return {key: param.detach()[index].clone() for key, (param, index), _ in self._slots()}
+
+    def critic_state_dict(self):
+        # a shared trunk is saved under the critic's keys too
+        state = self.actor_state_dict()
+        for key, _, critic in self._slots():
+            if critic is not None:
+                param, index = critic
+                state[key] = param.detach()[index].clone()
+        return state
+
+    def load_actor_critic(self, actor_state, critic_state):
+        # a shared trunk is loaded from the actor, the critic's is ignored
+        with torch.no_grad():
+            for key, (param, index), critic in self._slots():
+                param[index] = actor_state[key]
+                if critic is not None:
+                    param, index = critic
+                    param[index] = critic_state[key]
+
+    def copy_to(self, actor, critic):
+        # refreshes the plain modules that act, publish and get checkpointed
+        actor.load_state_dict(self.actor_state_dict())
+        critic.load_state_dict(self.critic_state_dict())
+
+    @staticmethod
+    def _split_state_dict(module, state_dict, prefix, local_metadata):
+        for name, _ in module.named_parameters(recurse=False):
+            del state_dict[prefix + name]
+        for key, value in module.actor_state_dict().items():
+            state_dict[prefix + 'actor.' + key] = value
+        for key, value in module.critic_state_dict().items():
+            state_dict[prefix + 'critic.' + key] = value
+
+    @staticmethod
+    def _fuse_state_dict(module, state_dict, prefix, local_metadata, strict, missing_keys,
+                         unexpected_keys, error_msgs):
+        keys = [key for key, _, _ in module._slots()]
+        actor_state = {key: state_dict.pop(prefix + 'actor.' + key) for key in keys}
+        critic_state = {key: state_dict.pop(prefix + 'critic.' + key) for key in keys}
+        module.load_actor_critic(actor_state, critic_state)
+        # the regular loading that follows copies the parameters onto themselves
+        for name, param in module.named_parameters(recurse=False):
+            state_dict[prefix + name] = param.detach()
+
+    def decay_critic_grads(self, weight_decay):
+        # the critic's own optimizer had weight_decay, which Adam adds to the
+        # gradient; the fused parameters share one optimizer, so it is added
+        # to the critic's part of the gradients here instead
+        for _, _, critic in self._slots():
+            if critic is None:
+                continue
+            param, index = critic
+            if param.grad is not None:
+                param.grad[index] += weight_decay * param.detach()[index]
+
+    def forward(self, x):
+        hidden = self.hidden_size
+        if self.shared_trunk:
+            x = torch.tanh(torch.addmm(self.bias1, x, self.weight1.t()))
+            x = torch.tanh(torch.addmm(self.bias2, x, self.weight2.t()))
+            out = torch.addmm(self.bias3, x, self.weight3.t())
+            mu, v = out[:, :self.num_outputs], out[:, self.num_outputs:]
+        else:
+            # [batch, 2 * hidden] -> [2, batch, hidden], actor first
+            x = torch.tanh(torch.addmm(self.bias1, x, self.weight1.t()))
+            x = x.view(-1, 2, hidden).transpose(0, 1)
+            x = torch.tanh(torch.baddbmm(self.bias2, x, self.weight2.transpose(1, 2)))
+            mu = torch.addmm(self.actor_bias3, x[0], self.actor_weight3.t())
+            v = torch.addmm(self.critic_bias3, x[1], self.critic_weight3.t())
+        # the actor's fixed log std of 0
+        std = torch.ones_like(mu)
+        return mu, std, v
+
+
+def evaluate(actor, critic, states):
+    # mu, std and value of the states: one pass of a FusedActorCritic,
+    # passed as actor with critic None, or one pass of each network
+    if critic is None:
+        return actor(states)
+    mu, std = actor(states)
+    return mu, std, critic(states)
@@ -0,0 +1,94 @@
+import os
+import sys
+import importlib.util
+
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+ALGORITHMS = {
+    'cartpole/dqn': 'cartpole/dqn/train.py',
+    'cartpole/ddqn': 'cartpole/ddqn/train.py',
+    'cartpole/a2c': 'cartpole/a2c/train.py',
+    'cartpole/apex': 'cartpole/dqn/apex.py',
+    'cartpole/impala': 'cartpole/a2c/impala.py',
+    'pendulum/ddpg': 'pendulum/ddpg/train.py',
+    'pendulum/sac': 'pendulum/sac/train.py',
+    'pendulum/ppo': 'pendulum/ppo/train.py',
+    'pendulum/ppo_gae': 'pendulum/ppo_gae/train.py',
+    'pendulum/trpo': 'pendulum/trpo/train.py',
+    'pendulum/trpo_gae': 'pendulum/trpo_gae/train.py',
+    'pendulum/tnpg': 'pendulum/tnpg/train.py',
+    'mountaincar/ddpg': 'mountaincar/ddpg/train.py',
+    'mountaincar/sac': 'mountaincar/sac/train.py',
+    'mountaincar/app': 'mountaincar/app/train.py',
+    'mountaincar/maxent': 'mountaincar/maxent/train.py',
+    'mujoco/ppo': 'mujoco/ppo/main.py',
+    'mujoco/trpo': 'mujoco/trpo/train.py',
+    'mujoco/tnpg': 'mujoco/tnpg/train.py',
+    'mujoco/gail': 'mujoco/gail/main.py',
+    'mujoco/vail': 'mujoco/vail/main.py',
+}
+
+_modules = {}
+
+
+def module_paths(module):
+    # namespace packages such as mujoco/*/utils only have a __path__
+    paths = [getattr(module, '__file__', None)]
+    spec = getattr(module, '__spec__', None)
+    if spec is not None and spec.submodule_search_locations is not None:
+        paths += list(spec.submodule_search_locations)
+    return [path for path in paths if isinstance(path, str)]
+
+
+def load(name):
+    """
+    Imports the training module of an algorithm, e.g. load('cartpole/dqn'),
+    without running it. The modules import their neighbours by bare name
+    (model, utils, ...), which collide between algorithms, so those are
+    dropped from sys.modules again once the module holds references to
+    them; every algorithm keeps its own copies.
+    """
+    if name in _modules:
+        return _modules[name]
+    if name not in ALGORITHMS:
+        raise ValueError('unknown algorithm: {}'.format(name))
+
+    path = os.path.join(root, ALGORITHMS[name])
+    algo_dir = os.path.dirname(path)
+    module_name = 'algorithm_' + name.replace('/', '_')
+
+    before = set(sys.modules)
+    sys.path.insert(0, algo_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    except BaseException:
+        sys.modules.pop(module_name, None)
+        raise
+    finally:
+        sys.path.remove(algo_dir)
+        for key in set(sys.modules) - before:
+            if key != module_name and any(os.path.abspath(path).startswith(algo_dir + os.sep)
+                                          for path in module_paths(sys.modules[key])):
+                del sys.modules[key]
+
+    _modules[name] = module
+    return module
+
+
+def make_config(name, **overrides):
+    return load(name).Config(**overrides)
+
+
+def train(name, config=None, **overrides):
+    """
+    Runs an algorithm in this process and returns its result dict, e.g.
+    train('pendulum/ppo', max_iter_num=50, log_backend='none').
+    Relative paths (logs, checkpoints, demonstrations) resolve against the
+    current working directory, as they do for the scripts.
+    """
+    if config is None:
+        config = make_config(name, **overrides)
+    return load(name).train(config)
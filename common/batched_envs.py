@@ -0,0 +1,259 @@
+import numpy as np
+
+
+class Box:
+    def __init__(self, low, high):
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.shape = self.low.shape
+
+
+class Discrete:
+    def __init__(self, n):
+        self.n = n
+        self.shape = ()
+
+
+class BatchedEnv:
+    """
+    Steps num_envs copies of a classic-control task with one numpy call.
+
+    step() takes actions of shape [num_envs] (discrete) or [num_envs, 1]
+    (continuous) and returns (obs, rewards, dones, info). Finished
+    environments are reset automatically: obs holds the first observation
+    of the new episode, info['terminal_observation'] the last observation
+    of the old one and info['TimeLimit.truncated'] marks episodes that were
+    cut by the time limit rather than terminated, as gym's TimeLimit does.
+
+    Dynamics, rewards, termination and initial-state distributions follow
+    the gym versions the trainers use. Seeding is per batch, so a batched
+    env and gym draw different initial states for the same seed.
+    """
+
+    max_episode_steps = None
+
+    def __init__(self, num_envs, seed=None, max_episode_steps=None):
+        self.num_envs = num_envs
+        if max_episode_steps is not None:
+            self.max_episode_steps = max_episode_steps
+
+        self.state = None
+        self.elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        self.np_random = np.random.RandomState(seed)
+        return [seed]
+
+    def reset(self):
+        self.state = self.initial_state(self.num_envs)
+        self.elapsed_steps[:] = 0
+        return self.observe(self.state)
+
+    def set_state(self, state):
+        # used to start from a known state, e.g. one copied out of a gym env
+        self.state = np.array(state, dtype=np.float64).reshape(self.num_envs, -1)
+        self.elapsed_steps[:] = 0
+
+    def step(self, actions):
+        self.state, rewards, terminated = self.dynamics(self.state, actions)
+        self.elapsed_steps += 1
+
+        truncated = (self.elapsed_steps >= self.max_episode_steps) & ~terminated
+        dones = terminated | truncated
+        obs = self.observe(self.state)
+
+        info = {'TimeLimit.truncated': truncated}
+        if dones.any():
+            info['terminal_observation'] = obs.copy()
+            index = np.nonzero(dones)[0]
+            self.state[index] = self.initial_state(len(index))
+            self.elapsed_steps[index] = 0
+            obs[index] = self.observe(self.state[index])
+
+        return obs, rewards, dones, info
+
+    def initial_state(self, n):
+        raise NotImplementedError
+
+    def dynamics(self, state, actions):
+        raise NotImplementedError
+
+    def observe(self, state):
+        return state.copy()
+
+    def close(self):
+        pass
+
+
+class BatchedCartPole(BatchedEnv):
+    # CartPole-v1
+    max_episode_steps = 500
+
+    gravity = 9.8
+    masscart = 1.0
+    masspole = 0.1
+    total_mass = masspole + masscart
+    length = 0.5
+    polemass_length = masspole * length
+    force_mag = 10.0
+    tau = 0.02
+
+    theta_threshold_radians = 12 * 2 * np.pi / 360
+    x_threshold = 2.4
+
+    def __init__(self, num_envs, seed=None, max_episode_steps=None):
+        high = np.array([self.x_threshold * 2, np.finfo(np.float32).max,
+                         self.theta_threshold_radians * 2, np.finfo(np.float32).max])
+        self.observation_space = Box(-high, high)
+        self.action_space = Discrete(2)
+        super().__init__(num_envs, seed, max_episode_steps)
+
+    def initial_state(self, n):
+        return self.np_random.uniform(low=-0.05, high=0.05, size=(n, 4))
+
+    def dynamics(self, state, actions):
+        x, x_dot, theta, theta_dot = state.T
+        force = np.where(np.asarray(actions).reshape(-1) == 1, self.force_mag, -self.force_mag)
+        costheta = np.cos(theta)
+        sintheta = np.sin(theta)
+
+        temp = (force + self.polemass_length * theta_dot * theta_dot * sintheta) / self.total_mass
+        thetaacc = (self.gravity * sintheta - costheta * temp) / \
+                   (self.length * (4.0 / 3.0 - self.masspole * costheta * costheta / self.total_mass))
+        xacc = temp - self.polemass_length * thetaacc * costheta / self.total_mass
+
+        # semi-implicit ordering as in gym: positions use the old velocities
+        x = x + self.tau * x_dot
+        x_dot = x_dot + self.tau * xacc
+        theta = theta + self.tau * theta_dot
+        theta_dot = theta_dot + self.tau * thetaacc
+
+        state = np.stack([x, x_dot, theta, theta_dot], axis=1)
+        terminated = (x < -self.x_threshold) | (x > self.x_threshold) | \
+                     (theta < -self.theta_threshold_radians) | (theta > self.theta_threshold_radians)
+        rewards = np.ones(self.num_envs)
+        return state, rewards, terminated
+
+
+def angle_normalize(x):
+    return ((x + np.pi) % (2 * np.pi)) - np.pi
+
+
+class BatchedPendulum(BatchedEnv):
+    # Pendulum-v0
+    max_episode_steps = 200
+
+    max_speed = 8
+    max_torque = 2.0
+    dt = 0.05
+    g = 10.0
+    m = 1.0
+    l = 1.0
+
+    def __init__(self, num_envs, seed=None, max_episode_steps=None):
+        high = np.array([1.0, 1.0, self.max_speed])
+        self.observation_space = Box(-high, high)
+        self.action_space = Box([-self.max_torque], [self.max_torque])
+        super().__init__(num_envs, seed, max_episode_steps)
+
+    def initial_state(self, n):
+        high = np.array([np.pi, 1])
+        return self.np_random.uniform(low=-high, high=high, size=(n, 2))
+
+    def dynamics(self, state, actions):
+        th, thdot = state.T
+        u = np.clip(np.asarray(actions, dtype=np.float64).reshape(-1), -self.max_torque, self.max_torque)
+
+        costs = angle_normalize(th) ** 2 + .1 * thdot ** 2 + .001 * (u ** 2)
+
+        newthdot = thdot + (-3 * self.g / (2 * self.l) * np.sin(th + np.pi) +
+                            3. / (self.m * self.l ** 2) * u) * self.dt
+        newth = th + newthdot * self.dt
+        newthdot = np.clip(newthdot, -self.max_speed, self.max_speed)
+
+        state = np.stack([newth, newthdot], axis=1)
+        return state, -costs, np.zeros(self.num_envs, dtype=bool)
+
+    def observe(self, state):
+        th, thdot = state.T
+        return np.stack([np.cos(th), np.sin(th), thdot], axis=1)
+
+
+class BatchedMountainCar(BatchedEnv):
+    # MountainCar-v0
+    max_episode_steps = 200
+
+    min_position = -1.2
+    max_position = 0.6
+    max_speed = 0.07
+    goal_position = 0.5
+    goal_velocity = 0
+    force = 0.001
+    gravity = 0.0025
+
+    def __init__(self, num_envs, seed=None, max_episode_steps=None):
+        self.observation_space = Box([self.min_position, -self.max_speed],
+                                     [self.max_position, self.max_speed])
+        self.action_space = Discrete(3)
+        super().__init__(num_envs, seed, max_episode_steps)
+
+    def initial_state(self, n):
+        position = self.np_random.uniform(low=-0.6, high=-0.4, size=n)
+        return np.stack([position, np.zeros(n)], axis=1)
+
+    def accelerate(self, position, actions):
+        return (np.asarray(actions).reshape(-1) - 1) * self.force + \
+               np.cos(3 * position) * (-self.gravity)
+
+    def move(self, state, actions):
+        position, velocity = state.T
+        velocity = velocity + self.accelerate(position, actions)
+        velocity = np.clip(velocity, -self.max_speed, self.max_speed)
+        position = position + velocity
+        position = np.clip(position, self.min_position, self.max_position)
+        velocity = np.where((position == self.min_position) & (velocity < 0), 0.0, velocity)
+
+        terminated = (position >= self.goal_position) & (velocity >= self.goal_velocity)
+        return np.stack([position, velocity], axis=1), terminated
+
+    def dynamics(self, state, actions):
+        state, terminated = self.move(state, actions)
+        return state, -np.ones(self.num_envs), terminated
+
+
+class BatchedMountainCarContinuous(BatchedMountainCar):
+    # MountainCarContinuous-v0
+    max_episode_steps = 999
+
+    goal_position = 0.45
+    power = 0.0015
+
+    def __init__(self, num_envs, seed=None, max_episode_steps=None):
+        super().__init__(num_envs, seed, max_episode_steps)
+        self.action_space = Box([-1.0], [1.0])
+
+    def accelerate(self, position, actions):
+        force = np.clip(np.asarray(actions, dtype=np.float64).reshape(-1), -1.0, 1.0)
+        return force * self.power - 0.0025 * np.cos(3 * position)
+
+    def dynamics(self, state, actions):
+        state, terminated = self.move(state, actions)
+        # the action cost uses the unclipped action, as in gym
+        actions = np.asarray(actions, dtype=np.float64).reshape(-1)
+        rewards = np.where(terminated, 100.0, 0.0) - actions ** 2 * 0.1
+        return state, rewards, terminated
+
+
+BATCHED_ENVS = {
+    'CartPole-v1': BatchedCartPole,
+    'Pendulum-v0': BatchedPendulum,
+    'MountainCar-v0': BatchedMountainCar,
+    'MountainCarContinuous-v0': BatchedMountainCarContinuous,
+}
+
+
+def make_batched(env_name, num_envs, seed=None):
+    if env_name not in BATCHED_ENVS:
+        raise ValueError('no batched implementation of {}'.format(env_name))
+    return BATCHED_ENVS[env_name](num_envs, seed=seed)
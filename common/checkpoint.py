@@ -0,0 +1,140 @@
+import os
+import copy
+import json
+import queue
+import threading
+
+import numpy as np
+import torch
+
+
+def atomic_write(path, write):
+    # readers see either the old file or the complete new one, never a
+    # partial write: write(f) fills a temp file that then replaces path
+    tmp_path = '{}.tmp.{}'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def snapshot(state):
+    # copy of the state that later in-place updates of the models, the
+    # optimizers or the ZFilter can not reach; a memcpy per tensor
+    if isinstance(state, torch.Tensor):
+        return state.detach().to('cpu', copy=True)
+    if isinstance(state, np.ndarray):
+        return state.copy()
+    if isinstance(state, dict):
+        return type(state)((key, snapshot(value)) for key, value in state.items())
+    if isinstance(state, (list, tuple)):
+        return type(state)(snapshot(value) for value in state)
+    return copy.deepcopy(state)
+
+def load_checkpoint(path, mmap=True):
+    # mmap maps the tensor storages instead of reading them, so loading
+    # costs only the pages that are touched; the checkpoints hold numpy
+    # ZFilter arrays and args, hence no weights_only
+    return torch.load(path, map_location='cpu', mmap=mmap, weights_only=False)
+
+
+class CheckpointManager:
+    """
+    Writes checkpoints from a background thread. save() takes a snapshot
+    of the state in the calling thread, so later updates can not leak
+    into the file, and hands it to the writer, which serializes it,
+    writes it atomically and deletes every checkpoint that is neither
+    among the keep_best highest scores nor the keep_last most recent.
+    The kept checkpoints are listed in <prefix>_index.json, which also
+    carries them over runs.
+    """
+
+    def __init__(self, directory, keep_best=3, keep_last=2, prefix='ckpt', max_pending=2):
+        self.directory = directory
+        self.keep_best = keep_best
+        self.keep_last = keep_last
+        self.prefix = prefix
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.index_path = os.path.join(directory, prefix + '_index.json')
+        self.records = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.records = json.load(f)
+
+        self.error = None
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def save(self, state, step, score=None):
+        # returns the path the checkpoint will have once it is written
+        self._raise_error()
+        state = snapshot(state)
+        path = os.path.join(self.directory, '{}_{}.pth.tar'.format(self.prefix, step))
+        record = {'path': os.path.basename(path), 'step': step,
+                  'score': None if score is None else float(score)}
+        # blocks only when the writer is max_pending checkpoints behind
+        self.queue.put((path, state, record))
+        return path
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            path, state, record = item
+            try:
+                atomic_write(path, lambda f: torch.save(state, f))
+                self.records = [r for r in self.records if r['path'] != record['path']] + [record]
+                self._prune()
+            except Exception as e:
+                self.error = e
+            self.queue.task_done()
+
+    def _prune(self):
+        latest = sorted(self.records, key=lambda r: r['step'])[-self.keep_last:] if self.keep_last > 0 else []
+        scored = [r for r in self.records if r['score'] is not None]
+        best = sorted(scored, key=lambda r: r['score'])[-self.keep_best:] if self.keep_best > 0 else []
+        keep = {r['path'] for r in latest + best}
+
+        for r in self.records:
+            if r['path'] not in keep:
+                path = os.path.join(self.directory, r['path'])
+                if os.path.exists(path):
+                    os.remove(path)
+        self.records = sorted((r for r in self.records if r['path'] in keep), key=lambda r: r['step'])
+        index = json.dumps(self.records, indent=1).encode()
+        atomic_write(self.index_path, lambda f: f.write(index))
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def best(self):
+        # path of the highest scoring kept checkpoint, or None
+        self.wait()
+        scored = [r for r in self.records if r['score'] is not None]
+        if not scored:
+            return None
+        return os.path.join(self.directory, max(scored, key=lambda r: r['score'])['path'])
+
+    def latest(self):
+        self.wait()
+        if not self.records:
+            return None
+        return os.path.join(self.directory, max(self.records, key=lambda r: r['step'])['path'])
+
+    def wait(self):
+        # blocks until every queued checkpoint is on disk
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self._raise_error()
@@ -0,0 +1,20 @@
+from dataclasses import make_dataclass, field
+from typing import Optional
+
+
+def config_class(parser, module, name='Config'):
+    """
+    Builds a dataclass with one field per flag of parser, defaulting to the
+    flag's default, so train(Config(max_iter_num=10)) and the command line
+    share one definition. An argparse Namespace works wherever a Config
+    does.
+    """
+    specs = []
+    for key, value in vars(parser.parse_args([])).items():
+        value_type = Optional[str] if value is None else type(value)
+        specs.append((key, value_type, field(default=value)))
+
+    cls = make_dataclass(name, specs)
+    # lets checkpoints that store the config pickle it by reference
+    cls.__module__ = module
+    return cls
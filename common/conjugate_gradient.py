@@ -0,0 +1,87 @@
+import torch
+
+from common.profiling import timers
+
+
+class ConjugateGradient(object):
+    """
+    Conjugate gradient for the natural gradient systems F x = g of the
+    TRPO/TNPG trainers, given the damped Fisher as a product Avp(p).
+
+    With the defaults it runs the fixed 10 steps against the absolute
+    r.r < residual_tol test of the OpenAI baselines conjugate gradient
+    the trainers started from. rtol stops once |r| <= rtol |g|
+    instead, warm_start begins from the previous update's solution
+    (falling back to zero when that is further from g than zero is), and
+    solve(..., diagonal=d) preconditions with the diagonal d of the
+    damped Fisher.
+
+    Every solve keeps the relative residual |g - F x| / |g| after each
+    step; stats() gives the last solve's steps, hessian vector products
+    and final residual for LogCallback, and with a writer the residual
+    after step i is written as cg/residual_<i> at the update index.
+    """
+
+    def __init__(self, max_steps=10, rtol=0.0, warm_start=False, residual_tol=1e-10, writer=None):
+        self.max_steps = max_steps
+        self.rtol = rtol
+        self.warm_start = warm_start
+        self.residual_tol = residual_tol
+        self.writer = writer
+
+        self.previous = None
+        self.updates = 0
+        self.residuals = []
+        self.hvps = 0
+
+    @timers.timed('cg')
+    def solve(self, Avp, b, diagonal=None):
+        b_norm = b.norm()
+        x = torch.zeros_like(b)
+        r = b.clone()
+        self.hvps = 0
+        if self.warm_start and self.previous is not None and self.previous.shape == b.shape:
+            warm_r = b - Avp(self.previous)
+            self.hvps += 1
+            if warm_r.norm() < b_norm:
+                x, r = self.previous.clone(), warm_r
+
+        z = r / diagonal if diagonal is not None else r
+        p = z.clone()
+        rdotz = torch.dot(r, z)
+        self.residuals = []
+        for _ in range(self.max_steps):
+            Ap = Avp(p)
+            self.hvps += 1
+            alpha = rdotz / torch.dot(p, Ap)
+            x += alpha * p
+            r -= alpha * Ap
+            self.residuals.append(float(r.norm() / b_norm))
+            if torch.dot(r, r) < self.residual_tol or self.residuals[-1] <= self.rtol:
+                break
+
+            z = r / diagonal if diagonal is not None else r
+            new_rdotz = torch.dot(r, z)
+            p = z + new_rdotz / rdotz * p
+            rdotz = new_rdotz
+
+        self.previous = x.clone()
+        if self.writer is not None:
+            for i, residual in enumerate(self.residuals):
+                self.writer.add_scalar('cg/residual_{}'.format(i + 1), residual, self.updates)
+        self.updates += 1
+        return x
+
+    def stats(self):
+        # empty until a solve ran, e.g. while a direct or KFAC solver is used
+        if not self.residuals:
+            return {}
+        return {'cg_steps': len(self.residuals), 'cg_hvps': self.hvps,
+                'cg_residual': self.residuals[-1]}
+
+    def state_dict(self):
+        return {'previous': self.previous, 'updates': self.updates}
+
+    def load_state_dict(self, state):
+        self.previous = state['previous']
+        self.updates = state['updates']
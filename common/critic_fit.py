@@ -0,0 +1,76 @@
+import copy
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+import torch.optim as optim
+
+CRITIC_FIT_METHODS = ('adam', 'lbfgs', 'early_stop')
+
+
+def value_loss(critic, states, targets):
+    # full-batch mean squared error, for the logs
+    with torch.no_grad():
+        return float(F.mse_loss(critic(states), targets))
+
+def fit_critic_lbfgs(critic, states, targets, max_iter=20):
+    # full-batch regression with L-BFGS and a strong Wolfe line search. the
+    # optimizer is rebuilt every update, curvature pairs from the previous
+    # targets would describe a different problem
+    optimizer = optim.LBFGS(critic.parameters(), max_iter=max_iter, history_size=10,
+                            line_search_fn='strong_wolfe')
+
+    def closure():
+        optimizer.zero_grad()
+        loss = F.mse_loss(critic(states), targets)
+        loss.backward()
+        return loss
+
+    optimizer.step(closure)
+    state = optimizer.state[optimizer._params[0]]
+    return {'critic_loss': value_loss(critic, states, targets),
+            'critic_iters': state.get('n_iter', 0), 'critic_evals': state.get('func_evals', 0)}
+
+def fit_critic_early_stop(critic, optimizer, states, targets, batch_size, max_epochs=20,
+                          holdout=0.1, patience=2):
+    # minibatch epochs of the trainer's optimizer on all but a held-out
+    # fraction of the batch, stopped once the held-out loss has not
+    # improved for patience epochs; the best weights are kept
+    n = len(states)
+    index = torch.from_numpy(np.random.permutation(n))
+    num_holdout = max(1, int(n * holdout))
+    holdout_index, train_index = index[:num_holdout], index[num_holdout:]
+
+    best_loss = value_loss(critic, states[holdout_index], targets[holdout_index])
+    best_state = copy.deepcopy(critic.state_dict())
+    bad_epochs = 0
+    for epoch in range(max_epochs):
+        order = train_index[torch.randperm(len(train_index))]
+        for i in range(0, len(order) - batch_size + 1, batch_size):
+            batch = order[i:i + batch_size]
+            loss = F.mse_loss(critic(states[batch]), targets[batch])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        loss = value_loss(critic, states[holdout_index], targets[holdout_index])
+        if loss < best_loss:
+            best_loss, best_state, bad_epochs = loss, copy.deepcopy(critic.state_dict()), 0
+        else:
+            bad_epochs += 1
+            if bad_epochs >= patience:
+                break
+
+    critic.load_state_dict(best_state)
+    return {'critic_loss': value_loss(critic, states, targets), 'critic_holdout_loss': best_loss,
+            'critic_epochs': epoch + 1}
+
+def fit_critic(method, critic, optimizer, states, targets, batch_size, iters):
+    # iters is the L-BFGS iteration budget or the epoch limit of early_stop
+    states = torch.as_tensor(states, dtype=torch.float32)
+    targets = targets.detach()
+    if method == 'lbfgs':
+        return fit_critic_lbfgs(critic, states, targets, max_iter=iters)
+    if method == 'early_stop':
+        return fit_critic_early_stop(critic, optimizer, states, targets, batch_size, max_epochs=iters)
+    raise ValueError('unknown critic fit method: {}'.format(method))
@@ -0,0 +1,123 @@
+import numpy as np
+import torch
+import torch.distributed as dist
+
+from common.profiling import timers
+from common.sampler import merge_running_stat
+
+
+def init_process_group(rank, world_size, dist_url):
+    # gloo runs on CPU tensors and rendezvous over TCP, so the same setup
+    # works for local processes and for ranks on several hosts
+    dist.init_process_group('gloo', init_method=dist_url, rank=rank, world_size=world_size)
+    torch.set_num_threads(1)
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+def broadcast_module(module, src=0):
+    # every rank starts from the weights of src
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        dist.broadcast(tensor.data, src)
+
+@timers.timed('all_reduce')
+def all_reduce_gradients(parameters):
+    # averages the gradients of all ranks with a single flat all_reduce
+    parameters = [param for param in parameters if param.grad is not None]
+    flat = torch.cat([param.grad.reshape(-1) for param in parameters])
+    dist.all_reduce(flat)
+    flat /= dist.get_world_size()
+
+    offset = 0
+    for param in parameters:
+        numel = param.grad.numel()
+        param.grad.copy_(flat[offset:offset + numel].view_as(param.grad))
+        offset += numel
+
+def min_across_ranks(value):
+    tensor = torch.tensor([value], dtype=torch.int64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.MIN)
+    return int(tensor.item())
+
+def mean_across_ranks(value):
+    tensor = torch.tensor([value], dtype=torch.float64)
+    dist.all_reduce(tensor)
+    return float(tensor.item()) / dist.get_world_size()
+
+def all_gather_list(values):
+    # concatenation of every rank's list, in rank order
+    gathered = [None] * dist.get_world_size()
+    dist.all_gather_object(gathered, list(values))
+    return [value for values in gathered for value in values]
+
+
+class SyncedFilter:
+    """
+    ZFilter wrapper for data-parallel collection. Each rank normalizes with
+    its own filter while it collects, sync() then folds the observations
+    of all ranks into the statistics from the start of the batch, in rank
+    order, so every rank continues with the same filter.
+    """
+
+    def __init__(self, running_state):
+        self.running_state = running_state
+        self.start_batch()
+
+    @property
+    def rs(self):
+        return self.running_state.rs
+
+    def start_batch(self):
+        rs = self.running_state.rs
+        self.base = (rs.n, rs.mean.copy(), rs.sum_square.copy())
+        self.new_stat = type(rs)(rs.shape)
+
+    def __call__(self, x, update=True):
+        if update:
+            self.new_stat.push(x)
+        return self.running_state(x, update)
+
+    def sync(self):
+        new_stat = self.new_stat
+        local = np.concatenate([[new_stat.n], new_stat.mean, new_stat.sum_square])
+        gathered = [torch.zeros(len(local), dtype=torch.float64) for _ in range(dist.get_world_size())]
+        dist.all_gather(gathered, torch.from_numpy(local))
+
+        rs = self.running_state.rs
+        rs.n, rs.mean, rs.sum_square = self.base[0], self.base[1].copy(), self.base[2].copy()
+        size = len(new_stat.mean)
+        for stat in gathered:
+            stat = stat.numpy()
+            merge_running_stat(rs, int(stat[0]), stat[1:1 + size], stat[1 + size:])
+        self.start_batch()
+
+
+class DistributedCollector:
+    """
+    Wraps the collector of one rank: after every batch the ZFilter
+    statistics are merged and the episode scores of all ranks are
+    gathered, so every rank's runner sees the same scores.
+    """
+
+    def __init__(self, collector, synced_filter):
+        self.collector = collector
+        self.synced_filter = synced_filter
+
+    def collect(self, num_steps):
+        memory, scores = self.collector.collect(num_steps)
+        with timers('sync'):
+            self.synced_filter.sync()
+            scores = all_gather_list(scores)
+        return memory, scores
+
+    def update_policy(self):
+        self.collector.update_policy()
+
+    def close(self):
+        self.collector.close()
@@ -0,0 +1,149 @@
+import copy
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.func import functional_call, stack_module_state, vmap
+
+
+class StackedLinear(nn.Module):
+    # one nn.Linear per member as a single batched matmul over [S, B, in]
+    def __init__(self, weight, bias):
+        super(StackedLinear, self).__init__()
+        self.weight = weight
+        self.bias = bias
+
+    def forward(self, x):
+        if self.bias is None:
+            return torch.bmm(x, self.weight.transpose(1, 2))
+        return torch.baddbmm(self.bias.unsqueeze(1), x, self.weight.transpose(1, 2))
+
+
+def stacked_linear_model(model, params):
+    # a copy of model whose nn.Linear layers read the stacked parameters,
+    # or None when it has parameters or buffers outside nn.Linear layers
+    linear = {name for name, module in model.named_modules() if isinstance(module, nn.Linear)}
+    names = [name for name, _ in model.named_parameters()] + [name for name, _ in model.named_buffers()]
+    if not linear or any(name.rpartition('.')[0] not in linear for name in names):
+        return None
+
+    stacked = copy.deepcopy(model).to('meta')
+    for name in linear:
+        parent_name, _, child = name.rpartition('.')
+        parent = stacked.get_submodule(parent_name)
+        prefix = name + '.'
+        setattr(parent, child, StackedLinear(params[prefix + 'weight'], params.get(prefix + 'bias')))
+    return stacked
+
+
+class Ensemble:
+    """
+    num_members copies of one architecture with stacked parameters, called
+    on inputs with a leading member dimension: ensemble(x) for x of shape
+    [S, B, ...] or [S, features] runs member i on x[i] in one call.
+
+    Models built from nn.Linear layers and elementwise ops (the MLPs here)
+    run as batched matmuls, anything else through torch.func.vmap, which
+    costs about twice as much per call for small networks.
+
+    The stacked tensors are the leaves to optimize. Losses are summed over
+    members, so every member gets exactly the gradient it would get alone,
+    and since Adam's state is elementwise one Adam over the stacked
+    parameters is S independent Adams stepping in lockstep.
+    """
+
+    def __init__(self, models, use_vmap=False):
+        self.num_members = len(models)
+        self.params, self.buffers = stack_module_state(models)
+        # the skeleton only supplies forward(), its own tensors are never used
+        self.base = copy.deepcopy(models[0]).to('meta')
+        self.stacked = None if use_vmap else stacked_linear_model(models[0], self.params)
+
+    @classmethod
+    def from_factory(cls, make_model, num_members, seed, use_vmap=False):
+        models = []
+        for i in range(num_members):
+            torch.manual_seed(seed + i)
+            models.append(make_model())
+        return cls(models, use_vmap)
+
+    def _call(self, params, buffers, x):
+        return functional_call(self.base, (params, buffers), (x,))
+
+    def __call__(self, x):
+        if self.stacked is None:
+            return vmap(self._call)(self.params, self.buffers, x)
+        if x.dim() == 2:
+            return self.stacked(x.unsqueeze(1)).squeeze(1)
+        return self.stacked(x)
+
+    def parameters(self):
+        return list(self.params.values())
+
+    def load_from(self, other):
+        # e.g. a hard target network update
+        with torch.no_grad():
+            for name, param in self.params.items():
+                param.copy_(other.params[name])
+            for name, buffer in self.buffers.items():
+                buffer.copy_(other.buffers[name])
+
+    def member_state_dict(self, i):
+        # loads into a single model of the ensembled architecture
+        state = dict(self.params)
+        state.update(self.buffers)
+        return {name: tensor[i].detach().clone() for name, tensor in state.items()}
+
+
+class StackedReplay:
+    """
+    One replay ring buffer per member, stored as [S, capacity, ...] arrays.
+    Every member samples its own indices from its own transitions.
+    """
+
+    def __init__(self, num_members, capacity, specs, seed=None):
+        # specs maps field name to (shape, dtype) of a single transition
+        self.num_members = num_members
+        self.capacity = capacity
+        self.arrays = {name: np.zeros((num_members, capacity) + tuple(shape), dtype=dtype)
+                       for name, (shape, dtype) in specs.items()}
+        self.position = 0
+        self.size = 0
+        self.np_random = np.random.RandomState(seed)
+
+    def append(self, **fields):
+        # every field has a leading member dimension
+        for name, value in fields.items():
+            self.arrays[name][:, self.position] = value
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        index = self.np_random.randint(self.size, size=(self.num_members, batch_size))
+        members = np.arange(self.num_members)[:, None]
+        return {name: array[members, index] for name, array in self.arrays.items()}
+
+    def __len__(self):
+        return self.size
+
+
+class SeedMetrics:
+    """Episode bookkeeping per member for envs that step all members at once."""
+
+    def __init__(self, num_members, writer=None, prefix='seed'):
+        self.num_members = num_members
+        self.writer = writer
+        self.prefix = prefix
+        self.scores = np.zeros(num_members)
+        self.episodes = np.zeros(num_members, dtype=np.int64)
+        self.running_scores = np.zeros(num_members)
+
+    def step(self, rewards, dones):
+        self.scores += rewards
+        for i in np.nonzero(dones)[0]:
+            self.running_scores[i] = 0.99 * self.running_scores[i] + 0.01 * self.scores[i]
+            if self.writer is not None:
+                self.writer.add_scalar('{}{}/score'.format(self.prefix, i),
+                                       float(self.scores[i]), int(self.episodes[i]))
+            self.episodes[i] += 1
+            self.scores[i] = 0
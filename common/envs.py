@@ -0,0 +1,88 @@
+import numpy as np
+import gym
+from gym import spaces
+from gym.envs.registration import register, registry
+
+
+class HopperStandIn(gym.Env):
+    """
+    MuJoCo-free stand-in for Hopper-v2, registered as HopperStandIn-v0.
+
+    It keeps Hopper's interface: qpos (rootx, rootz, rooty, thigh, leg,
+    foot) and qvel, the 11-dim observation qpos[1:] + clip(qvel, -10, 10),
+    3 joint torques in [-1, 1], forward velocity + alive bonus - control
+    cost as reward, the same healthy-state termination and a 1000 step
+    limit. The body is a damped three-joint chain on an unstable torso,
+    integrated with 4 sub-steps per env step, so a step costs roughly what
+    a MuJoCo step does and random policies fall over within tens of steps.
+    Dynamics are fixed and noise-free, the seed only draws the initial
+    state. Scores are not comparable to Hopper.
+    """
+
+    frame_skip = 4
+    dt = 0.002
+
+    init_qpos = np.array([0.0, 1.25, 0.0, 0.0, 0.0, 0.0])
+    gear = np.array([200.0, 200.0, 200.0])
+    stiffness = np.array([20.0, 20.0, 10.0])
+    damping = np.array([2.0, 2.0, 1.0])
+
+    def __init__(self):
+        high = np.inf * np.ones(11)
+        self.observation_space = spaces.Box(-high, high, dtype=np.float64)
+        self.action_space = spaces.Box(-np.ones(3), np.ones(3), dtype=np.float32)
+        self.seed()
+
+    def seed(self, seed=None):
+        self.np_random = np.random.RandomState(seed)
+        return [seed]
+
+    def reset(self):
+        self.qpos = self.init_qpos + self.np_random.uniform(-5e-3, 5e-3, size=6)
+        self.qvel = self.np_random.uniform(-5e-3, 5e-3, size=6)
+        return self._get_obs()
+
+    def _integrate(self, action):
+        joints, joint_vel = self.qpos[3:], self.qvel[3:]
+        x_vel, z, z_vel, angle, angle_vel = self.qvel[0], self.qpos[1], self.qvel[1], \
+                                            self.qpos[2], self.qvel[2]
+
+        joint_acc = self.gear * action - self.stiffness * joints - self.damping * joint_vel
+        # the torso is an inverted pendulum pushed back by the joint torques
+        angle_acc = 9.81 * np.sin(angle) - 0.02 * joint_acc.sum() - 0.5 * angle_vel
+        # the legs set the hip height; extending the thigh and leg pushes the body forward
+        leg_height = 0.55 * np.cos(joints[0]) + 0.5 * np.cos(joints[0] + joints[1]) + \
+                     0.2 * np.cos(joints.sum())
+        z_acc = 100.0 * (leg_height - z) - 10.0 * z_vel
+        x_acc = -0.5 * (joint_vel[0] + joint_vel[1]) * np.cos(angle) - 0.5 * x_vel
+
+        # semi-implicit euler, velocities first as in mujoco
+        self.qvel = self.qvel + self.dt * np.array([x_acc, z_acc, angle_acc,
+                                                    joint_acc[0], joint_acc[1], joint_acc[2]])
+        self.qpos = self.qpos + self.dt * self.qvel
+
+    def _get_obs(self):
+        return np.concatenate([self.qpos[1:], np.clip(self.qvel, -10, 10)])
+
+    def step(self, action):
+        action = np.clip(action, -1.0, 1.0)
+        x_before = self.qpos[0]
+        for _ in range(self.frame_skip):
+            self._integrate(action)
+
+        forward_vel = (self.qpos[0] - x_before) / (self.frame_skip * self.dt)
+        reward = forward_vel + 1.0 - 1e-3 * np.square(action).sum()
+
+        state = np.concatenate([self.qpos, self.qvel])
+        height, angle = self.qpos[1:3]
+        done = not (np.isfinite(state).all() and (np.abs(state[2:]) < 100).all() and
+                    height > 0.7 and abs(angle) < 0.2)
+        return self._get_obs(), reward, done, {}
+
+
+def register_envs():
+    if 'HopperStandIn-v0' not in registry.env_specs:
+        register(id='HopperStandIn-v0',
+                 entry_point='common.envs:HopperStandIn',
+                 max_episode_steps=1000,
+                 reward_threshold=3800.0)
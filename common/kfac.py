@@ -0,0 +1,104 @@
+import torch
+import torch.nn as nn
+
+from common.profiling import timers
+
+
+class KFAC(object):
+    """
+    Kronecker-factored approximation of the Fisher matrix of a Gaussian
+    policy whose parameters all live in nn.Linear layers. Forward hooks,
+    attached only during update_factors(), capture each layer's inputs a
+    and, through a hook on its output, the output gradients g. The
+    layer's block of the Fisher is approximated by E[a a^T] (x) E[g g^T],
+    kept as a running average over updates (stat_decay is the weight of
+    the old factors).
+
+    solve(grad) returns (F + damping I)^-1 grad for the flat gradient of
+    actor.parameters(), each layer's damped Kronecker product inverted
+    exactly through the eigenvectors of its two factors. An update costs
+    one forward and one backward pass plus small eigendecompositions,
+    instead of a double-backward pass per conjugate gradient step.
+    """
+
+    def __init__(self, actor, damping=1e-1, stat_decay=0.9):
+        self.actor = actor
+        self.damping = damping
+        self.stat_decay = stat_decay
+        self.layers = [module for module in actor.modules() if isinstance(module, nn.Linear)]
+
+        covered = {id(param) for layer in self.layers for param in layer.parameters()}
+        if any(id(param) not in covered for param in actor.parameters()):
+            raise ValueError('KFAC needs every parameter of the actor in an nn.Linear layer')
+
+        self.inputs = {}
+        self.output_grads = {}
+        self.factors = {}
+
+    def _save_input(self, layer, inputs, output):
+        self.inputs[layer] = inputs[0].detach()
+        output.register_hook(lambda grad: self._save_output_grad(layer, grad))
+
+    def _save_output_grad(self, layer, grad):
+        self.output_grads[layer] = grad.detach()
+
+    @timers.timed('kfac')
+    def update_factors(self, states):
+        # the Fisher is E[grad log pi(a|s) grad log pi(a|s)^T] with actions
+        # drawn from the policy itself; with a sampled a the output gradient
+        # of log pi is (a - mu) / std^2 = noise / std for noise ~ N(0, 1).
+        # acting and the loss gradients run without the hooks
+        states = torch.as_tensor(states, dtype=torch.float32)
+        handles = [layer.register_forward_hook(self._save_input) for layer in self.layers]
+        try:
+            mu, std = self.actor(states)
+            noise = torch.randn_like(mu)
+            torch.autograd.grad((mu * noise / std.detach()).sum(), list(self.actor.parameters()))
+        finally:
+            for handle in handles:
+                handle.remove()
+
+        num_samples = len(states)
+        for layer in self.layers:
+            a = self.inputs.pop(layer)
+            if layer.bias is not None:
+                a = torch.cat([a, torch.ones(num_samples, 1)], dim=1)
+            g = self.output_grads.pop(layer)
+            a_factor = a.t() @ a / num_samples
+            g_factor = g.t() @ g / num_samples
+            if layer in self.factors:
+                old_a, old_g = self.factors[layer]
+                a_factor = self.stat_decay * old_a + (1 - self.stat_decay) * a_factor
+                g_factor = self.stat_decay * old_g + (1 - self.stat_decay) * g_factor
+            self.factors[layer] = (a_factor, g_factor)
+
+    @timers.timed('kfac')
+    def solve(self, grad):
+        # grad is flat in the order of actor.parameters(), as flat_grad makes it
+        params = list(self.actor.parameters())
+        grads = dict(zip(params, torch.split(grad, [param.numel() for param in params])))
+        solved = {}
+        for layer in self.layers:
+            a_factor, g_factor = self.factors[layer]
+            a_values, a_vectors = torch.linalg.eigh(a_factor)
+            g_values, g_vectors = torch.linalg.eigh(g_factor)
+
+            # [out, in (+ 1 for the bias)]
+            v = grads[layer.weight].view_as(layer.weight)
+            if layer.bias is not None:
+                v = torch.cat([v, grads[layer.bias].unsqueeze(1)], dim=1)
+            v = g_vectors.t() @ v @ a_vectors
+            v = v / (g_values.clamp(min=0).unsqueeze(1) * a_values.clamp(min=0).unsqueeze(0) + self.damping)
+            v = g_vectors @ v @ a_vectors.t()
+
+            solved[layer.weight] = v[:, :layer.in_features]
+            if layer.bias is not None:
+                solved[layer.bias] = v[:, layer.in_features]
+        return torch.cat([solved[param].reshape(-1) for param in params])
+
+    def state_dict(self):
+        return {'factors': [self.factors.get(layer) for layer in self.layers]}
+
+    def load_state_dict(self, state):
+        self.factors = {layer: tuple(factors) for layer, factors in zip(self.layers, state['factors'])
+                        if factors is not None}
@@ -0,0 +1,146 @@
+import os
+import json
+import random
+
+import numpy as np
+
+from common.runner import ReplayBuffer, upcast
+
+
+class MemmapReplayBuffer:
+    """
+    Replay buffer whose columns live in np.memmap .npy files in directory,
+    so capacity is bounded by disk rather than RAM. The files are sparse
+    until written. The most recent transitions, up to hot_size, stay in an
+    in-RAM hot window and are written back to the files in one contiguous
+    block whenever it fills, so appends never touch single disk pages.
+
+    sample() draws uniformly without replacement like ReplayBuffer and
+    gathers the cold rows in sorted index order, which turns a random
+    gather into one forward sweep over the files. The columns come back in
+    that order, which uniform sampling does not care about.
+    """
+
+    def __init__(self, capacity, directory, hot_size=65536, sort_indices=True, dtypes=None):
+        self.capacity = capacity
+        self.directory = directory
+        self.dtypes = dtypes
+        self.hot_size = min(hot_size, capacity)
+        self.sort_indices = sort_indices
+        self.columns = None
+        self.hot = None
+        # ring index where the hot window starts and its number of rows
+        self.flush_position = 0
+        self.pending = 0
+        self.size = 0
+
+    @property
+    def position(self):
+        return (self.flush_position + self.pending) % self.capacity
+
+    def _column_paths(self, count):
+        return [os.path.join(self.directory, 'column{}.npy'.format(i)) for i in range(count)]
+
+    def _create(self, transition):
+        os.makedirs(self.directory, exist_ok=True)
+        dtypes = self.dtypes or [np.asarray(value).dtype for value in transition]
+        specs = [(np.shape(value), np.dtype(dtype).str) for value, dtype in zip(transition, dtypes)]
+        with open(os.path.join(self.directory, 'columns.json'), 'w') as f:
+            json.dump(specs, f)
+        self._open(specs, mode='w+')
+
+    def _open(self, specs, mode):
+        self.columns = [np.lib.format.open_memmap(path, mode=mode, dtype=np.dtype(dtype),
+                                                  shape=(self.capacity,) + tuple(shape))
+                        if mode == 'w+' else np.load(path, mmap_mode=mode)
+                        for path, (shape, dtype) in zip(self._column_paths(len(specs)), specs)]
+        self.hot = [np.zeros((self.hot_size,) + column.shape[1:], dtype=column.dtype)
+                    for column in self.columns]
+
+    def append(self, transition):
+        if self.columns is None:
+            self._create(transition)
+        for hot, value in zip(self.hot, transition):
+            hot[self.pending] = value
+        self.pending += 1
+        self.size = min(self.size + 1, self.capacity)
+        if self.pending == self.hot_size:
+            self.flush()
+
+    def extend(self, columns):
+        # appends n transitions given column-wise, e.g. from batched envs,
+        # straight to the files
+        if self.columns is None:
+            self._create([column[0] for column in columns])
+        self.flush()
+        n = len(columns[0])
+        for start in range(0, n, self.capacity):
+            count = min(n - start, self.capacity)
+            self._write(self.flush_position, [column[start:start + count] for column in columns])
+            self.flush_position = (self.flush_position + count) % self.capacity
+            self.size = min(self.size + count, self.capacity)
+
+    def _write(self, position, blocks):
+        # one or two contiguous slices, depending on the ring wrapping
+        count = len(blocks[0])
+        first = min(count, self.capacity - position)
+        for column, block in zip(self.columns, blocks):
+            column[position:position + first] = block[:first]
+            column[:count - first] = block[first:]
+
+    def flush(self):
+        if self.pending == 0:
+            return
+        self._write(self.flush_position, [hot[:self.pending] for hot in self.hot])
+        self.flush_position = self.position
+        self.pending = 0
+
+    def sample(self, batch_size):
+        indices = np.array(random.sample(range(self.size), batch_size))
+        if self.sort_indices:
+            indices.sort()
+        offsets = (indices - self.flush_position) % self.capacity
+        in_hot = offsets < self.pending
+        cold = indices[~in_hot]
+
+        columns = []
+        for column, hot in zip(self.columns, self.hot):
+            out = np.empty((batch_size,) + column.shape[1:], dtype=column.dtype)
+            out[~in_hot] = column[cold]
+            out[in_hot] = hot[offsets[in_hot]]
+            columns.append(upcast(out))
+        return columns
+
+    def save(self, directory):
+        # the data already is on disk: write back the hot window and record
+        # where the files are and how far they are filled
+        self.flush()
+        for column in self.columns or []:
+            column.flush()
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'replay.json'), 'w') as f:
+            json.dump({'directory': os.path.abspath(self.directory), 'position': self.position,
+                       'size': self.size, 'capacity': self.capacity}, f)
+
+    def load(self, directory):
+        with open(os.path.join(directory, 'replay.json')) as f:
+            meta = json.load(f)
+        if meta['directory'] != os.path.abspath(self.directory) or meta['capacity'] != self.capacity:
+            raise ValueError('the snapshot refers to a replay of {} transitions in {}'.format(
+                meta['capacity'], meta['directory']))
+        with open(os.path.join(self.directory, 'columns.json')) as f:
+            specs = json.load(f)
+        self._open(specs, mode='r+')
+        self.flush_position = meta['position']
+        self.pending = 0
+        self.size = meta['size']
+
+    def __len__(self):
+        return self.size
+
+
+def make_replay_buffer(capacity, directory=None, hot_size=65536, dtypes=None):
+    # in RAM unless a directory for the memmap files is given
+    if directory is None:
+        return ReplayBuffer(capacity, dtypes)
+    return MemmapReplayBuffer(capacity, directory, hot_size, dtypes=dtypes)
@@ -0,0 +1,184 @@
+import os
+import csv
+import json
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+BACKENDS = ('tensorboard', 'csv', 'jsonl', 'none')
+
+
+class TensorBoardBackend:
+    def __init__(self, logdir):
+        try:
+            from tensorboardX import SummaryWriter
+        except ImportError:
+            from torch.utils.tensorboard import SummaryWriter
+        self.writer = SummaryWriter(logdir)
+
+    def write(self, records):
+        for kind, tag, value, step, wall_time in records:
+            if kind == 'histogram':
+                self.writer.add_histogram(tag, value, step, walltime=wall_time)
+            else:
+                self.writer.add_scalar(tag, value, step, walltime=wall_time)
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+
+def summarize(kind, tag, value, step, wall_time):
+    # text backends keep histograms as summary statistics
+    if kind != 'histogram':
+        return [{'kind': kind, 'tag': tag, 'step': step, 'value': float(value),
+                 'wall_time': wall_time}]
+    return [{'kind': kind, 'tag': tag + '/' + name, 'step': step, 'value': float(stat),
+             'wall_time': wall_time}
+            for name, stat in (('mean', value.mean()), ('std', value.std()),
+                               ('min', value.min()), ('max', value.max()))]
+
+
+class CSVBackend:
+    fields = ['kind', 'tag', 'step', 'value', 'wall_time']
+
+    def __init__(self, logdir):
+        path = os.path.join(logdir, 'metrics.csv')
+        new_file = not os.path.exists(path)
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields)
+        if new_file:
+            self.writer.writeheader()
+
+    def write(self, records):
+        for record in records:
+            self.writer.writerows(summarize(*record))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JSONLBackend:
+    def __init__(self, logdir):
+        self.file = open(os.path.join(logdir, 'metrics.jsonl'), 'a')
+
+    def write(self, records):
+        for record in records:
+            for row in summarize(*record):
+                self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class NullWriter:
+    """Drop-in writer used when logging is disabled."""
+
+    def add_scalar(self, tag, value, step=None):
+        pass
+
+    def add_histogram(self, tag, values, step=None):
+        pass
+
+    def add_timing(self, tag, seconds, step=None):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MetricsWriter:
+    """
+    Buffers scalars, histograms and timings in memory and writes them to
+    the backends from a background thread.
+
+    The add_* calls only append to a bounded deque, so the training loop
+    never waits on disk. If the writer falls behind by more than
+    max_queue records the oldest records are dropped.
+    """
+
+    def __init__(self, logdir, backends, flush_interval=1.0, max_queue=100000):
+        if not os.path.isdir(logdir):
+            os.makedirs(logdir)
+
+        self.backends = [make_backend(name, logdir) for name in backends]
+        self.flush_interval = flush_interval
+        self.queue = deque(maxlen=max_queue)
+
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add_scalar(self, tag, value, step=None):
+        self.queue.append(('scalar', tag, float(value), step, time.time()))
+
+    def add_histogram(self, tag, values, step=None):
+        if hasattr(values, 'detach'):
+            values = values.detach().cpu().numpy()
+        values = np.array(values, dtype=np.float64).ravel()
+        self.queue.append(('histogram', tag, values, step, time.time()))
+
+    def add_timing(self, tag, seconds, step=None):
+        self.queue.append(('timing', tag, float(seconds), step, time.time()))
+
+    def _drain(self):
+        records = []
+        while self.queue:
+            try:
+                records.append(self.queue.popleft())
+            except IndexError:
+                break
+        if records:
+            with self.lock:
+                for backend in self.backends:
+                    backend.write(records)
+
+    def _run(self):
+        while not self.closed:
+            self.wake_event.wait(self.flush_interval)
+            self.wake_event.clear()
+            self._drain()
+
+    def flush(self):
+        self._drain()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wake_event.set()
+        self.thread.join()
+        self._drain()
+        for backend in self.backends:
+            backend.close()
+
+
+def make_backend(name, logdir):
+    if name == 'tensorboard':
+        return TensorBoardBackend(logdir)
+    if name == 'csv':
+        return CSVBackend(logdir)
+    if name == 'jsonl':
+        return JSONLBackend(logdir)
+    raise ValueError('unknown log backend: {}'.format(name))
+
+def make_writer(logdir, backend='tensorboard', flush_interval=1.0):
+    # backend is one of BACKENDS or a comma separated list, e.g. "tensorboard,csv"
+    names = [name.strip() for name in backend.split(',') if name.strip()]
+    for name in names:
+        if name not in BACKENDS:
+            raise ValueError('unknown log backend: {}'.format(name))
+
+    names = [name for name in names if name != 'none']
+    if not names:
+        return NullWriter()
+    return MetricsWriter(logdir, names, flush_interval=flush_interval)
@@ -0,0 +1,68 @@
+import torch
+from torch.func import functional_call, jacrev, vmap
+
+from common.profiling import timers
+
+# largest side of the matrix fisher_solve factorizes for which 'auto'
+# picks it over 10 conjugate gradient steps, see benchmarks/natural_gradient.py
+DIRECT_MAX_SIZE = 400
+
+def fisher_jacobian(actor, states):
+    # rows J with J^T J = the Hessian of the mean KL(pi_old || pi) at the
+    # current parameters, i.e. the Fisher matrix of the Gaussian policy:
+    # per sample and action dimension d(mu)/d(theta) / std and, when std
+    # depends on the parameters, sqrt(2) d(log std)/d(theta), over sqrt(N)
+    params = {name: param.detach() for name, param in actor.named_parameters()}
+    # with grad enabled, so requires_grad tells whether std is learned
+    _, std = actor(states)
+    learned_std = std.requires_grad
+
+    def outputs(params, state):
+        mu, std = functional_call(actor, params, (state.unsqueeze(0),))
+        if learned_std:
+            return torch.cat([mu[0], torch.log(std[0])])
+        return mu[0]
+
+    jacobians = vmap(jacrev(outputs), in_dims=(None, 0))(params, states)
+    # [N, outputs, P] in the order of actor.parameters()
+    jacobian = torch.cat([jacobians[name].flatten(2) for name in params], dim=2)
+
+    scale = 1.0 / std.detach()
+    if learned_std:
+        scale = torch.cat([scale, torch.full_like(scale, 2.0 ** 0.5)], dim=1)
+    jacobian = jacobian * scale.unsqueeze(2)
+    return jacobian.reshape(-1, jacobian.shape[2]) / len(states) ** 0.5
+
+@timers.timed('fisher')
+def fisher_solve(actor, states, b, damping=1e-1):
+    # solves (F + damping I) x = b exactly, F = J^T J formed once. with
+    # fewer rows than parameters the Gram matrix J J^T is factorized
+    # instead (Woodbury), so the factorized side is min(rows, parameters)
+    jacobian = fisher_jacobian(actor, torch.as_tensor(states, dtype=torch.float32))
+    rows, num_params = jacobian.shape
+    if num_params <= rows:
+        fisher = jacobian.t() @ jacobian
+        fisher.diagonal().add_(damping)
+        return torch.cholesky_solve(b.unsqueeze(1), torch.linalg.cholesky(fisher)).squeeze(1)
+
+    gram = jacobian @ jacobian.t()
+    gram.diagonal().add_(damping)
+    y = torch.cholesky_solve((jacobian @ b).unsqueeze(1), torch.linalg.cholesky(gram)).squeeze(1)
+    return (b - jacobian.t() @ y) / damping
+
+def use_direct_solver(solver, actor, states):
+    # solver is cg, direct or auto. auto factorizes when the matrix side,
+    # min(parameters, rows of fisher_jacobian), is at most DIRECT_MAX_SIZE;
+    # the rows are samples x action size, twice that with a learned std
+    if solver != 'auto':
+        return solver == 'direct'
+    mu, std = actor(torch.as_tensor(states[:1], dtype=torch.float32))
+    num_rows = len(states) * mu.shape[-1] * (2 if std.requires_grad else 1)
+    num_params = sum(param.numel() for param in actor.parameters())
+    return min(num_params, num_rows) <= DIRECT_MAX_SIZE
+
+@timers.timed('fisher')
+def fisher_diagonal(actor, states, damping=1e-1):
+    # diagonal of F + damping I, the Jacobi preconditioner of ConjugateGradient
+    jacobian = fisher_jacobian(actor, torch.as_tensor(states, dtype=torch.float32))
+    return jacobian.pow(2).sum(0) + damping
@@ -0,0 +1,74 @@
+import torch
+
+from common.profiling import timers
+
+_compiled_fns = {}
+
+def compile_fn(fn, enabled):
+    # compiled functions are cached so that every update reuses the same graph
+    if not enabled or not hasattr(torch, 'compile'):
+        return fn
+    if fn not in _compiled_fns:
+        _compiled_fns[fn] = torch.compile(fn)
+    return _compiled_fns[fn]
+
+def get_batch_indices(num_samples, batch_size, epochs, num_batches=None):
+    # one permutation per epoch, cut into whole minibatches
+    # shape: [epochs, num_batches, batch_size]
+    if num_batches is None:
+        num_batches = num_samples // batch_size
+    indices = torch.argsort(torch.rand(epochs, num_samples), dim=1)
+    indices = indices[:, :num_batches * batch_size]
+    return indices.reshape(epochs, num_batches, batch_size)
+
+def ppo_update(loss_fn, loss_args, tensors, optimizers, batch_size, epochs, compile=False,
+               num_batches=None, grad_hook=None, clip_param=None, target_kl=None,
+               reduce_kl=None):
+    # tensors are converted once by the caller and only gathered here.
+    # loss_fn(*loss_args, *minibatch) returns the joint actor-critic loss,
+    # which is backpropagated once for all optimizers, and the probability
+    # ratio of the minibatch. grad_hook() runs between backward and step,
+    # e.g. to all_reduce the gradients; ranks that do so pass the same
+    # num_batches (at most len // batch_size)
+    #
+    # the ratio gives the approximate KL to the policy the batch was
+    # collected with, E[(r - 1) - log r], and with clip_param the fraction
+    # of clipped samples. with target_kl the update stops, before the step,
+    # at the first minibatch whose KL exceeds 1.5 * target_kl; distributed
+    # callers pass reduce_kl (e.g. mean_across_ranks) so all ranks stop at
+    # the same step. returns the epochs run and skipped and the mean KL and
+    # clip fraction of the minibatches that were stepped
+    loss_fn = compile_fn(loss_fn, compile)
+    batch_indices = get_batch_indices(len(tensors[0]), batch_size, epochs, num_batches)
+    batches_per_epoch = batch_indices.shape[1]
+
+    kl_sum, clip_sum, steps = torch.zeros(()), torch.zeros(()), 0
+    for batch_index in batch_indices.reshape(-1, batch_size):
+        with timers('update'):
+            minibatch = [tensor[batch_index] for tensor in tensors]
+            loss, ratio = loss_fn(*loss_args, *minibatch)
+
+            with torch.no_grad():
+                ratio = ratio.detach()
+                kl = ((ratio - 1) - torch.log(ratio)).mean()
+            if target_kl is not None:
+                value = kl.item() if reduce_kl is None else reduce_kl(kl.item())
+                if value > 1.5 * target_kl:
+                    break
+            kl_sum += kl
+            if clip_param is not None:
+                clip_sum += ((ratio - 1).abs() > clip_param).float().mean()
+
+            for optimizer in optimizers:
+                optimizer.zero_grad()
+            loss.backward()
+            if grad_hook is not None:
+                grad_hook()
+            for optimizer in optimizers:
+                optimizer.step()
+        steps += 1
+        timers.count('updates')
+
+    epochs_run = steps / max(batches_per_epoch, 1)
+    return {'epochs': epochs_run, 'skipped_epochs': epochs - epochs_run,
+            'approx_kl': kl_sum.item() / max(steps, 1), 'clip_fraction': clip_sum.item() / max(steps, 1)}
@@ -0,0 +1,67 @@
+import numpy as np
+
+
+class PrioritizedReplay:
+    """
+    Proportional prioritized replay (Schaul et al.) over a sum tree, with
+    every field stored in one preallocated array. Adding, sampling and
+    priority updates are vectorized over whole batches, one numpy call per
+    tree level.
+    """
+
+    def __init__(self, capacity, specs, alpha=0.6, seed=None):
+        # specs maps field name to (shape, dtype) of a single transition
+        self.capacity = capacity
+        self.alpha = alpha
+        self.tree_size = 1 << int(np.ceil(np.log2(capacity)))
+        # node i has children 2i and 2i+1, the leaves start at tree_size
+        self.tree = np.zeros(2 * self.tree_size)
+        self.arrays = {name: np.zeros((capacity,) + tuple(shape), dtype=dtype)
+                       for name, (shape, dtype) in specs.items()}
+        self.position = 0
+        self.size = 0
+        self.np_random = np.random.RandomState(seed)
+
+    def _set_priorities(self, indices, priorities):
+        nodes = indices + self.tree_size
+        self.tree[nodes] = priorities ** self.alpha
+        for _ in range(self.tree_size.bit_length() - 1):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def add(self, fields, priorities):
+        # fields hold n transitions each, priorities are e.g. |td error|
+        n = len(priorities)
+        indices = (self.position + np.arange(n)) % self.capacity
+        for name, value in fields.items():
+            self.arrays[name][indices] = value
+        self._set_priorities(indices, np.asarray(priorities, dtype=np.float64))
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def update_priorities(self, indices, priorities):
+        self._set_priorities(np.asarray(indices), np.asarray(priorities, dtype=np.float64))
+
+    def sample(self, batch_size, beta=0.4):
+        # one value per equal segment of the total mass, then a descent
+        # from the root to the leaf that covers it
+        total = self.tree[1]
+        values = (np.arange(batch_size) + self.np_random.rand(batch_size)) * total / batch_size
+        nodes = np.ones(batch_size, dtype=np.int64)
+        while nodes[0] < self.tree_size:
+            left = 2 * nodes
+            right = values >= self.tree[left]
+            values = values - np.where(right, self.tree[left], 0.0)
+            nodes = left + right
+        indices = np.minimum(nodes - self.tree_size, self.size - 1)
+
+        # importance weights, normalized by the largest in the batch
+        probs = self.tree[indices + self.tree_size] / total
+        weights = (self.size * probs) ** -beta
+        weights /= weights.max()
+
+        batch = {name: array[indices] for name, array in self.arrays.items()}
+        return batch, indices, weights.astype(np.float32)
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,144 @@
+import os
+import time
+import pstats
+import cProfile
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+import torch
+
+PROFILERS = ('none', 'torch', 'cprofile')
+
+
+class TimerRegistry:
+    """
+    Wall-clock timers for the hot phases of a training loop.
+
+    Use an instance as a context manager, `with timers('env.step'):`, or as
+    a decorator, `@timers.timed('gae')`. Timers may be nested, e.g. 'cg'
+    inside 'update', so the shares in a report are fractions of the wall
+    time since the last report and do not have to add up to 100%.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.record_functions = False
+        self.last_report = time.perf_counter()
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        if self.record_functions:
+            # phases show up as labelled ranges in the torch.profiler trace
+            with torch.profiler.record_function(name):
+                yield
+        else:
+            yield
+        self.totals[name] += time.perf_counter() - start
+        self.calls[name] += 1
+
+    def timed(self, name):
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        # throughput counters, 'samples' for env steps and 'updates' for
+        # optimizer steps
+        self.counters[name] += n
+
+    def reset(self):
+        self.totals.clear()
+        self.calls.clear()
+        self.counters.clear()
+        self.last_report = time.perf_counter()
+
+    def report(self, writer, step):
+        # writes the breakdown since the last report and returns it as a
+        # one-line summary for the console
+        elapsed = max(time.perf_counter() - self.last_report, 1e-9)
+
+        summary = []
+        for name, total in sorted(self.totals.items(), key=lambda item: -item[1]):
+            writer.add_timing('time/' + name, total, step)
+            summary.append('{} {:.1f}%'.format(name, 100 * total / elapsed))
+
+        for name in ('samples', 'updates'):
+            per_sec = self.counters[name] / elapsed
+            writer.add_scalar('perf/{}_per_sec'.format(name), per_sec, step)
+            summary.append('{:.1f} {}/s'.format(per_sec, name))
+
+        self.reset()
+        return ' | '.join(summary)
+
+
+timers = TimerRegistry()
+
+
+class Profiler:
+    """
+    Captures a torch.profiler or cProfile trace of the first num_iters
+    iterations. Call step() once at the end of every iteration; the trace
+    is written to logdir when the window closes.
+    """
+
+    def __init__(self, mode, num_iters, logdir):
+        if mode not in PROFILERS:
+            raise ValueError('unknown profiler: {}'.format(mode))
+
+        self.mode = mode
+        self.num_iters = num_iters
+        self.logdir = logdir
+        self.iters = 0
+        self.profiler = None
+
+        # the training loop starts here, setup time is not part of the breakdown
+        timers.reset()
+
+        if mode == 'torch':
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.profiler = torch.profiler.profile(activities=activities)
+            self.profiler.__enter__()
+            timers.record_functions = True
+        elif mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def step(self):
+        if self.profiler is None:
+            return
+        self.iters += 1
+        if self.iters >= self.num_iters:
+            self.close()
+
+    def close(self):
+        if self.profiler is None:
+            return
+        if not os.path.isdir(self.logdir):
+            os.makedirs(self.logdir)
+
+        if self.mode == 'torch':
+            self.profiler.__exit__(None, None, None)
+            timers.record_functions = False
+            trace_path = os.path.join(self.logdir, 'profile_trace.json')
+            self.profiler.export_chrome_trace(trace_path)
+            print(self.profiler.key_averages().table(sort_by='self_cpu_time_total',
+                                                     row_limit=20))
+        else:
+            self.profiler.disable()
+            trace_path = os.path.join(self.logdir, 'profile.prof')
+            self.profiler.dump_stats(trace_path)
+            pstats.Stats(self.profiler).sort_stats('cumulative').print_stats(25)
+
+        print('profile of {} iterations saved to {}'.format(self.iters, trace_path))
+        self.profiler = None
+
@@ -0,0 +1,64 @@
+import numpy as np
+import torch
+
+
+class RolloutPolicy:
+    """
+    The acting path of a policy network for the collectors. Each call
+    copies the numpy state into a preallocated float32 input tensor (one
+    numpy assignment, no new tensor), runs the model under
+    torch.inference_mode, samples the action with torch ops and returns it
+    as a numpy view of the output tensor.
+
+    kind says what the model returns and how actions are drawn:
+        gaussian        (mu, std), action ~ N(mu, std)
+        tanh_gaussian   (mu, std), action = tanh(z) with z ~ N(mu, std)
+        categorical     action probabilities, action ~ Cat(p)
+        epsilon_greedy  q values, the argmax or with probability epsilon()
+                        a uniform random action
+        deterministic   mu or (mu, ...), action = mu
+
+    input_shape is the shape the model sees, e.g. (1, state_size) or
+    (num_envs, state_size); states broadcast into it. squeeze drops the
+    leading batch dimension of the returned action.
+    """
+
+    KINDS = ('gaussian', 'tanh_gaussian', 'categorical', 'epsilon_greedy', 'deterministic')
+
+    def __init__(self, model, kind, input_shape, squeeze=False, epsilon=None):
+        if kind not in self.KINDS:
+            raise ValueError('unknown policy kind {}, expected one of {}'.format(kind, ', '.join(self.KINDS)))
+        if kind == 'epsilon_greedy' and epsilon is None:
+            raise ValueError('epsilon_greedy needs epsilon, a callable returning the current epsilon')
+        self.model = model
+        self.kind = kind
+        self.squeeze = squeeze
+        self.epsilon = epsilon
+        self.input = torch.zeros(input_shape)
+        # shares memory with self.input
+        self.input_array = self.input.numpy()
+
+    def __call__(self, state):
+        self.input_array[...] = state
+        with torch.inference_mode():
+            action = self.sample(self.model(self.input))
+        return action[0] if self.squeeze else action
+
+    def sample(self, output):
+        if self.kind == 'gaussian':
+            mu, std = output[0], output[1]
+            return torch.normal(mu, std).numpy()
+        if self.kind == 'tanh_gaussian':
+            mu, std = output[0], output[1]
+            return torch.tanh(torch.normal(mu, std)).numpy()
+        if self.kind == 'categorical':
+            return torch.multinomial(output, 1).squeeze(-1).numpy()
+        if self.kind == 'epsilon_greedy':
+            # exploration draws from numpy like the trainers' get_action, a
+            # few numpy calls are cheaper than the equivalent torch ops
+            action = output.argmax(-1).numpy()
+            explore = np.random.rand(*action.shape) <= self.epsilon()
+            if explore.any():
+                action = np.where(explore, np.random.randint(output.shape[-1], size=action.shape), action)
+            return action
+        return (output[0] if isinstance(output, tuple) else output).numpy()
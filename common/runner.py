@@ -0,0 +1,486 @@
+import os
+import json
+import random
+from collections import deque
+
+import numpy as np
+import torch
+
+from common.profiling import timers
+
+
+class Callback:
+    """
+    Hooks called by the runners. An iteration is one collect/update round
+    for OnPolicyRunner and one episode for OffPolicyRunner. Setting
+    runner.stop ends training after the current iteration.
+    """
+
+    def on_train_start(self, runner):
+        pass
+
+    def on_step(self, runner):
+        pass
+
+    def on_iteration_end(self, runner):
+        pass
+
+    def on_train_end(self, runner):
+        pass
+
+
+class EpisodeCollector:
+    """
+    Steps one gym env with policy(state) -> action, run under no_grad.
+
+    preprocess maps raw observations to the states the policy sees
+    (reshape, ZFilter). reward_fn(state, action, reward, done, t) replaces
+    the stored reward, e.g. reward shaping or a GAIL discriminator, while
+    score keeps the env reward. Episodes are cut after max_episode_steps.
+    Steps count towards perf/samples_per_sec unless count_samples is off.
+    """
+
+    def __init__(self, env, policy, preprocess=None, reward_fn=None,
+                 render=False, max_episode_steps=None, count_samples=True):
+        self.env = env
+        self.policy = policy
+        self.preprocess = preprocess
+        self.reward_fn = reward_fn
+        self.render = render
+        self.max_episode_steps = max_episode_steps
+        self.count_samples = count_samples
+
+    def _preprocess(self, obs):
+        if self.preprocess is None:
+            return obs
+        with timers('preprocess'):
+            return self.preprocess(obs)
+
+    def reset(self):
+        self.state = self._preprocess(self.env.reset())
+        self.episode_steps = 0
+        self.score = 0
+
+    def step(self):
+        # returns (state, action, reward, next_state, mask) and whether the episode is over
+        if self.render:
+            self.env.render()
+
+        with timers('policy'), torch.no_grad():
+            action = self.policy(self.state)
+        with timers('env.step'):
+            next_obs, reward, done, _ = self.env.step(action)
+        if self.count_samples:
+            timers.count('samples')
+
+        self.episode_steps += 1
+        self.score += reward
+        if self.reward_fn is not None:
+            with timers('reward'):
+                reward = self.reward_fn(self.state, action, reward, done, self.episode_steps)
+
+        next_state = self._preprocess(next_obs)
+        transition = (self.state, action, reward, next_state, 0 if done else 1)
+        self.state = next_state
+
+        cut = self.max_episode_steps is not None and self.episode_steps >= self.max_episode_steps
+        return transition, done or cut
+
+    def collect(self, num_steps):
+        # whole episodes until num_steps transitions, rows [state, action, reward, mask]
+        memory = []
+        scores = []
+        while len(memory) < num_steps:
+            self.reset()
+            done = False
+            while not done:
+                (state, action, reward, _, mask), done = self.step()
+                memory.append([state, action, reward, mask])
+            scores.append(self.score)
+        return memory, scores
+
+    def update_policy(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncCollector:
+    """Batches from common.sampler.AsyncSampler processes, collected while the learner updates."""
+
+    def __init__(self, actor, running_state, args, reward_fn=None):
+        from common.sampler import AsyncSampler
+
+        self.actor = actor
+        self.reward_fn = reward_fn
+        self.version = 0
+        self.sampler = AsyncSampler(actor, running_state, args)
+        self.sampler.start()
+
+    def collect(self, num_steps):
+        # the next batch is already being collected with the previous weights
+        with timers('sample.wait'):
+            memory, scores, dropped = self.sampler.collect(version=self.version)
+        timers.count('samples', len(memory))
+
+        if self.reward_fn is not None:
+            with timers('reward'):
+                for transition in memory:
+                    transition[2] = self.reward_fn(transition[0], transition[1], transition[2],
+                                                   transition[3] == 0, None)
+        if dropped:
+            print('dropped {} stale batches'.format(dropped))
+        return memory, scores
+
+    def update_policy(self):
+        self.version += 1
+        self.sampler.publish(self.actor, version=self.version)
+
+    def close(self):
+        self.sampler.close()
+
+
+class VecCollector:
+    """
+    Steps a common.vec_env.SubprocVecEnv, see collect_vectorized. Episodes
+    continue from one batch to the next; bootstrap(states) returns
+    gamma * V(state) for the trajectories cut at the end of a batch.
+    """
+
+    def __init__(self, vec_env, policy, running_state, bootstrap=None):
+        self.vec_env = vec_env
+        self.policy = policy
+        self.running_state = running_state
+        self.bootstrap = bootstrap
+        self.carry = {}
+
+    def collect(self, num_steps):
+        from common.vec_env import collect_vectorized
+        return collect_vectorized(self.vec_env, self.policy, self.running_state, num_steps,
+                                  carry=self.carry, bootstrap=self.bootstrap)
+
+    def update_policy(self):
+        pass
+
+    def close(self):
+        self.vec_env.close()
+
+
+def transition_dtypes(precision='float32', action_dtype=None):
+    # storage dtypes of (state, action, reward, next_state, mask): states
+    # at precision, discrete actions as action_dtype (e.g. int8), rewards
+    # float32 and masks uint8; continuous actions follow the states
+    state_dtype = np.dtype(precision)
+    action_dtype = state_dtype if action_dtype is None else np.dtype(action_dtype)
+    return [state_dtype, action_dtype, np.dtype(np.float32), state_dtype, np.dtype(np.uint8)]
+
+def upcast(array):
+    # gathered rows leave storage as at least float32 or int64
+    if array.dtype.kind == 'f' and array.dtype.itemsize < 4:
+        return array.astype(np.float32)
+    if array.dtype.kind in 'iub' and array.dtype != np.int64:
+        return array.astype(np.int64)
+    return array
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions stored column-wise, one preallocated array
+    per field, shaped after the first transition and typed by dtypes (see
+    transition_dtypes) or else like it. sample() returns the gathered
+    columns, [states, actions, rewards, next_states, masks] with a
+    leading batch dimension and compact dtypes upcast, and save()/load()
+    move the columns through .npy memmaps.
+    """
+
+    def __init__(self, capacity, dtypes=None):
+        self.capacity = capacity
+        self.dtypes = dtypes
+        self.columns = None
+        self.position = 0
+        self.size = 0
+
+    def append(self, transition):
+        if self.columns is None:
+            dtypes = self.dtypes or [np.asarray(value).dtype for value in transition]
+            self.columns = [np.zeros((self.capacity,) + np.shape(value), dtype=dtype)
+                            for value, dtype in zip(transition, dtypes)]
+        for column, value in zip(self.columns, transition):
+            column[self.position] = value
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        indices = random.sample(range(self.size), batch_size)
+        return [upcast(column[indices]) for column in self.columns]
+
+    def save(self, directory):
+        # the filled rows of every column, in storage order, plus the ring position
+        os.makedirs(directory, exist_ok=True)
+        for i, column in enumerate(self.columns or []):
+            out = np.lib.format.open_memmap(os.path.join(directory, 'column{}.npy'.format(i)), mode='w+',
+                                            dtype=column.dtype, shape=(self.size,) + column.shape[1:])
+            out[:] = column[:self.size]
+            out.flush()
+            del out
+        with open(os.path.join(directory, 'replay.json'), 'w') as f:
+            json.dump({'position': self.position, 'size': self.size,
+                       'columns': len(self.columns or [])}, f)
+
+    def load(self, directory):
+        with open(os.path.join(directory, 'replay.json')) as f:
+            meta = json.load(f)
+        if meta['size'] > self.capacity:
+            raise ValueError('snapshot holds {} transitions, the buffer only {}'.format(
+                meta['size'], self.capacity))
+        columns = []
+        for i in range(meta['columns']):
+            saved = np.load(os.path.join(directory, 'column{}.npy'.format(i)), mmap_mode='r')
+            column = np.zeros((self.capacity,) + saved.shape[1:], dtype=saved.dtype)
+            column[:meta['size']] = saved
+            columns.append(column)
+        self.columns = columns or None
+        self.size = meta['size']
+        self.position = meta['position'] % self.capacity
+
+    def __len__(self):
+        return self.size
+
+
+class Runner:
+    def __init__(self, collector, learner, max_iters, callbacks=(), score_window=100):
+        self.collector = collector
+        self.learner = learner
+        self.max_iters = max_iters
+        self.callbacks = list(callbacks)
+
+        self.iteration = 0
+        self.episodes = 0
+        self.steps = 0
+        self.scores = deque(maxlen=score_window)
+        self.iteration_scores = []
+        self.running_score = 0
+        self.stop = False
+        self.start_iteration = 0
+
+    @property
+    def score_avg(self):
+        # mean score of the last score_window episodes
+        return float(np.mean(self.scores)) if self.scores else float('nan')
+
+    @property
+    def iteration_score(self):
+        # mean score of the episodes that finished in this iteration
+        return float(np.mean(self.iteration_scores)) if self.iteration_scores else float('nan')
+
+    def add_scores(self, scores):
+        self.iteration_scores = list(scores)
+        self.episodes += len(scores)
+        self.scores.extend(scores)
+        for score in scores:
+            self.running_score = 0.99 * self.running_score + 0.01 * score
+
+    def state_dict(self):
+        return {'iteration': self.iteration, 'episodes': self.episodes, 'steps': self.steps,
+                'scores': list(self.scores), 'running_score': self.running_score}
+
+    def load_state_dict(self, state):
+        # training continues with the iteration after the saved one
+        self.iteration = state['iteration']
+        self.start_iteration = state['iteration'] + 1
+        self.episodes = state['episodes']
+        self.steps = state['steps']
+        self.scores.clear()
+        self.scores.extend(state['scores'])
+        self.running_score = state['running_score']
+
+    def callback(self, name):
+        for callback in self.callbacks:
+            getattr(callback, name)(self)
+
+    def run(self):
+        self.callback('on_train_start')
+        try:
+            for self.iteration in range(self.start_iteration, self.max_iters):
+                self.run_iteration()
+                self.callback('on_iteration_end')
+                if self.stop:
+                    break
+        finally:
+            self.collector.close()
+        self.callback('on_train_end')
+        return self
+
+
+class OnPolicyRunner(Runner):
+    """Collects batch_size transitions of whole episodes, then calls learner(memory)."""
+
+    def __init__(self, collector, learner, batch_size, max_iters, callbacks=(), score_window=100):
+        super().__init__(collector, learner, max_iters, callbacks, score_window)
+        self.batch_size = batch_size
+
+    def run_iteration(self):
+        memory, scores = self.collector.collect(self.batch_size)
+        self.steps += len(memory)
+        self.add_scores(scores)
+
+        with timers('train'):
+            self.learner(memory)
+        self.collector.update_policy()
+
+
+class OffPolicyRunner(Runner):
+    """
+    Runs one episode per iteration. After every env step past update_after
+    steps, learner is called with the columns of a minibatch sampled from
+    replay, or with [transition] when replay is None (online updates).
+    """
+
+    def __init__(self, collector, learner, replay, batch_size, max_iters,
+                 update_after=0, callbacks=(), score_window=100):
+        super().__init__(collector, learner, max_iters, callbacks, score_window)
+        self.replay = replay
+        self.batch_size = batch_size
+        self.update_after = update_after
+
+    def run_iteration(self):
+        self.collector.reset()
+        done = False
+
+        while not done:
+            transition, done = self.collector.step()
+            self.steps += 1
+
+            if self.replay is not None:
+                self.replay.append(transition)
+
+            if self.steps > self.update_after:
+                if self.replay is not None:
+                    with timers('replay.sample'):
+                        batch = self.replay.sample(self.batch_size)
+                else:
+                    batch = [transition]
+
+                with timers('train'):
+                    self.learner(batch)
+                timers.count('updates')
+
+            self.callback('on_step')
+
+        self.add_scores([self.collector.score])
+
+
+class LogCallback(Callback):
+    """
+    Writes log/score (mean episode score of the iteration) every iteration
+    and prints progress with the timer report every interval iterations.
+    extra() may return more scalars, logged as log/<name>.
+    """
+
+    def __init__(self, writer, interval=1, extra=None):
+        self.writer = writer
+        self.interval = interval
+        self.extra = extra
+
+    def on_iteration_end(self, runner):
+        if runner.iteration_scores:
+            self.writer.add_scalar('log/score', runner.iteration_score, runner.iteration)
+
+        if runner.iteration % self.interval == 0:
+            line = '{} iter | {} episode | score_avg: {:.2f}'.format(
+                runner.iteration, runner.episodes, runner.score_avg)
+            for name, value in (self.extra() if self.extra else {}).items():
+                self.writer.add_scalar('log/' + name, float(value), runner.iteration)
+                line += ' | {}: {:.4f}'.format(name, float(value))
+            print(line)
+            print(timers.report(self.writer, runner.iteration))
+
+
+class ProfileCallback(Callback):
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def on_iteration_end(self, runner):
+        self.profiler.step()
+
+    def on_train_end(self, runner):
+        self.profiler.close()
+
+
+class GoalCallback(Callback):
+    """
+    Stops training once score(runner) exceeds goal_score, after saving a
+    checkpoint with save(runner). The default score is the windowed mean.
+    """
+
+    def __init__(self, goal_score, save=None, score=None, min_episodes=0):
+        self.goal_score = goal_score
+        self.save = save
+        self.score = score or (lambda runner: runner.score_avg)
+        self.min_episodes = min_episodes
+        self.reached = False
+
+    def on_iteration_end(self, runner):
+        if runner.episodes < self.min_episodes or not self.score(runner) > self.goal_score:
+            return
+        if self.save is not None:
+            with timers('checkpoint'):
+                self.save(runner)
+        print('Score {:.2f} exceeds {}. So end'.format(self.score(runner), self.goal_score))
+        self.reached = True
+        runner.stop = True
+
+
+class CheckpointCallback(Callback):
+    """Calls save(runner) every interval iterations."""
+
+    def __init__(self, interval, save):
+        self.interval = interval
+        self.save = save
+
+    def on_iteration_end(self, runner):
+        if self.interval > 0 and (runner.iteration + 1) % self.interval == 0:
+            with timers('checkpoint'):
+                self.save(runner)
+
+
+class EvalCallback(Callback):
+    """
+    Every interval iterations runs episodes with a separate env and policy
+    (usually the deterministic mean action) and logs eval/score.
+    """
+
+    def __init__(self, env, policy, writer, interval, episodes=5, preprocess=None,
+                 max_episode_steps=None):
+        self.collector = EpisodeCollector(env, policy, preprocess=preprocess,
+                                          max_episode_steps=max_episode_steps,
+                                          count_samples=False)
+        self.writer = writer
+        self.interval = interval
+        self.episodes = episodes
+
+    def on_iteration_end(self, runner):
+        if self.interval <= 0 or (runner.iteration + 1) % self.interval != 0:
+            return
+
+        scores = []
+        with timers('eval'):
+            for _ in range(self.episodes):
+                self.collector.reset()
+                done = False
+                while not done:
+                    _, done = self.collector.step()
+                scores.append(self.collector.score)
+
+        score = float(np.mean(scores))
+        self.writer.add_scalar('eval/score', score, runner.iteration)
+        print('{} iter | eval score: {:.2f}'.format(runner.iteration, score))
+
+
+def save_state_dict(model, path):
+    # the checkpoint format the episodic trainers have always written
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    torch.save(model.state_dict(), path)
@@ -0,0 +1,191 @@
+import copy
+import queue
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from torch.distributions import Normal
+
+
+def merge_running_stat(rs, n, mean, sum_square):
+    # parallel variant of Welford's algorithm (Chan et al.)
+    # folds the moments of another RunningStat into rs
+    if n == 0:
+        return
+    if rs.n == 0:
+        rs.n = n
+        rs.mean = np.array(mean, dtype=np.float64)
+        rs.sum_square = np.array(sum_square, dtype=np.float64)
+        return
+
+    total = rs.n + n
+    delta = mean - rs.mean
+    new_mean = rs.mean + delta * n / total
+    new_sum_square = rs.sum_square + sum_square + delta ** 2 * rs.n * n / total
+
+    rs.n = total
+    rs.mean = new_mean
+    rs.sum_square = new_sum_square
+
+
+def sampler_worker(rank, env_name, seed, sample_size, running_state,
+                   shared_actor, shared_filter, version, lock,
+                   batch_queue, stop_event):
+    import gym
+    from common.envs import register_envs
+
+    torch.set_num_threads(1)
+    register_envs()
+    env = gym.make(env_name)
+    env.seed(seed + rank + 1)
+    torch.manual_seed(seed + rank + 1)
+    np.random.seed(seed + rank + 1)
+
+    actor = copy.deepcopy(shared_actor)
+    actor.eval()
+    filter_n, filter_mean, filter_sum_square = shared_filter
+
+    while not stop_event.is_set():
+        # pull the latest policy weights and ZFilter statistics
+        with lock:
+            actor.load_state_dict(shared_actor.state_dict())
+            running_state.rs.n = filter_n.value
+            running_state.rs.mean = filter_mean.numpy().copy()
+            running_state.rs.sum_square = filter_sum_square.numpy().copy()
+            batch_version = version.value
+
+        # observations seen in this batch, merged into the learner's ZFilter
+        new_stat = type(running_state.rs)(running_state.rs.shape)
+
+        memory = []
+        scores = []
+        steps = 0
+
+        while steps < sample_size:
+            state = env.reset()
+            new_stat.push(state)
+            state = running_state(state)
+            score = 0
+
+            for _ in range(10000):
+                steps += 1
+
+                with torch.no_grad():
+                    mu, std = actor(torch.Tensor(state).unsqueeze(0))
+                    action = torch.normal(mu, std)
+                    log_policy = Normal(mu, std).log_prob(action).sum(1)
+
+                action = action.numpy()[0]
+                next_state, reward, done, _ = env.step(action)
+
+                mask = 0 if done else 1
+                memory.append([state, action, reward, mask, log_policy.item()])
+
+                new_stat.push(next_state)
+                state = running_state(next_state)
+                score += reward
+
+                if done:
+                    break
+
+            scores.append(score)
+
+        batch = {'memory': memory,
+                 'scores': scores,
+                 'version': batch_version,
+                 'z_filter': (new_stat.n, new_stat.mean, new_stat.sum_square)}
+
+        while not stop_event.is_set():
+            try:
+                batch_queue.put(batch, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+    env.close()
+
+
+class AsyncSampler:
+    """
+    Actor-learner split for on-policy trainers.
+
+    Sampler processes keep collecting the next batch with the last published
+    policy while the learner runs train_model. Every batch carries the version
+    of the weights it was collected with, and batches older than
+    args.max_staleness updates are dropped.
+    """
+
+    def __init__(self, actor, running_state, args):
+        self.args = args
+        self.num_samplers = args.num_samplers
+        self.running_state = running_state
+
+        self.shared_actor = copy.deepcopy(actor)
+        self.shared_actor.share_memory()
+
+        shape = running_state.rs.shape
+        self.filter_n = mp.Value('l', running_state.rs.n, lock=False)
+        self.filter_mean = torch.zeros(shape, dtype=torch.float64).share_memory_()
+        self.filter_sum_square = torch.zeros(shape, dtype=torch.float64).share_memory_()
+
+        self.version = mp.Value('l', 0, lock=False)
+        self.lock = mp.Lock()
+        self.batch_queue = mp.Queue(maxsize=self.num_samplers)
+        self.stop_event = mp.Event()
+        self.processes = []
+
+        self.publish(actor, version=0)
+
+    def start(self):
+        sample_size = self.args.total_sample_size // self.num_samplers
+
+        for rank in range(self.num_samplers):
+            process = mp.Process(target=sampler_worker,
+                                 args=(rank, self.args.env_name, self.args.seed,
+                                       sample_size, copy.deepcopy(self.running_state),
+                                       self.shared_actor,
+                                       (self.filter_n, self.filter_mean, self.filter_sum_square),
+                                       self.version, self.lock,
+                                       self.batch_queue, self.stop_event))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+
+    def publish(self, actor, version):
+        rs = self.running_state.rs
+        with self.lock:
+            for shared_param, param in zip(self.shared_actor.parameters(), actor.parameters()):
+                shared_param.data.copy_(param.data)
+            self.filter_n.value = rs.n
+            self.filter_mean.copy_(torch.from_numpy(np.asarray(rs.mean, dtype=np.float64)))
+            self.filter_sum_square.copy_(torch.from_numpy(np.asarray(rs.sum_square, dtype=np.float64)))
+            self.version.value = version
+
+    def collect(self, version):
+        memory = []
+        scores = []
+        num_batches = 0
+        dropped = 0
+
+        while num_batches < self.num_samplers:
+            batch = self.batch_queue.get()
+
+            # observations are valid for normalization even if the batch is stale
+            merge_running_stat(self.running_state.rs, *batch['z_filter'])
+
+            if version - batch['version'] > self.args.max_staleness:
+                dropped += 1
+                continue
+
+            memory.extend(batch['memory'])
+            scores.extend(batch['scores'])
+            num_batches += 1
+
+        return memory, scores, dropped
+
+    def close(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,134 @@
+import os
+import random
+import shutil
+
+import numpy as np
+import torch
+
+from common.profiling import timers
+from common.runner import Callback
+
+
+def rng_state():
+    return {'random': random.getstate(), 'numpy': np.random.get_state(),
+            'torch': torch.get_rng_state()}
+
+def set_rng_state(state):
+    random.setstate(state['random'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+
+def capture(objects):
+    # objects maps names to modules, optimizers, runners (state_dict),
+    # ZFilters (running statistics in .rs) or plain tensors
+    state = {}
+    for name, obj in objects.items():
+        if isinstance(obj, torch.Tensor):
+            state[name] = obj.detach().clone()
+        elif hasattr(obj, 'rs'):
+            state[name] = {'n': obj.rs.n, 'mean': obj.rs.mean.copy(),
+                           'sum_square': obj.rs.sum_square.copy()}
+        else:
+            state[name] = obj.state_dict()
+    return state
+
+def restore(objects, state):
+    for name, obj in objects.items():
+        if isinstance(obj, torch.Tensor):
+            with torch.no_grad():
+                obj.copy_(state[name])
+        elif hasattr(obj, 'rs'):
+            obj.rs.n = state[name]['n']
+            obj.rs.mean = state[name]['mean']
+            obj.rs.sum_square = state[name]['sum_square']
+        else:
+            obj.load_state_dict(state[name])
+
+def save_snapshot(directory, state, replay=None):
+    # the snapshot is built next to directory and renamed into place, so
+    # a job preempted while saving still finds the previous one
+    tmp_directory = directory.rstrip('/') + '.tmp'
+    old_directory = directory.rstrip('/') + '.old'
+    if os.path.isdir(tmp_directory):
+        shutil.rmtree(tmp_directory)
+    os.makedirs(tmp_directory)
+
+    torch.save(state, os.path.join(tmp_directory, 'state.pth.tar'))
+    if replay is not None and len(replay) > 0:
+        replay.save(os.path.join(tmp_directory, 'replay'))
+
+    if os.path.isdir(directory):
+        if os.path.isdir(old_directory):
+            shutil.rmtree(old_directory)
+        os.replace(directory, old_directory)
+    os.replace(tmp_directory, directory)
+    if os.path.isdir(old_directory):
+        shutil.rmtree(old_directory)
+
+def load_snapshot(directory, replay=None):
+    # state of the last complete snapshot, None if there is none
+    for path in (directory, directory.rstrip('/') + '.old'):
+        if os.path.exists(os.path.join(path, 'state.pth.tar')):
+            break
+    else:
+        return None
+
+    state = torch.load(os.path.join(path, 'state.pth.tar'), map_location='cpu', weights_only=False)
+    if replay is not None and os.path.isdir(os.path.join(path, 'replay')):
+        replay.load(os.path.join(path, 'replay'))
+    return state
+
+
+class SnapshotCallback(Callback):
+    """
+    Saves everything needed to continue training: the objects (models,
+    target models, optimizers, ZFilters), the runner's counters and
+    scores, the python, numpy and torch RNG states, the replay buffer as
+    memory-mapped arrays and whatever get_extra() returns (e.g. epsilon).
+
+    With resume the last snapshot in directory, if any, is restored when
+    training starts and set_extra receives the extra state; the run then
+    continues with the next iteration. Envs start fresh episodes.
+    """
+
+    def __init__(self, directory, interval, objects, replay=None, get_extra=None,
+                 set_extra=None, resume=False, save=True, restore_rng=True):
+        self.directory = directory
+        self.interval = interval
+        self.objects = objects
+        self.replay = replay
+        self.get_extra = get_extra
+        self.set_extra = set_extra
+        self.resume = resume
+        self.save = save
+        self.restore_rng = restore_rng
+
+    def on_train_start(self, runner):
+        if not self.resume:
+            return
+        with timers('snapshot'):
+            state = load_snapshot(self.directory, self.replay)
+        if state is None:
+            print('no snapshot in {}, starting from scratch'.format(self.directory))
+            return
+
+        restore(self.objects, state['objects'])
+        runner.load_state_dict(state['runner'])
+        if self.restore_rng:
+            set_rng_state(state['rng'])
+        if self.set_extra is not None:
+            self.set_extra(state['extra'])
+        # sampler processes pick up the restored weights and ZFilter
+        runner.collector.update_policy()
+        print('resumed from iteration {} ({} episodes)'.format(runner.iteration, runner.episodes))
+
+    def on_iteration_end(self, runner):
+        if not self.save or self.interval <= 0 or (runner.iteration + 1) % self.interval != 0:
+            return
+        with timers('snapshot'):
+            save_snapshot(self.directory, {
+                'objects': capture(self.objects),
+                'runner': runner.state_dict(),
+                'rng': rng_state(),
+                'extra': self.get_extra() if self.get_extra is not None else None,
+            }, self.replay)
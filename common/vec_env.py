@@ -0,0 +1,259 @@
+import os
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from common.profiling import timers
+
+# one byte commands sent to the workers, everything else goes through shared memory
+RESET = b'r'
+STEP = b's'
+CLOSE = b'c'
+
+
+def make_gym_env(env_name):
+    import gym
+    from common.envs import register_envs
+
+    register_envs()
+    return gym.make(env_name)
+
+
+class SharedArrays:
+    """Named numpy arrays that live in one multiprocessing.shared_memory block."""
+
+    def __init__(self, specs, name=None):
+        # specs: list of (key, shape, dtype)
+        offsets = []
+        size = 0
+        for key, shape, dtype in specs:
+            size = (size + 63) // 64 * 64  # keep every array cache-line aligned
+            offsets.append(size)
+            size += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.specs = specs
+        self.arrays = {key: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+                       for (key, shape, dtype), offset in zip(specs, offsets)}
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def vec_env_worker(env_indices, make_env, env_name, seed, shm_name, specs, conn, ready, cpu):
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {cpu})
+
+    buffers = SharedArrays(specs, name=shm_name)
+    obs, actions = buffers['obs'], buffers['actions']
+    rewards, dones = buffers['rewards'], buffers['dones']
+    truncated, terminal_obs = buffers['truncated'], buffers['terminal_obs']
+
+    envs = []
+    for index in env_indices:
+        env = make_env(env_name)
+        if seed is not None:
+            env.seed(seed + index)
+        envs.append(env)
+
+    try:
+        while True:
+            command = conn.recv_bytes()
+            if command == CLOSE:
+                break
+
+            for env, index in zip(envs, env_indices):
+                if command == RESET:
+                    obs[index] = env.reset()
+                    continue
+
+                next_obs, reward, done, info = env.step(actions[index])
+                if done:
+                    terminal_obs[index] = next_obs
+                    next_obs = env.reset()
+                obs[index] = next_obs
+                rewards[index] = np.asarray(reward).item()
+                dones[index] = done
+                truncated[index] = info.get('TimeLimit.truncated', False)
+
+            ready.release()
+    finally:
+        for env in envs:
+            env.close()
+        buffers.close()
+
+
+class SubprocVecEnv:
+    """
+    Steps num_envs gym environments in worker processes.
+
+    Observations, rewards, dones and actions are exchanged through one
+    shared memory block; per step the learner only sends a one byte
+    command down each pipe and waits on a semaphore, so nothing is
+    pickled. Every worker owns envs_per_worker environments and can be
+    pinned to a CPU with cpu_affinity (a list, one entry per worker).
+
+    The interface matches common.batched_envs.BatchedEnv: reset() returns
+    [num_envs, obs_size] observations and step(actions) returns
+    (obs, rewards, dones, info) with automatic resets,
+    info['terminal_observation'] and info['TimeLimit.truncated'].
+    The returned arrays are views of the shared buffers and are
+    overwritten by the next step, copy them to keep them.
+    """
+
+    def __init__(self, env_name, num_envs, envs_per_worker=1, seed=None,
+                 cpu_affinity=None, make_env=make_gym_env, start_method=None):
+        self.num_envs = num_envs
+        self.num_workers = (num_envs + envs_per_worker - 1) // envs_per_worker
+
+        env = make_env(env_name)
+        self.observation_space = env.observation_space
+        self.action_space = env.action_space
+        env.close()
+
+        obs_shape = (num_envs,) + tuple(self.observation_space.shape)
+        if hasattr(self.action_space, 'n'):
+            action_spec = ('actions', (num_envs,), np.int64)
+        else:
+            action_spec = ('actions', (num_envs,) + tuple(self.action_space.shape), np.float64)
+
+        specs = [('obs', obs_shape, np.float64),
+                 ('terminal_obs', obs_shape, np.float64),
+                 action_spec,
+                 ('rewards', (num_envs,), np.float64),
+                 ('dones', (num_envs,), np.bool_),
+                 ('truncated', (num_envs,), np.bool_)]
+        self.buffers = SharedArrays(specs)
+
+        ctx = mp.get_context(start_method)
+        self.ready = ctx.Semaphore(0)
+        self.conns = []
+        self.processes = []
+
+        for rank in range(self.num_workers):
+            env_indices = list(range(rank * envs_per_worker,
+                                     min((rank + 1) * envs_per_worker, num_envs)))
+            cpu = None if cpu_affinity is None else cpu_affinity[rank % len(cpu_affinity)]
+            parent_conn, child_conn = ctx.Pipe()
+
+            process = ctx.Process(target=vec_env_worker,
+                                  args=(env_indices, make_env, env_name, seed,
+                                        self.buffers.shm.name, specs, child_conn,
+                                        self.ready, cpu))
+            process.daemon = True
+            process.start()
+            child_conn.close()
+
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+
+        self.closed = False
+
+    def _run(self, command):
+        for conn in self.conns:
+            conn.send_bytes(command)
+        for _ in range(self.num_workers):
+            self.ready.acquire()
+
+    def reset(self):
+        self._run(RESET)
+        return self.buffers['obs']
+
+    def step(self, actions):
+        self.buffers['actions'][:] = np.asarray(actions).reshape(self.buffers['actions'].shape)
+        self._run(STEP)
+
+        dones = self.buffers['dones']
+        info = {'TimeLimit.truncated': self.buffers['truncated']}
+        if dones.any():
+            info['terminal_observation'] = self.buffers['terminal_obs']
+        return self.buffers['obs'], self.buffers['rewards'], dones, info
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for conn in self.conns:
+            try:
+                conn.send_bytes(CLOSE)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        self.buffers.close(unlink=True)
+
+
+def collect_vectorized(vec_env, policy, running_state, num_steps, carry=None, bootstrap=None):
+    """
+    Collects num_steps transitions from a SubprocVecEnv or BatchedEnv for
+    the on-policy trainers. policy maps the (num_envs, obs) states to
+    actions, e.g. a common.rollout_policy.RolloutPolicy. memory holds
+    [state, action, reward, mask] rows grouped by trajectory, in the same
+    layout as the single-env loop, so the GAE code can walk it backwards
+    unchanged.
+
+    carry is a dict the caller keeps between calls: the envs are reset on
+    the first call only, so episodes run on across batches and their
+    scores are reported once they finish. The trajectories still running
+    when the budget is spent are closed with mask 0, and when given,
+    bootstrap(states) adds gamma * V(next state) to their last reward, so
+    the cut is not taken for a terminal.
+    """
+    num_envs = vec_env.num_envs
+    carry = {} if carry is None else carry
+    trajectories = [[] for _ in range(num_envs)]
+    memory = []
+    scores = []
+    steps = 0
+
+    if 'states' not in carry:
+        obs = vec_env.reset()
+        with timers('zfilter'):
+            carry['states'] = [running_state(o) for o in obs]
+        carry['score'] = np.zeros(num_envs)
+    states, score = carry['states'], carry['score']
+
+    while steps < num_steps:
+        with timers('policy'):
+            actions = policy(states)
+        with timers('env.step'):
+            next_obs, rewards, dones, _ = vec_env.step(actions)
+        timers.count('samples', num_envs)
+        steps += num_envs
+
+        for i in range(num_envs):
+            trajectories[i].append([states[i], actions[i], float(rewards[i]), 0 if dones[i] else 1])
+            score[i] += rewards[i]
+
+            if dones[i]:
+                scores.append(score[i])
+                score[i] = 0
+                memory.extend(trajectories[i])
+                trajectories[i] = []
+
+        with timers('zfilter'):
+            states = [running_state(o) for o in next_obs]
+
+    running = [i for i in range(num_envs) if trajectories[i]]
+    if running and bootstrap is not None:
+        values = bootstrap([states[i] for i in running])
+        for i, value in zip(running, values):
+            trajectories[i][-1][2] += float(value)
+    for i in running:
+        trajectories[i][-1][3] = 0
+        memory.extend(trajectories[i])
+
+    carry['states'] = states
+    return memory, scores
@@ -0,0 +1,35 @@
+import torch
+
+
+def reverse_scan(deltas, decays):
+    # acc[t] = deltas[t] + decays[t] * acc[t + 1] with acc[T] = 0, for
+    # [T, B] inputs and without a python loop over time: acc[t] is the sum
+    # of deltas[k] weighted by prod(decays[t:k]), taken from one cumprod
+    # over a [T, T, B] triangle. Unrolls are short, so the T^2 work beats
+    # T sequential steps.
+    T = deltas.shape[0]
+    upper = torch.triu(torch.ones(T, T, dtype=torch.bool, device=deltas.device)).unsqueeze(2)
+    # factors[t, k] = decays[k] for k >= t and 1 below the diagonal
+    factors = torch.where(upper, decays.unsqueeze(0), torch.ones_like(decays).unsqueeze(0))
+    products = torch.cumprod(factors, dim=1)
+    # weights[t, k] = prod(decays[t:k]), 1 on the diagonal and 0 below it
+    weights = torch.cat([torch.ones_like(products[:, :1]), products[:, :-1]], dim=1) * upper
+    return (weights * deltas.unsqueeze(0)).sum(1)
+
+def vtrace(behaviour_log_probs, target_log_probs, rewards, discounts, values, bootstrap_value,
+           clip_rho=1.0, clip_c=1.0, clip_pg_rho=1.0):
+    # V-trace targets vs and policy gradient advantages (Espeholt et al.)
+    # for [T, B] unrolls, discounts are gamma * mask; no gradient flows
+    # through either
+    with torch.no_grad():
+        rhos = torch.exp(target_log_probs - behaviour_log_probs)
+        clipped_rhos = torch.clamp(rhos, max=clip_rho)
+        cs = torch.clamp(rhos, max=clip_c)
+
+        next_values = torch.cat([values[1:], bootstrap_value.unsqueeze(0)], dim=0)
+        deltas = clipped_rhos * (rewards + discounts * next_values - values)
+        vs = values + reverse_scan(deltas, discounts * cs)
+
+        next_vs = torch.cat([vs[1:], bootstrap_value.unsqueeze(0)], dim=0)
+        pg_advantages = torch.clamp(rhos, max=clip_pg_rho) * (rewards + discounts * next_vs - values)
+    return vs, pg_advantages
@@ -1,5 +1,4 @@
 import numpy as np
-import cvxpy as cp
 from train import idx_state
 
 class FeatureEstimate:
@@ -68,6 +67,8 @@ def expert_feature_expectation(feature_num, gamma, demonstrations, env):
     return feature_expectations
 
 def QP_optimizer(feature_num, learner, expert):
+    import cvxpy as cp
+
     w = cp.Variable(feature_num)
     
     obj_func = cp.Minimize(cp.norm(w))
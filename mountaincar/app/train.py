@@ -1,15 +1,31 @@
+import os
 import sys
-import gym
-import pylab
+import argparse
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.config import config_class
+from common.metrics import make_writer
+from common.profiling import timers, Profiler
+
 from app import *
 
+parser = argparse.ArgumentParser()
+parser.add_argument('--max_iter_num', type=int, default=60000)
+parser.add_argument('--logdir', type=str, default='./logs',
+                    help='tensorboardx logs directory')
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+Config = config_class(parser, __name__)
+
 n_states = 400 # position - 20, velocity - 20
 n_actions = 3
 one_feature = 20 # number of state per one feature
 feature_num = 4
-q_table = np.zeros((n_states, n_actions))  # (400, 3)
 
 gamma = 0.99
 q_learning_rate = 0.03
@@ -23,14 +39,20 @@ def idx_state(env, state):
     state_idx = positioone_feature + velocity_idx * one_feature
     return state_idx
 
-def update_q_table(state, action, reward, next_state):
+def update_q_table(q_table, state, action, reward, next_state):
     q_1 = q_table[state][action]
     q_2 = reward + gamma * max(q_table[next_state])
     q_table[state][action] += q_learning_rate * (q_2 - q_1)
 
 
-def main():
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+
     env = gym.make('MountainCar-v0')
+    q_table = np.zeros((n_states, n_actions))  # (400, 3)
     demonstrations = np.load(file="expert_demo/expert_demo.npy")
     
     feature_estimate = FeatureEstimate(feature_num, env)
@@ -43,23 +65,29 @@ def main():
     
     w, status = QP_optimizer(feature_num, learner, expert)
     
-    
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
+
     episodes, scores = [], []
     
-    for episode in range(60000):
+    for episode in range(args.max_iter_num):
         state = env.reset()
         score = 0
 
         while True:
             state_idx = idx_state(env, state)
             action = np.argmax(q_table[state_idx])
-            next_state, reward, done, _ = env.step(action)
+            with timers('env.step'):
+                next_state, reward, done, _ = env.step(action)
+            timers.count('samples')
             
             features = feature_estimate.get_features(state)
             irl_reward = np.dot(w, features)
             
             next_state_idx = idx_state(env, next_state)
-            update_q_table(state_idx, action, irl_reward, next_state_idx)
+            with timers('q_update'):
+                update_q_table(q_table, state_idx, action, irl_reward, next_state_idx)
+            timers.count('updates')
 
             score += reward
             state = next_state
@@ -69,9 +97,13 @@ def main():
                 episodes.append(episode)
                 break
 
+        profiler.step()
+
         if episode % 1000 == 0:
             score_avg = np.mean(scores)
             print('{} episode score is {:.2f}'.format(episode, score_avg))
+            writer.add_scalar('log/score', float(score_avg), episode)
+            print(timers.report(writer, episode))
             # pylab.plot(episodes, scores, 'b')
             # pylab.savefig("./learning_curves/app_eps_60000.png")
             # np.save("./results/app_q_table", arr=q_table)
@@ -79,13 +111,21 @@ def main():
         if episode % 5000 == 0:
             # optimize weight per 5000 episode
             status = "infeasible"
-            temp_learner = calc_feature_expectation(feature_num, gamma, q_table, demonstrations, env)
+            with timers('feature_expectation'):
+                temp_learner = calc_feature_expectation(feature_num, gamma, q_table, demonstrations, env)
             learner = add_feature_expectation(learner, temp_learner)
             
-            while status=="infeasible":
-                w, status = QP_optimizer(feature_num, learner, expert)
-                if status=="infeasible":
-                    learner = subtract_feature_expectation(learner)
+            with timers('qp'):
+                while status=="infeasible":
+                    w, status = QP_optimizer(feature_num, learner, expert)
+                    if status=="infeasible":
+                        learner = subtract_feature_expectation(learner)
+
+    profiler.close()
+    writer.close()
+
+    return {'episodes': episode + 1, 'score': float(np.mean(scores)),
+            'q_table': q_table, 'weights': w}
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    train(parser.parse_args())
\ No newline at end of file
@@ -1,21 +1,36 @@
-import gym
-import pylab
+import os
+import sys
+import argparse
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.config import config_class
+from common.metrics import make_writer
+from common.profiling import timers, Profiler
+
 from maxent import *
 
+parser = argparse.ArgumentParser()
+parser.add_argument('--max_iter_num', type=int, default=30000)
+parser.add_argument('--logdir', type=str, default='./logs',
+                    help='tensorboardx logs directory')
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+Config = config_class(parser, __name__)
+
 n_states = 400 # position - 20, velocity - 20
 n_actions = 3
 one_feature = 20 # number of state per one feature
-q_table = np.zeros((n_states, n_actions)) # (400, 3)
 feature_matrix = np.eye((n_states)) # (400, 400)
 
 gamma = 0.99
 q_learning_rate = 0.03
 theta_learning_rate = 0.05
 
-np.random.seed(1)
-
 def idx_demo(env, one_feature):
     env_low = env.observation_space.low     
     env_high = env.observation_space.high   
@@ -44,39 +59,55 @@ def idx_state(env, state):
     state_idx = position_idx + velocity_idx * one_feature
     return state_idx
 
-def update_q_table(state, action, reward, next_state):
+def update_q_table(q_table, state, action, reward, next_state):
     q_1 = q_table[state][action]
     q_2 = reward + gamma * max(q_table[next_state])
     q_table[state][action] += q_learning_rate * (q_2 - q_1)
 
 
-def main():
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+    import pylab
+
+    np.random.seed(1)
     env = gym.make('MountainCar-v0')
     demonstrations = idx_demo(env, one_feature)
 
+    q_table = np.zeros((n_states, n_actions)) # (400, 3)
     learner_feature_expectations = np.zeros(n_states)
 
     theta = -(np.random.uniform(size=(n_states,)))
 
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
+
     episodes, scores = [], []
 
-    for episode in range(30000):
+    for episode in range(args.max_iter_num):
         state = env.reset()
         score = 0
 
         if episode != 0 and episode == 10000 or (episode > 10000 and episode % 5000 == 0):
             expert = expert_feature_expectations(feature_matrix, demonstrations)
             learner = learner_feature_expectations / episode
-            maxent_irl(expert, learner, theta, theta_learning_rate)
+            with timers('irl'):
+                maxent_irl(expert, learner, theta, theta_learning_rate)
                 
         while True:
             state_idx = idx_state(env, state)
             action = np.argmax(q_table[state_idx])
-            next_state, reward, done, _ = env.step(action)
+            with timers('env.step'):
+                next_state, reward, done, _ = env.step(action)
+            timers.count('samples')
             
             irl_reward = get_reward(feature_matrix, theta, n_states, state_idx)
             next_state_idx = idx_state(env, next_state)
-            update_q_table(state_idx, action, irl_reward, next_state_idx)
+            with timers('q_update'):
+                update_q_table(q_table, state_idx, action, irl_reward, next_state_idx)
+            timers.count('updates')
             
             learner_feature_expectations += feature_matrix[int(state_idx)]
 
@@ -88,12 +119,22 @@ def main():
                 episodes.append(episode)
                 break
 
+        profiler.step()
+
         if episode % 1000 == 0:
             score_avg = np.mean(scores)
             print('{} episode score is {:.2f}'.format(episode, score_avg))
+            writer.add_scalar('log/score', float(score_avg), episode)
+            print(timers.report(writer, episode))
             pylab.plot(episodes, scores, 'b')
             pylab.savefig("./learning_curves/maxent_30000.png")
             np.save("./results/maxent_q_table", arr=q_table)
 
+    profiler.close()
+    writer.close()
+
+    return {'episodes': episode + 1, 'score': float(np.mean(scores)),
+            'q_table': q_table, 'theta': theta}
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    train(parser.parse_args())
\ No newline at end of file
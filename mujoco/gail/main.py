@@ -1,13 +1,22 @@
 import os
-import gym
+import sys
 import pickle
 import argparse
 import numpy as np
-from collections import deque
 
 import torch
 import torch.optim as optim
-from tensorboardX import SummaryWriter 
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.actor_critic import FusedActorCritic
+from common.checkpoint import load_checkpoint
+from common.config import config_class
+from common.metrics import make_writer
+from common.profiling import timers, Profiler
+from common.rollout_policy import RolloutPolicy
+from common.runner import (EpisodeCollector, AsyncCollector, OnPolicyRunner, LogCallback,
+                           ProfileCallback)
+from common.snapshot import SnapshotCallback
 
 from utils.utils import *
 from utils.zfilter import ZFilter
@@ -16,7 +25,7 @@ from train_model import train_actor_critic, train_discrim
 
 parser = argparse.ArgumentParser(description='PyTorch GAIL')
 parser.add_argument('--env_name', type=str, default="Hopper-v2", 
-                    help='name of the environment to run')
+                    help='name of the environment to run, HopperStandIn-v0 needs no MuJoCo')
 parser.add_argument('--load_model', type=str, default=None, 
                     help='path to load the saved model')
 parser.add_argument('--render', action="store_true", default=False, 
@@ -47,10 +56,40 @@ parser.add_argument('--seed', type=int, default=500,
                     help='random seed (default: 500)')
 parser.add_argument('--logdir', type=str, default='logs',
                     help='tensorboardx logs directory')
-args = parser.parse_args()
-
-
-def main():
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+parser.add_argument('--num_samplers', type=int, default=0,
+                    help='number of async sampler processes, 0 to sample in the learner (default: 0)')
+parser.add_argument('--max_staleness', type=int, default=1,
+                    help='maximal policy version lag of an async batch (default: 1)')
+parser.add_argument('--max_is_weight', type=float, default=1.0,
+                    help='truncation of importance weights for stale batches (default: 1.0)')
+parser.add_argument('--compile', action="store_true", default=False,
+                    help='run the PPO minibatch loss under torch.compile')
+parser.add_argument('--actor_critic', type=str, default='separate', choices=['separate', 'fused', 'shared'],
+                    help='evaluate actor and critic separately, as one fused network, or fused with a '
+                         'shared trunk under both heads (default: separate)')
+parser.add_argument('--snapshot_dir', type=str, default='./snapshot',
+                    help='directory of the resumable training snapshot (default: ./snapshot)')
+parser.add_argument('--snapshot_interval', type=int, default=0,
+                    help='iterations between training snapshots, 0 to disable (default: 0)')
+parser.add_argument('--resume', action="store_true", default=False,
+                    help='continue from the snapshot in snapshot_dir if there is one')
+Config = config_class(parser, __name__)
+
+
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+    from common.envs import register_envs
+
+    register_envs()
     env = gym.make(args.env_name)
     env.seed(args.seed)
     torch.manual_seed(args.seed)
@@ -66,9 +105,6 @@ def main():
     critic = Critic(num_inputs, args)
     discrim = Discriminator(num_inputs + num_actions, args)
 
-    actor_optim = optim.Adam(actor.parameters(), lr=args.learning_rate)
-    critic_optim = optim.Adam(critic.parameters(), lr=args.learning_rate, 
-                              weight_decay=args.l2_rate) 
     discrim_optim = optim.Adam(discrim.parameters(), lr=args.learning_rate)
     
     # load demonstrations
@@ -76,11 +112,12 @@ def main():
     demonstrations = np.array(expert_demo)
     print("demonstrations.shape", demonstrations.shape)
     
-    # writer = SummaryWriter(args.logdir)
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
     
     if args.load_model is not None:
         saved_ckpt_path = os.path.join(os.getcwd(), 'save_model', str(args.load_model))
-        ckpt = torch.load(saved_ckpt_path)
+        ckpt = load_checkpoint(saved_ckpt_path)
 
         actor.load_state_dict(ckpt['actor'])
         critic.load_state_dict(ckpt['critic'])
@@ -92,78 +129,56 @@ def main():
 
         print("Loaded OK ex. Zfilter N {}".format(running_state.rs.n))
 
-    
-    episodes = 0    
-
-    for iter in range(args.max_iter_num):
+    # the learner trains the fused network and copies it back into actor and
+    # critic, which act and get checkpointed as before
+    fused = None
+    if args.actor_critic != 'separate':
+        fused = FusedActorCritic(actor, critic, shared_trunk=args.actor_critic == 'shared')
+        fused_optim = optim.Adam(fused.parameters(), lr=args.learning_rate)
+    else:
+        actor_optim = optim.Adam(actor.parameters(), lr=args.learning_rate)
+        critic_optim = optim.Adam(critic.parameters(), lr=args.learning_rate, 
+                                  weight_decay=args.l2_rate) 
+
+    policy = RolloutPolicy(actor, 'gaussian', (1, num_inputs), squeeze=True)
+
+    def irl_reward(state, action, reward, done, t):
+        return get_reward(discrim, state, action)
+
+    def learner(memory):
+        actor.train(), critic.train(), discrim.train()
+        with timers('discrim'):
+            train_discrim(discrim, memory, discrim_optim, demonstrations, args)
+        if fused is not None:
+            train_actor_critic(fused, None, memory, fused_optim, None, args)
+            fused.copy_to(actor, critic)
+        else:
+            train_actor_critic(actor, critic, memory, actor_optim, critic_optim, args)
         actor.eval(), critic.eval()
-        memory = deque()
-
-        steps = 0
-        scores = []
-
-        while steps < args.total_sample_size: 
-            state = env.reset()
-            score = 0
-
-            state = running_state(state)
-            
-            for _ in range(10000): 
-                if args.render:
-                    env.render()
-
-                steps += 1
-
-                mu, std = actor(torch.Tensor(state).unsqueeze(0))
-                action = get_action(mu, std)[0]
-                next_state, reward, done, _ = env.step(action)
-                irl_reward = get_reward(discrim, state, action)
-
-                if done:
-                    mask = 0
-                else:
-                    mask = 1
-
-                memory.append([state, action, irl_reward, mask])
-
-                next_state = running_state(next_state)
-                state = next_state
-
-                score += reward
-
-                if done:
-                    break
-            
-            episodes += 1
-            scores.append(score)
-        
-        score_avg = np.mean(scores)
-        print('{} episode score is {:.2f}'.format(episodes, score_avg))
-        # writer.add_scalar('log/score', float(score_avg), iter)
-
-        actor.train(), critic.train(), discrim.train() 
-        train_discrim(discrim, memory, discrim_optim, demonstrations, args)
-        train_actor_critic(actor, critic, memory, actor_optim, critic_optim, args)
-
-        # if iter % 100:
-        #     score_avg = int(score_avg)
-
-        #     model_path = os.path.join(os.getcwd(),'save_model')
-        #     if not os.path.isdir(model_path):
-        #         os.makedirs(model_path)
-
-        #     ckpt_path = os.path.join(model_path, 'ckpt_'+ str(score_avg)+'.pth.tar')
-
-        #     save_checkpoint({
-        #         'actor': actor.state_dict(),
-        #         'critic': critic.state_dict(),
-        #         'discrim': discrim.state_dict(),
-        #         'z_filter_n':running_state.rs.n,
-        #         'z_filter_m': running_state.rs.mean,
-        #         'z_filter_s': running_state.rs.sum_square,
-        #         'args': args,
-        #         'score': score_avg
-        #     }, filename=ckpt_path)
+
+    if args.num_samplers > 0:
+        collector = AsyncCollector(actor, running_state, args, reward_fn=irl_reward)
+    else:
+        collector = EpisodeCollector(env, policy, preprocess=running_state, reward_fn=irl_reward,
+                                     render=args.render, max_episode_steps=10000)
+
+    actor.eval(), critic.eval()
+    objects = {'actor': actor, 'critic': critic, 'discrim': discrim,
+               'discrim_optim': discrim_optim, 'running_state': running_state}
+    if fused is not None:
+        objects.update(actor_critic=fused, actor_critic_optim=fused_optim)
+    else:
+        objects.update(actor_optim=actor_optim, critic_optim=critic_optim)
+    snapshot = SnapshotCallback(args.snapshot_dir, args.snapshot_interval, objects,
+                                resume=args.resume)
+    runner = OnPolicyRunner(collector, learner, args.total_sample_size, args.max_iter_num,
+                            callbacks=[snapshot, LogCallback(writer), ProfileCallback(profiler)])
+    runner.run()
+    writer.close()
+
+    return {'iterations': runner.iteration + 1, 'episodes': runner.episodes,
+            'score': runner.iteration_score, 'actor': actor, 'critic': critic,
+            'running_state': running_state}
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    train(parser.parse_args())
\ No newline at end of file
@@ -1,21 +1,35 @@
 import os
-import gym
+import sys
+import copy
 import argparse
 import numpy as np
-from collections import deque
 
 import torch
 import torch.optim as optim
-from tensorboardX import SummaryWriter 
+import torch.multiprocessing as mp
+import torch.distributed as dist
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.actor_critic import FusedActorCritic
+from common.checkpoint import CheckpointManager, load_checkpoint
+from common.config import config_class
+from common.distributed import (init_process_group, broadcast_module, SyncedFilter,
+                                DistributedCollector)
+from common.metrics import make_writer
+from common.profiling import Profiler
+from common.rollout_policy import RolloutPolicy
+from common.runner import (EpisodeCollector, AsyncCollector, VecCollector, OnPolicyRunner,
+                           LogCallback, CheckpointCallback, EvalCallback, ProfileCallback)
+from common.snapshot import SnapshotCallback
+from common.vec_env import SubprocVecEnv
 
 from ppo import train_model
 from model import Actor, Critic
 from utils.zfilter import ZFilter
-from utils.utils import get_action, save_checkpoint
 
 parser = argparse.ArgumentParser(description='PyTorch PPO')
 parser.add_argument('--env_name', type=str, default="Hopper-v2", 
-                    help='name of the environment to run')
+                    help='name of the environment to run, HopperStandIn-v0 needs no MuJoCo')
 parser.add_argument('--load_model', type=str, default=None, 
                     help='path to load the saved model')
 parser.add_argument('--render', action="store_true", default=False, 
@@ -32,6 +46,8 @@ parser.add_argument('--l2_rate', type=float, default=1e-3,
                     help='l2 regularizer coefficient (default: 1e-3)')
 parser.add_argument('--clip_param', type=float, default=0.2, 
                     help='clipping parameter for PPO (default: 0.2)')
+parser.add_argument('--target_kl', type=float, default=None,
+                    help='stop the epochs of an update once a minibatch KL exceeds 1.5 * target_kl (default: off)')
 parser.add_argument('--model_update_num', type=int, default=10, 
                     help='update number of actor-critic (default: 10)')
 parser.add_argument('--total_sample_size', type=int, default=2048, 
@@ -44,11 +60,76 @@ parser.add_argument('--seed', type=int, default=500,
                     help='random seed (default: 500)')
 parser.add_argument('--logdir', type=str, default='logs',
                     help='tensorboardx logs directory')
-args = parser.parse_args()
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+parser.add_argument('--num_samplers', type=int, default=0,
+                    help='number of async sampler processes, 0 to sample in the learner (default: 0)')
+parser.add_argument('--max_staleness', type=int, default=1,
+                    help='maximal policy version lag of an async batch (default: 1)')
+parser.add_argument('--max_is_weight', type=float, default=1.0,
+                    help='truncation of importance weights for stale batches (default: 1.0)')
+parser.add_argument('--num_envs', type=int, default=0,
+                    help='number of envs stepped in shared-memory worker processes, 0 to step one env in the learner (default: 0)')
+parser.add_argument('--envs_per_worker', type=int, default=1,
+                    help='envs stepped by each worker process (default: 1)')
+parser.add_argument('--cpu_affinity', type=str, default=None,
+                    help='comma separated cpu ids the env workers are pinned to, e.g. "0,1,2,3"')
+parser.add_argument('--compile', action="store_true", default=False,
+                    help='run the PPO minibatch loss under torch.compile')
+parser.add_argument('--actor_critic', type=str, default='separate', choices=['separate', 'fused', 'shared'],
+                    help='evaluate actor and critic separately, as one fused network, or fused with a '
+                         'shared trunk under both heads (default: separate)')
+parser.add_argument('--eval_interval', type=int, default=0,
+                    help='iterations between evaluations of the mean action, 0 to disable (default: 0)')
+parser.add_argument('--eval_episodes', type=int, default=5,
+                    help='episodes per evaluation (default: 5)')
+parser.add_argument('--world_size', type=int, default=1,
+                    help='number of data-parallel ranks, each collecting total_sample_size / world_size samples (default: 1)')
+parser.add_argument('--rank', type=int, default=0,
+                    help='rank of this process when every rank is started separately (default: 0)')
+parser.add_argument('--dist_url', type=str, default='tcp://127.0.0.1:29500',
+                    help='TCP rendezvous address of rank 0 for the gloo backend')
+parser.add_argument('--spawn_ranks', action="store_true", default=False,
+                    help='start all world_size ranks as processes on this host')
+parser.add_argument('--checkpoint_interval', type=int, default=100,
+                    help='iterations between checkpoints, 0 to disable (default: 100)')
+parser.add_argument('--keep_best', type=int, default=3,
+                    help='number of highest scoring checkpoints kept (default: 3)')
+parser.add_argument('--keep_last', type=int, default=2,
+                    help='number of most recent checkpoints kept (default: 2)')
+parser.add_argument('--snapshot_dir', type=str, default='./snapshot',
+                    help='directory of the resumable training snapshot (default: ./snapshot)')
+parser.add_argument('--snapshot_interval', type=int, default=0,
+                    help='iterations between training snapshots, 0 to disable (default: 0)')
+parser.add_argument('--resume', action="store_true", default=False,
+                    help='continue from the snapshot in snapshot_dir if there is one')
+Config = config_class(parser, __name__)
+
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    if args.world_size > 1 and args.spawn_ranks:
+        # forked, so the config needs no pickling; rank 0 logs and checkpoints
+        mp.start_processes(train_rank, args=(args,), nprocs=args.world_size, start_method='fork')
+        return None
+    import gym
+    from common.envs import register_envs
+
+    distributed = args.world_size > 1
+    rank = args.rank if distributed else 0
+    if distributed:
+        if args.num_samplers > 0:
+            raise ValueError('--num_samplers can not be combined with --world_size')
+        init_process_group(rank, args.world_size, args.dist_url)
 
-def main():
+    register_envs()
     env = gym.make(args.env_name)
-    env.seed(args.seed)
+    env.seed(args.seed + rank)
     torch.manual_seed(args.seed)
 
     num_inputs = env.observation_space.shape[0]
@@ -61,15 +142,13 @@ def main():
     actor = Actor(num_inputs, num_actions, args)
     critic = Critic(num_inputs, args)
 
-    actor_optim = optim.Adam(actor.parameters(), lr=args.learning_rate)
-    critic_optim = optim.Adam(critic.parameters(), lr=args.learning_rate, 
-                              weight_decay=args.l2_rate) 
 
-    writer = SummaryWriter(args.logdir)
+    writer = make_writer(args.logdir, args.log_backend if rank == 0 else 'none')
+    profiler = Profiler(args.profile if rank == 0 else 'none', args.profile_iters, args.logdir)
     
     if args.load_model is not None:
         saved_ckpt_path = os.path.join(os.getcwd(), 'save_model', str(args.load_model))
-        ckpt = torch.load(saved_ckpt_path)
+        ckpt = load_checkpoint(saved_ckpt_path)
 
         actor.load_state_dict(ckpt['actor'])
         critic.load_state_dict(ckpt['critic'])
@@ -80,75 +159,127 @@ def main():
 
         print("Loaded OK ex. Zfilter N {}".format(running_state.rs.n))
 
-    
-    episodes = 0    
-
-    for iter in range(args.max_iter_num):
-        actor.eval(), critic.eval()
-        memory = deque()
+    preprocess = running_state
+    if distributed:
+        broadcast_module(actor)
+        broadcast_module(critic)
+        # same initial weights everywhere, different exploration noise
+        torch.manual_seed(args.seed + rank)
+        preprocess = SyncedFilter(running_state)
 
-        steps = 0
-        scores = []
+    # the learner trains the fused network and copies it back into actor and
+    # critic, which act and get checkpointed as before
+    fused = None
+    if args.actor_critic != 'separate':
+        fused = FusedActorCritic(actor, critic, shared_trunk=args.actor_critic == 'shared')
+        fused_optim = optim.Adam(fused.parameters(), lr=args.learning_rate)
+    else:
+        actor_optim = optim.Adam(actor.parameters(), lr=args.learning_rate)
+        critic_optim = optim.Adam(critic.parameters(), lr=args.learning_rate, 
+                                  weight_decay=args.l2_rate) 
 
-        while steps < args.total_sample_size: 
-            state = env.reset()
-            score = 0
+    policy = RolloutPolicy(actor, 'gaussian', (1, num_inputs), squeeze=True)
+    eval_policy = RolloutPolicy(actor, 'deterministic', (1, num_inputs), squeeze=True)
 
-            state = running_state(state)
-            
-            for _ in range(10000): 
-                if args.render:
-                    env.render()
+    # epochs run and skipped, approximate KL and clip fraction of the last update
+    update_stats = {}
 
-                steps += 1
-
-                mu, std = actor(torch.Tensor(state).unsqueeze(0))
-                action = get_action(mu, std)[0]
-                next_state, reward, done, _ = env.step(action)
-
-                if done:
-                    mask = 0
-                else:
-                    mask = 1
+    def learner(memory):
+        if fused is not None:
+            update_stats.update(train_model(fused, None, memory, fused_optim, None, args))
+            fused.copy_to(actor, critic)
+            return
+        actor.train(), critic.train()
+        update_stats.update(train_model(actor, critic, memory, actor_optim, critic_optim, args))
+        actor.eval(), critic.eval()
 
-                memory.append([state, action, reward, mask])
+    checkpoints = None
+    if rank == 0 and args.checkpoint_interval > 0:
+        checkpoints = CheckpointManager(os.path.join(os.getcwd(), 'save_model'),
+                                        keep_best=args.keep_best, keep_last=args.keep_last)
 
-                next_state = running_state(next_state)
-                state = next_state
+    def save(runner):
+        if not runner.iteration_scores:
+            # with --num_envs episodes can span batches, none finished in this one
+            return
+        score_avg = int(runner.iteration_score)
+        # serialized here, written by the manager's thread
+        checkpoints.save({
+            'actor': actor.state_dict(),
+            'critic': critic.state_dict(),
+            'z_filter_n':running_state.rs.n,
+            'z_filter_m': running_state.rs.mean,
+            'z_filter_s': running_state.rs.sum_square,
+            'args': vars(args),
+            'score': score_avg
+        }, runner.iteration + 1, score_avg)
 
-                score += reward
+    if args.num_samplers > 0:
+        collector = AsyncCollector(actor, running_state, args)
+    elif args.num_envs > 0:
+        cpus = None if args.cpu_affinity is None else [int(cpu) for cpu in args.cpu_affinity.split(',')]
+        vec_env = SubprocVecEnv(args.env_name, args.num_envs, args.envs_per_worker,
+                                seed=args.seed + rank * args.num_envs, cpu_affinity=cpus)
+        def bootstrap(states):
+            # gamma * V of the states the trajectories cut by the batch end would continue from
+            with torch.no_grad():
+                return args.gamma * critic(torch.Tensor(np.stack(states))).squeeze(1).numpy()
 
-                if done:
-                    break
-            
-            episodes += 1
-            scores.append(score)
-        
-        score_avg = np.mean(scores)
-        print('{} episode score is {:.2f}'.format(episodes, score_avg))
-        writer.add_scalar('log/score', float(score_avg), iter)
+        collector = VecCollector(vec_env, RolloutPolicy(actor, 'gaussian', (vec_env.num_envs, num_inputs)),
+                                 preprocess, bootstrap=bootstrap)
+    else:
+        collector = EpisodeCollector(env, policy, preprocess=preprocess, render=args.render,
+                                     max_episode_steps=10000)
+    if distributed:
+        collector = DistributedCollector(collector, preprocess)
 
-        actor.train(), critic.train()
-        train_model(actor, critic, memory, actor_optim, critic_optim, args)
+    def restored(extra):
+        # the synced filter merges the next batch into the restored statistics
+        if distributed:
+            preprocess.start_batch()
 
-        if iter % 100:
-            score_avg = int(score_avg)
+    objects = {'actor': actor, 'critic': critic, 'running_state': running_state}
+    if fused is not None:
+        objects.update(actor_critic=fused, actor_critic_optim=fused_optim)
+    else:
+        objects.update(actor_optim=actor_optim, critic_optim=critic_optim)
+    # every rank resumes from rank 0's snapshot but keeps its own RNG streams
+    callbacks = [SnapshotCallback(args.snapshot_dir, args.snapshot_interval, objects,
+                                  set_extra=restored, resume=args.resume, save=rank == 0,
+                                  restore_rng=not distributed),
+                 ProfileCallback(profiler)]
+    if rank == 0:
+        callbacks.append(LogCallback(writer, extra=lambda: update_stats))
+    if checkpoints is not None:
+        callbacks.append(CheckpointCallback(args.checkpoint_interval, save))
+    if rank == 0 and args.eval_interval > 0:
+        eval_env = gym.make(args.env_name)
+        eval_env.seed(args.seed + 1)
+        # the eval episodes must not move the running mean
+        callbacks.append(EvalCallback(eval_env, eval_policy, writer, args.eval_interval,
+                                      args.eval_episodes,
+                                      preprocess=lambda state: running_state(state, update=False),
+                                      max_episode_steps=10000))
 
-            model_path = os.path.join(os.getcwd(),'save_model')
-            if not os.path.isdir(model_path):
-                os.makedirs(model_path)
+    actor.eval(), critic.eval()
+    runner = OnPolicyRunner(collector, learner, args.total_sample_size // args.world_size,
+                            args.max_iter_num, callbacks=callbacks)
+    runner.run()
+    writer.close()
+    if checkpoints is not None:
+        checkpoints.close()
+    if distributed:
+        dist.destroy_process_group()
 
-            ckpt_path = os.path.join(model_path, 'ckpt_'+ str(score_avg)+'.pth.tar')
+    return {'iterations': runner.iteration + 1, 'episodes': runner.episodes,
+            'score': runner.iteration_score, 'actor': actor, 'critic': critic,
+            'running_state': running_state}
 
-            save_checkpoint({
-                'actor': actor.state_dict(),
-                'critic': critic.state_dict(),
-                'z_filter_n':running_state.rs.n,
-                'z_filter_m': running_state.rs.mean,
-                'z_filter_s': running_state.rs.sum_square,
-                'args': args,
-                'score': score_avg
-            }, filename=ckpt_path)
+def train_rank(rank, args):
+    args = copy.copy(args)
+    args.rank = rank
+    args.spawn_ranks = False
+    train(args)
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    train(parser.parse_args())
\ No newline at end of file
@@ -1,65 +1,87 @@
 import torch
 import numpy as np
 from utils.utils import log_prob_density
+from common.profiling import timers
+from common.actor_critic import evaluate
+from common.ppo_update import ppo_update
+from common.distributed import is_distributed, all_reduce_gradients, min_across_ranks, mean_across_ranks
 
 def train_model(actor, critic, memory, actor_optim, critic_optim, args):
     memory = np.array(memory) 
-    states = np.vstack(memory[:, 0]) 
-    actions = list(memory[:, 1]) 
+    states = torch.Tensor(np.vstack(memory[:, 0]))
+    actions = torch.Tensor(np.vstack(memory[:, 1]))
     rewards = list(memory[:, 2]) 
     masks = list(memory[:, 3]) 
 
-    old_values = critic(torch.Tensor(states))
-    returns, advants = get_gae(rewards, masks, old_values, args)
-    
-    mu, std = actor(torch.Tensor(states))
-    old_policy = log_prob_density(torch.Tensor(actions), mu, std)
-
+    with torch.no_grad():
+        mu, std, old_values = evaluate(actor, critic, states)
+        returns, advants = get_gae(rewards, masks, old_values, args)
+        old_policy = log_prob_density(actions, mu, std)
+        is_weights = get_is_weights(memory, old_policy, args)
+
+    # states and actions are converted once, minibatches only gather rows
+    tensors = [states, actions, returns.unsqueeze(1), advants.unsqueeze(1),
+               old_values, old_policy, is_weights]
+
+    # a FusedActorCritic comes as actor, with critic and critic_optim None
+    optimizers = [actor_optim] if critic is None else [actor_optim, critic_optim]
+    num_batches, grad_hook, reduce_kl = None, None, None
+    if is_distributed():
+        # every rank takes the same number of steps, each on its own samples
+        num_batches = min_across_ranks(len(states) // args.batch_size)
+        parameters = [param for module in (actor, critic) if module is not None
+                      for param in module.parameters()]
+        grad_hook = lambda: all_reduce_gradients(parameters)
+        reduce_kl = mean_across_ranks
+    if critic is None:
+        reduce = grad_hook
+        def grad_hook():
+            if reduce is not None:
+                reduce()
+            actor.decay_critic_grads(args.l2_rate)
+
+    return ppo_update(ppo_loss, (actor, critic, args), tensors, 
+                      optimizers, args.batch_size, 
+                      args.model_update_num, compile=args.compile,
+                      num_batches=num_batches, grad_hook=grad_hook,
+                      clip_param=args.clip_param, target_kl=args.target_kl,
+                      reduce_kl=reduce_kl)
+
+def ppo_loss(actor, critic, args, inputs, actions_samples, returns_samples, 
+             advants_samples, oldvalue_samples, old_policy_samples, is_weights_samples):
     criterion = torch.nn.MSELoss()
-    n = len(states)
-    arr = np.arange(n)
-
-    for _ in range(args.model_update_num):
-        np.random.shuffle(arr)
-
-        for i in range(n // args.batch_size): 
-            batch_index = arr[args.batch_size * i : args.batch_size * (i + 1)]
-            batch_index = torch.LongTensor(batch_index)
-            
-            inputs = torch.Tensor(states)[batch_index]
-            actions_samples = torch.Tensor(actions)[batch_index]
-            returns_samples = returns.unsqueeze(1)[batch_index]
-            advants_samples = advants.unsqueeze(1)[batch_index]
-            oldvalue_samples = old_values[batch_index].detach()
-            
-            values = critic(inputs)
-            clipped_values = oldvalue_samples + \
-                             torch.clamp(values - oldvalue_samples,
-                                         -args.clip_param, 
-                                         args.clip_param)
-            critic_loss1 = criterion(clipped_values, returns_samples)
-            critic_loss2 = criterion(values, returns_samples)
-            critic_loss = torch.max(critic_loss1, critic_loss2).mean()
-
-            loss, ratio = surrogate_loss(actor, advants_samples, inputs,
-                                         old_policy.detach(), actions_samples,
-                                         batch_index)
-            clipped_ratio = torch.clamp(ratio,
-                                        1.0 - args.clip_param,
-                                        1.0 + args.clip_param)
-            clipped_loss = clipped_ratio * advants_samples
-            actor_loss = -torch.min(loss, clipped_loss).mean()
-
-            loss = actor_loss + 0.5 * critic_loss
-
-            critic_optim.zero_grad()
-            loss.backward(retain_graph=True) 
-            critic_optim.step()
-
-            actor_optim.zero_grad()
-            loss.backward()
-            actor_optim.step()
 
+    mu, std, values = evaluate(actor, critic, inputs)
+    clipped_values = oldvalue_samples + \
+                     torch.clamp(values - oldvalue_samples,
+                                 -args.clip_param, 
+                                 args.clip_param)
+    critic_loss1 = criterion(clipped_values, returns_samples)
+    critic_loss2 = criterion(values, returns_samples)
+    critic_loss = torch.max(critic_loss1, critic_loss2).mean()
+
+    loss, ratio = surrogate_loss(mu, std, advants_samples,
+                                 old_policy_samples, actions_samples)
+    clipped_ratio = torch.clamp(ratio,
+                                1.0 - args.clip_param,
+                                1.0 + args.clip_param)
+    clipped_loss = clipped_ratio * advants_samples
+    actor_loss = -(is_weights_samples * torch.min(loss, clipped_loss)).mean()
+
+    return actor_loss + 0.5 * critic_loss, ratio
+
+def get_is_weights(memory, old_policy, args):
+    # samples collected by an async sampler carry the log-probability of the
+    # (possibly stale) behavior policy in a fifth column. correct them towards
+    # the policy at the start of this update with truncated importance weights
+    if memory.shape[1] < 5:
+        return torch.ones_like(old_policy)
+
+    behavior_policy = torch.Tensor(list(memory[:, 4])).unsqueeze(1)
+    is_weights = torch.exp(old_policy - behavior_policy)
+    return torch.clamp(is_weights, max=args.max_is_weight)
+
+@timers.timed('gae')
 def get_gae(rewards, masks, values, args):
     rewards = torch.Tensor(rewards)
     masks = torch.Tensor(masks)
@@ -85,10 +107,8 @@ def get_gae(rewards, masks, values, args):
     advants = (advants - advants.mean()) / advants.std()
     return returns, advants
 
-def surrogate_loss(actor, advants, states, old_policy, actions, batch_index):
-    mu, std = actor(states)
+def surrogate_loss(mu, std, advants, old_policy, actions):
     new_policy = log_prob_density(actions, mu, std)
-    old_policy = old_policy[batch_index]
 
     ratio = torch.exp(new_policy - old_policy)
     surrogate_loss = ratio * advants
@@ -1,6 +1,9 @@
 import numpy as np
 from utils.utils import *
+from common.natural_gradient import fisher_diagonal
+from common.profiling import timers
 
+@timers.timed('gae')
 def get_returns(rewards, masks, gamma):
     rewards = torch.Tensor(rewards)
     masks = torch.Tensor(masks)
@@ -24,29 +27,7 @@ def get_loss(actor, returns, states, actions):
     loss = loss.mean()
     return loss
 
-# from openai baseline code
-# https://github.com/openai/baselines/blob/master/baselines/common/cg.py
-def conjugate_gradient(actor, states, b, nsteps, residual_tol=1e-10):
-    x = torch.zeros(b.size())
-    r = b.clone()
-    p = b.clone()
-    rdotr = torch.dot(r, r)
-
-    for i in range(nsteps): # nsteps=10
-        f_Ax = hessian_vector_product(actor, states, p, cg_damping=1e-1)
-        alpha = rdotr / torch.dot(p, f_Ax)
-        x += alpha * p
-        r -= alpha * f_Ax
-        new_rdotr = torch.dot(r, r)
-        beta = new_rdotr / rdotr
-        p = r + beta * p
-        
-        rdotr = new_rdotr
-        if rdotr < residual_tol: # residual_tol = 0.0000000001
-            break
-    return x
-
-def train_model(actor, memory, args):
+def train_model(actor, memory, args, cg, kfac=None):
     memory = np.array(memory)
     states = np.vstack(memory[:, 0])
     actions = list(memory[:, 1])
@@ -63,7 +44,15 @@ def train_model(actor, memory, args):
     loss_grad = torch.autograd.grad(loss, actor.parameters())
     loss_grad = flat_grad(loss_grad)
 
-    step_dir = conjugate_gradient(actor, states, loss_grad.data, nsteps=10)
+    # a KFAC refreshes its factors and inverts them in one pass, instead
+    # of one hessian vector product per conjugate gradient step
+    if kfac is not None:
+        kfac.update_factors(states)
+        step_dir = kfac.solve(loss_grad.data)
+    else:
+        diagonal = fisher_diagonal(actor, states) if args.cg_preconditioner == 'diagonal' else None
+        step_dir = cg.solve(lambda p: hessian_vector_product(actor, states, p, cg_damping=1e-1),
+                            loss_grad.data, diagonal)
 
     # ----------------------------
     # step 3: get step direction and step size and update actor
@@ -1,16 +1,23 @@
 import os
-import gym
+import sys
 import argparse
-import numpy as np
-from collections import deque
 
 import torch
 import torch.optim as optim
-from tensorboardX import SummaryWriter 
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.checkpoint import CheckpointManager, load_checkpoint
+from common.config import config_class
+from common.conjugate_gradient import ConjugateGradient
+from common.kfac import KFAC
+from common.metrics import make_writer
+from common.profiling import timers, Profiler
+from common.rollout_policy import RolloutPolicy
+from common.runner import EpisodeCollector, OnPolicyRunner, LogCallback, CheckpointCallback, ProfileCallback
+from common.snapshot import SnapshotCallback
 
 from model import Actor
 from tnpg import train_model
-from utils.utils import get_action
 from utils.running_state import ZFilter
 
 parser = argparse.ArgumentParser(description='PyTorch NPG')
@@ -20,13 +27,51 @@ parser.add_argument('--save_path', default='./save_model/', help='')
 parser.add_argument('--render', action="store_true", default=False)
 parser.add_argument('--gamma', type=float, default=0.99)
 parser.add_argument('--hidden_size', type=int, default=64)
+parser.add_argument('--natural_grad_solver', type=str, default='cg', choices=['cg', 'kfac'],
+                    help='conjugate gradient on hessian vector products or a KFAC '
+                         'preconditioner for the natural gradient (default: cg)')
+parser.add_argument('--cg_max_steps', type=int, default=10,
+                    help='conjugate gradient steps per update at most (default: 10)')
+parser.add_argument('--cg_rtol', type=float, default=0.0,
+                    help='stop conjugate gradient once |g - F x| <= cg_rtol |g|, 0 runs all steps (default: 0)')
+parser.add_argument('--cg_warm_start', action="store_true", default=False,
+                    help='start conjugate gradient from the previous update\'s solution')
+parser.add_argument('--cg_preconditioner', type=str, default='none', choices=['none', 'diagonal'],
+                    help='precondition conjugate gradient with the Fisher diagonal (default: none)')
+parser.add_argument('--max_iter_num', type=int, default=2000)
+parser.add_argument('--total_sample_size', type=int, default=2048)
 parser.add_argument('--learning_rate', type=float, default=3e-4)
 parser.add_argument('--logdir', type=str, default='logs',
                     help='tensorboardx logs directory')
-args = parser.parse_args()
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+parser.add_argument('--checkpoint_interval', type=int, default=100,
+                    help='iterations between checkpoints, 0 to disable (default: 100)')
+parser.add_argument('--keep_best', type=int, default=3,
+                    help='number of highest scoring checkpoints kept (default: 3)')
+parser.add_argument('--keep_last', type=int, default=2,
+                    help='number of most recent checkpoints kept (default: 2)')
+parser.add_argument('--snapshot_dir', type=str, default='./snapshot',
+                    help='directory of the resumable training snapshot (default: ./snapshot)')
+parser.add_argument('--snapshot_interval', type=int, default=0,
+                    help='iterations between training snapshots, 0 to disable (default: 0)')
+parser.add_argument('--resume', action="store_true", default=False,
+                    help='continue from the snapshot in snapshot_dir if there is one')
+Config = config_class(parser, __name__)
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-if __name__=="__main__":
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+    from common.envs import register_envs
+
+    register_envs()
     env = gym.make(args.env_name)
     env.seed(500)
     torch.manual_seed(500)
@@ -37,59 +82,45 @@ if __name__=="__main__":
     print('action size:', action_size) 
 
     actor = Actor(state_size, action_size, args)
-    # writer = SummaryWriter(args.logdir)
-    
-    if not os.path.isdir(args.save_path):
-        os.makedirs(args.save_path)
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
+    checkpoints = CheckpointManager(args.save_path, keep_best=args.keep_best,
+                                    keep_last=args.keep_last, prefix='model')
 
     running_state = ZFilter((state_size,), clip=5)
-    episodes = 0    
-
-    for iter in range(2000):
-        memory = deque()
-        scores = []
-        steps = 0
-
-        while steps < 2048: 
-            score = 0
-            episodes += 1
-            
-            state = env.reset()
-            state = running_state(state)
-            
-            for _ in range(10000): 
-                if args.render:
-                    env.render()
-
-                steps += 1
+    if args.load_model is not None:
+        actor.load_state_dict(load_checkpoint(os.path.join(args.save_path, args.load_model)))
 
-                mu, std = actor(torch.Tensor(state).unsqueeze(0))
-                action = get_action(mu, std)[0]
-                next_state, reward, done, _ = env.step(action)
-
-                if done:
-                    mask = 0
-                else:
-                    mask = 1
-
-                memory.append([state, action, reward, mask])
-
-                next_state = running_state(next_state)
-                state = next_state
-                score += reward
-
-                if done:
-                    break
-            
-            scores.append(score)
-        
-        score_avg = np.mean(scores)
-        print('{} episode score is {:.2f}'.format(episodes, score_avg))
-        # writer.add_scalar('log/score', float(score_avg), iter)
+    kfac = KFAC(actor) if args.natural_grad_solver == 'kfac' else None
+    cg = ConjugateGradient(args.cg_max_steps, args.cg_rtol, args.cg_warm_start, writer=writer)
+    policy = RolloutPolicy(actor, 'gaussian', (1, state_size), squeeze=True)
 
+    def learner(memory):
         actor.train()
-        train_model(actor, memory, args)
+        train_model(actor, memory, args, cg, kfac)
+        timers.count('updates')
+
+    def save(runner):
+        checkpoints.save(actor.state_dict(), runner.iteration + 1, runner.iteration_score)
+
+    collector = EpisodeCollector(env, policy, preprocess=running_state, render=args.render,
+                                 max_episode_steps=10000)
+    objects = {'actor': actor, 'running_state': running_state}
+    if kfac is not None:
+        objects.update(kfac=kfac)
+    if args.cg_warm_start:
+        objects.update(conjugate_gradient=cg)
+    snapshot = SnapshotCallback(args.snapshot_dir, args.snapshot_interval, objects, resume=args.resume)
+    runner = OnPolicyRunner(collector, learner, args.total_sample_size, args.max_iter_num,
+                            callbacks=[snapshot, LogCallback(writer, extra=cg.stats),
+                                       CheckpointCallback(args.checkpoint_interval, save),
+                                       ProfileCallback(profiler)])
+    runner.run()
+    writer.close()
+    checkpoints.close()
+
+    return {'iterations': runner.iteration + 1, 'episodes': runner.episodes,
+            'score': runner.iteration_score, 'actor': actor, 'running_state': running_state}
 
-        if iter % 100:
-            ckpt_path = args.save_path + str(score_avg) + 'model.pth'
-            torch.save(actor.state_dict(), ckpt_path)
\ No newline at end of file
+if __name__=="__main__":
+    train(parser.parse_args())
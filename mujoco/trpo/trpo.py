@@ -1,8 +1,10 @@
 import numpy as np
 from model import Actor
 from utils.utils import *
+from common.natural_gradient import fisher_diagonal
+from common.profiling import timers
 
-def train_model(actor, memory, state_size, action_size, args):
+def train_model(actor, memory, state_size, action_size, args, cg, kfac=None):
     memory = np.array(memory)
     states = np.vstack(memory[:, 0])
     actions = list(memory[:, 1])
@@ -23,7 +25,15 @@ def train_model(actor, memory, state_size, action_size, args):
     loss_grad = flat_grad(loss_grad)
     loss = loss.data.numpy()
     
-    step_dir = conjugate_gradient(actor, states, loss_grad.data, nsteps=10)
+    # a KFAC refreshes its factors and inverts them in one pass, instead
+    # of one hessian vector product per conjugate gradient step
+    if kfac is not None:
+        kfac.update_factors(states)
+        step_dir = kfac.solve(loss_grad.data)
+    else:
+        diagonal = fisher_diagonal(actor, states) if args.cg_preconditioner == 'diagonal' else None
+        step_dir = cg.solve(lambda p: hessian_vector_product(actor, states, p),
+                            loss_grad.data, diagonal)
 
     # ----------------------------
     # step 3: get step-size alpha and maximal step
@@ -45,44 +55,47 @@ def train_model(actor, memory, state_size, action_size, args):
     # Backtracking line search
     # see cvx 464p https://web.stanford.edu/~boyd/cvxbook/bv_cvxbook.pdf
     # additionally, https://en.wikipedia.org/wiki/Backtracking_line_search
-    flag = False
-    alpha = 0.5
-    beta = 0.5
-    t = 1.0
-
-    for i in range(10):
-        new_params = params + t * maximal_step
-        update_model(actor, new_params)
+    with timers('line_search'):
+        flag = False
+        alpha = 0.5
+        beta = 0.5
+        t = 1.0
+
+        for i in range(10):
+            new_params = params + t * maximal_step
+            update_model(actor, new_params)
         
-        new_loss = surrogate_loss(actor, returns, states, old_policy.detach(), actions)
-        new_loss = new_loss.data.numpy()
+            new_loss = surrogate_loss(actor, returns, states, old_policy.detach(), actions)
+            new_loss = new_loss.data.numpy()
 
-        loss_improve = new_loss - loss
-        expected_improve *= t
-        improve_condition = loss_improve / expected_improve
+            loss_improve = new_loss - loss
+            expected_improve *= t
+            improve_condition = loss_improve / expected_improve
 
-        kl = kl_divergence(old_actor=old_actor, new_actor=actor, states=states)
-        kl = kl.mean()
+            kl = kl_divergence(old_actor=old_actor, new_actor=actor, states=states)
+            kl = kl.mean()
 
-        print('kl: {:.4f} | loss_improve: {:.4f} | expected_improve: {:.4f} '
-              '| improve_condition: {:.4f} | number of line search: {}'
-              .format(kl.data.numpy(), loss_improve, expected_improve[0], improve_condition, i))
+            print('kl: {:.4f} | loss_improve: {:.4f} | expected_improve: {:.4f} '
+                  '| improve_condition: {:.4f} | number of line search: {}'
+                  .format(float(kl.data), float(loss_improve), float(expected_improve[0]),
+                          float(improve_condition[0]), i))
 
-        # kl-divergence와 expected_new_loss_grad와 함께 trust region 안에 있는지 밖에 있는지를 판단
-        # trust region 안에 있으면 loop 탈출
-        # max_kl = 0.01
-        if kl < args.max_kl and improve_condition > alpha:
-            flag = True
-            break
+            # kl-divergence와 expected_new_loss_grad와 함께 trust region 안에 있는지 밖에 있는지를 판단
+            # trust region 안에 있으면 loop 탈출
+            # max_kl = 0.01
+            if kl < args.max_kl and improve_condition > alpha:
+                flag = True
+                break
 
-        # trust region 밖에 있으면 maximal_step을 반만큼 쪼개서 다시 실시
-        t *= beta
+            # trust region 밖에 있으면 maximal_step을 반만큼 쪼개서 다시 실시
+            t *= beta
 
-    if not flag:
-        params = flat_params(old_actor)
-        update_model(actor, params)
-        print('policy update does not impove the surrogate')
+        if not flag:
+            params = flat_params(old_actor)
+            update_model(actor, params)
+            print('policy update does not impove the surrogate')
 
+@timers.timed('gae')
 def get_returns(rewards, masks, gamma):
     rewards = torch.Tensor(rewards)
     masks = torch.Tensor(masks)
@@ -104,24 +117,4 @@ def surrogate_loss(actor, returns, states, old_policy, actions):
 
     surrogate = torch.exp(new_policy - old_policy) * returns
     surrogate = surrogate.mean()
-    return surrogate
-
-# from openai baseline code
-# https://github.com/openai/baselines/blob/master/baselines/common/cg.py
-def conjugate_gradient(actor, states, b, nsteps, residual_tol=1e-10):
-    x = torch.zeros(b.size())
-    r = b.clone()
-    p = b.clone()
-    rdotr = torch.dot(r, r)
-    for i in range(nsteps):
-        _Avp = hessian_vector_product(actor, states, p)
-        alpha = rdotr / torch.dot(p, _Avp)
-        x += alpha * p
-        r -= alpha * _Avp
-        new_rdotr = torch.dot(r, r)
-        betta = new_rdotr / rdotr
-        p = r + betta * p
-        rdotr = new_rdotr
-        if rdotr < residual_tol:
-            break
-    return x
\ No newline at end of file
+    return surrogate
\ No newline at end of file
@@ -1,16 +1,24 @@
 import os
-import gym
-import random
+import sys
 import argparse
 import numpy as np
-from collections import deque
 
 import torch
 import torch.optim as optim
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.checkpoint import load_checkpoint
+from common.config import config_class
+from common.memmap_replay import make_replay_buffer
+from common.metrics import make_writer
+from common.profiling import Profiler
+from common.rollout_policy import RolloutPolicy
+from common.runner import (EpisodeCollector, OffPolicyRunner, LogCallback,
+                           ProfileCallback, GoalCallback, save_state_dict, transition_dtypes)
+from common.snapshot import SnapshotCallback
+
 from utils import *
 from model import Actor, Critic
-from tensorboardX import SummaryWriter
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--env_name', type=str, default="Pendulum-v0")
@@ -31,17 +39,35 @@ parser.add_argument('--log_interval', type=int, default=10)
 parser.add_argument('--goal_score', type=int, default=-300)
 parser.add_argument('--logdir', type=str, default='./logs',
                     help='tensorboardx logs directory')
-args = parser.parse_args()
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+parser.add_argument('--replay_size', type=int, default=10000,
+                    help='capacity of the replay buffer (default: 10000)')
+parser.add_argument('--replay_dir', type=str, default=None,
+                    help='keep the replay buffer in memmap files in this directory instead of RAM')
+parser.add_argument('--replay_hot_size', type=int, default=65536,
+                    help='most recent transitions of a memmap replay kept in RAM (default: 65536)')
+parser.add_argument('--storage_precision', type=str, default='float32',
+                    choices=['float64', 'float32', 'float16'],
+                    help='dtype of the states stored in the replay buffer (default: float32)')
+parser.add_argument('--snapshot_dir', type=str, default='./snapshot',
+                    help='directory of the resumable training snapshot (default: ./snapshot)')
+parser.add_argument('--snapshot_interval', type=int, default=0,
+                    help='iterations between training snapshots, 0 to disable (default: 0)')
+parser.add_argument('--resume', action="store_true", default=False,
+                    help='continue from the snapshot in snapshot_dir if there is one')
+Config = config_class(parser, __name__)
 
 def train_model(actor, critic, target_actor, target_critic, 
-                actor_optimizer, critic_optimizer, mini_batch):
-    mini_batch = np.array(mini_batch)
-    states = np.vstack(mini_batch[:, 0])
-    actions = list(mini_batch[:, 1])
-    rewards = list(mini_batch[:, 2])
-    next_states = np.vstack(mini_batch[:, 3])
-    masks = list(mini_batch[:, 4])
-
+                actor_optimizer, critic_optimizer, mini_batch, args):
+    # the replay's columns, states stored as [batch, 1, state_size]
+    states, actions, rewards, next_states, masks = mini_batch
+    states = torch.Tensor(states).flatten(1)
+    next_states = torch.Tensor(next_states).flatten(1)
     actions = torch.Tensor(actions).squeeze(1)
     rewards = torch.Tensor(rewards).squeeze(1)
     masks = torch.Tensor(masks)
@@ -50,11 +76,11 @@ def train_model(actor, critic, target_actor, target_critic,
     criterion = torch.nn.MSELoss()
     
     # get Q-value
-    q_value = critic(torch.Tensor(states), actions).squeeze(1)
+    q_value = critic(states, actions).squeeze(1)
     
     # get target
-    target_next_policy = target_actor(torch.Tensor(next_states))
-    target_next_q_value = target_critic(torch.Tensor(next_states), target_next_policy).squeeze(1)
+    target_next_policy = target_actor(next_states)
+    target_next_q_value = target_critic(next_states, target_next_policy).squeeze(1)
     target = rewards + masks * args.gamma * target_next_q_value
     
     critic_loss = criterion(q_value, target.detach())
@@ -63,15 +89,20 @@ def train_model(actor, critic, target_actor, target_critic,
     critic_optimizer.step()
 
     # update actor 
-    policy = actor(torch.Tensor(states))
+    policy = actor(states)
     
-    actor_loss = -critic(torch.Tensor(states), policy).mean()
+    actor_loss = -critic(states, policy).mean()
     actor_optimizer.zero_grad()
     actor_loss.backward()
     actor_optimizer.step()
 
     
-def main():
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+
     env = gym.make(args.env_name)
     env.seed(500)
     torch.manual_seed(500)
@@ -89,66 +120,51 @@ def main():
     actor_optimizer = optim.Adam(actor.parameters(), lr=args.actor_lr)
     critic_optimizer = optim.Adam(critic.parameters(), lr=args.critic_lr)
 
+    if args.load_model is not None:
+        actor.load_state_dict(load_checkpoint(os.path.join(args.save_path, args.load_model)))
+
     hard_target_update(actor, critic, target_actor, target_critic)
     ou_noise = OUNoise(action_size, args.theta, args.mu, args.sigma)
 
-    writer = SummaryWriter(args.logdir)
-    
-    replay_buffer = deque(maxlen=10000)
-    recent_rewards = deque(maxlen=100)
-    steps = 0
-
-    for episode in range(args.max_iter_num):
-        done = False
-        score = 0
-
-        state = env.reset()
-        state = np.reshape(state, [1, state_size])
-
-        while not done:
-            if args.render:
-                env.render()
-
-            steps += 1
-
-            policy = actor(torch.Tensor(state))
-            action = get_action(policy, ou_noise)
-            
-            next_state, reward, done, _ = env.step(action) 
-
-            next_state = np.reshape(next_state, [1, state_size])
-            mask = 0 if done else 1
-
-            replay_buffer.append((state, action, reward, next_state, mask))
-
-            state = next_state
-            score += reward
-
-            if steps > args.batch_size:
-                mini_batch = random.sample(replay_buffer, args.batch_size)
-                
-                actor.train(), critic.train()
-                target_actor.train(), target_critic.train()
-                train_model(actor, critic, target_actor, target_critic, 
-                            actor_optimizer, critic_optimizer, mini_batch)
-                
-                soft_target_update(actor, critic, target_actor, target_critic, args.tau)
-
-            if done:
-                recent_rewards.append(score)
-
-        if episode % args.log_interval == 0:
-            print('{} episode | score_avg: {:.2f}'.format(episode, np.mean(recent_rewards)))
-            writer.add_scalar('log/score', float(score), episode)
-
-        if np.mean(recent_rewards) > args.goal_score:
-            if not os.path.isdir(args.save_path):
-                os.makedirs(args.save_path)
-
-            ckpt_path = args.save_path + 'model.pth.tar'
-            torch.save(actor.state_dict(), ckpt_path)
-            print('Recent rewards exceed -300. So end')
-            break  
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
+
+    rollout = RolloutPolicy(actor, 'deterministic', (1, state_size))
+
+    def policy(state):
+        return rollout(state) + ou_noise.sample()
+
+    def learner(mini_batch):
+        actor.train(), critic.train()
+        target_actor.train(), target_critic.train()
+        train_model(actor, critic, target_actor, target_critic,
+                    actor_optimizer, critic_optimizer, mini_batch, args)
+        soft_target_update(actor, critic, target_actor, target_critic, args.tau)
+
+    def save(runner):
+        save_state_dict(actor, args.save_path + 'model.pth.tar')
+
+    collector = EpisodeCollector(env, policy, render=args.render,
+                                 preprocess=lambda state: np.reshape(state, [1, state_size]))
+    goal = GoalCallback(args.goal_score, save=save)
+    log = LogCallback(writer, args.log_interval)
+    replay = make_replay_buffer(args.replay_size, args.replay_dir, args.replay_hot_size,
+                                transition_dtypes(args.storage_precision))
+    snapshot = SnapshotCallback(args.snapshot_dir, args.snapshot_interval,
+                                {'actor': actor, 'critic': critic, 'target_actor': target_actor,
+                                 'target_critic': target_critic, 'actor_optimizer': actor_optimizer,
+                                 'critic_optimizer': critic_optimizer},
+                                replay=replay, get_extra=lambda: {'ou_noise': ou_noise.X},
+                                set_extra=lambda extra: setattr(ou_noise, 'X', extra['ou_noise']),
+                                resume=args.resume)
+    runner = OffPolicyRunner(collector, learner, replay, args.batch_size,
+                             args.max_iter_num, update_after=args.batch_size,
+                             callbacks=[snapshot, ProfileCallback(profiler), log, goal])
+    runner.run()
+    writer.close()
+
+    return {'episodes': runner.episodes, 'score': runner.score_avg,
+            'solved': goal.reached, 'actor': actor, 'critic': critic}
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    train(parser.parse_args())
\ No newline at end of file
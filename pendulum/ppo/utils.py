@@ -24,11 +24,10 @@ def get_log_prob(actions, mu, std):
 
     return log_prob
 
-def surrogate_loss(actor, values, targets, states, old_policy, actions, batch_index):
-    mu, std = actor(torch.Tensor(states))
+def surrogate_loss(actor, values, targets, states, old_policy, actions):
+    mu, std = actor(states)
     new_policy = get_log_prob(actions, mu, std)
     
-    old_policy = old_policy[batch_index]
     ratio = torch.exp(new_policy - old_policy)
 
     advantages = targets - values
@@ -1,15 +1,24 @@
 import os
-import gym
+import sys
 import argparse
 import numpy as np
-from collections import deque
 
 import torch
 import torch.optim as optim
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.checkpoint import load_checkpoint
+from common.config import config_class
+from common.metrics import make_writer
+from common.profiling import timers, Profiler
+from common.rollout_policy import RolloutPolicy
+from common.runner import (EpisodeCollector, OnPolicyRunner, LogCallback,
+                           ProfileCallback, GoalCallback, save_state_dict)
+from common.snapshot import SnapshotCallback
+from common.ppo_update import ppo_update
+
 from utils import *
 from model import Actor, Critic
-from tensorboardX import SummaryWriter
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--env_name', type=str, default="Pendulum-v0")
@@ -24,18 +33,34 @@ parser.add_argument('--actor_lr', type=float, default=1e-3)
 parser.add_argument('--critic_lr', type=float, default=1e-3)
 parser.add_argument('--model_update_num', type=int, default=10)
 parser.add_argument('--clip_param', type=float, default=0.2)
+parser.add_argument('--target_kl', type=float, default=None,
+                    help='stop the epochs of an update once a minibatch KL exceeds 1.5 * target_kl (default: off)')
 parser.add_argument('--max_iter_num', type=int, default=500)
 parser.add_argument('--total_sample_size', type=int, default=2048)
 parser.add_argument('--log_interval', type=int, default=5)
 parser.add_argument('--goal_score', type=int, default=-300)
 parser.add_argument('--logdir', type=str, default='./logs',
                     help='tensorboardx logs directory')
-args = parser.parse_args()
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+parser.add_argument('--compile', action="store_true", default=False,
+                    help='run the PPO minibatch loss under torch.compile')
+parser.add_argument('--snapshot_dir', type=str, default='./snapshot',
+                    help='directory of the resumable training snapshot (default: ./snapshot)')
+parser.add_argument('--snapshot_interval', type=int, default=0,
+                    help='iterations between training snapshots, 0 to disable (default: 0)')
+parser.add_argument('--resume', action="store_true", default=False,
+                    help='continue from the snapshot in snapshot_dir if there is one')
+Config = config_class(parser, __name__)
 
 def train_model(actor, critic, actor_optimizer, critic_optimizer, 
-                trajectories, state_size, action_size):
+                trajectories, state_size, action_size, args):
     trajectories = np.array(trajectories)
-    states = np.vstack(trajectories[:, 0])
+    states = torch.Tensor(np.vstack(trajectories[:, 0]))
     actions = list(trajectories[:, 1])
     rewards = list(trajectories[:, 2])
     masks = list(trajectories[:, 3])
@@ -44,67 +69,60 @@ def train_model(actor, critic, actor_optimizer, critic_optimizer,
     rewards = torch.Tensor(rewards).squeeze(1)
     masks = torch.Tensor(masks)
 
-    old_values = critic(torch.Tensor(states))
-    returns, advantages = get_gae(rewards, masks, old_values, args)
-
-    mu, std = actor(torch.Tensor(states))
-    old_policy = get_log_prob(actions, mu, std)
-    
-    criterion = torch.nn.MSELoss()
+    with torch.no_grad():
+        old_values = critic(states)
+        with timers('gae'):
+            returns, advantages = get_gae(rewards, masks, old_values, args)
 
-    n = len(states)
-    arr = np.arange(n)
+        mu, std = actor(states)
+        old_policy = get_log_prob(actions, mu, std)
 
-    for _ in range(args.model_update_num):
-        np.random.shuffle(arr)
+    # states and actions are converted once, minibatches only gather rows
+    tensors = [states, actions, returns.unsqueeze(1), advantages.unsqueeze(1), 
+               old_values, old_policy]
 
-        for i in range(n // args.batch_size):
-            mini_batch_index = arr[args.batch_size * i : args.batch_size * (i + 1)]
-            mini_batch_index = torch.LongTensor(mini_batch_index)
-            
-            states_samples = torch.Tensor(states)[mini_batch_index]
-            actions_samples = torch.Tensor(actions)[mini_batch_index]
-            returns_samples = returns.unsqueeze(1)[mini_batch_index]
-            advantages_samples = advantages.unsqueeze(1)[mini_batch_index]
-            old_values_samples = old_values[mini_batch_index].detach()
-            
-            # get critic loss
-            values_samples = critic(states_samples)
-            clipped_values_samples = old_values_samples + \
-                                    torch.clamp(values_samples - old_values_samples,
-                                                -args.clip_param, 
-                                                args.clip_param)
-            
-            critic_loss = criterion(values_samples, returns_samples)
-            clipped_critic_loss = criterion(clipped_values_samples, returns_samples)
-            
-            critic_loss = torch.max(critic_loss, clipped_critic_loss)
+    return ppo_update(ppo_loss, (actor, critic, args.clip_param), tensors, 
+                      [actor_optimizer, critic_optimizer], args.batch_size, 
+                      args.model_update_num, compile=args.compile,
+                      clip_param=args.clip_param, target_kl=args.target_kl)
 
-            # get actor loss
-            actor_loss, ratio = surrogate_loss(actor, advantages_samples, states_samples,
-                                                old_policy.detach(), actions_samples,
-                                                mini_batch_index)
+def ppo_loss(actor, critic, clip_param, states_samples, actions_samples, returns_samples, 
+             advantages_samples, old_values_samples, old_policy_samples):
+    criterion = torch.nn.MSELoss()
 
-            clipped_ratio = torch.clamp(ratio,
-                                        1.0 - args.clip_param,
-                                        1.0 + args.clip_param)
-            clipped_actor_loss = clipped_ratio * advantages_samples
-            
-            actor_loss = -torch.min(actor_loss, clipped_actor_loss).mean()
+    # get critic loss
+    values_samples = critic(states_samples)
+    clipped_values_samples = old_values_samples + \
+                            torch.clamp(values_samples - old_values_samples,
+                                        -clip_param, 
+                                        clip_param)
+    
+    critic_loss = criterion(values_samples, returns_samples)
+    clipped_critic_loss = criterion(clipped_values_samples, returns_samples)
+    
+    critic_loss = torch.max(critic_loss, clipped_critic_loss)
 
-            # update actor & critic 
-            loss = actor_loss + 0.5 * critic_loss
+    # get actor loss
+    actor_loss, ratio = surrogate_loss(actor, advantages_samples, states_samples,
+                                        old_policy_samples, actions_samples)
 
-            critic_optimizer.zero_grad()
-            loss.backward(retain_graph=True) 
-            critic_optimizer.step()
+    clipped_ratio = torch.clamp(ratio,
+                                1.0 - clip_param,
+                                1.0 + clip_param)
+    clipped_actor_loss = clipped_ratio * advantages_samples
+    
+    actor_loss = -torch.min(actor_loss, clipped_actor_loss).mean()
 
-            actor_optimizer.zero_grad()
-            loss.backward()
-            actor_optimizer.step()
+    # update actor & critic with a single backward pass
+    return actor_loss + 0.5 * critic_loss, ratio
             
 
-def main():
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+
     env = gym.make(args.env_name)
     env.seed(500)
     torch.manual_seed(500)
@@ -120,62 +138,39 @@ def main():
     actor_optimizer = optim.Adam(actor.parameters(), lr=args.actor_lr)
     critic_optimizer = optim.Adam(critic.parameters(), lr=args.critic_lr)
 
-    writer = SummaryWriter(args.logdir)
-
-    recent_rewards = deque(maxlen=100)
-    episodes = 0
-
-    for iter in range(args.max_iter_num):
-        trajectories = deque()
-        steps = 0
-
-        while steps < args.total_sample_size: 
-            done = False
-            score = 0
-            episodes += 1
-
-            state = env.reset()
-            state = np.reshape(state, [1, state_size])
+    if args.load_model is not None:
+        actor.load_state_dict(load_checkpoint(os.path.join(args.save_path, args.load_model)))
 
-            while not done:
-                if args.render:
-                    env.render()
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
 
-                steps += 1
+    policy = RolloutPolicy(actor, 'gaussian', (1, state_size))
 
-                mu, std = actor(torch.Tensor(state))
-                action = get_action(mu, std)
-
-                next_state, reward, done, _ = env.step(action)
-                
-                mask = 0 if done else 1
-
-                trajectories.append((state, action, reward, mask))
-
-                next_state = np.reshape(next_state, [1, state_size])
-                state = next_state
-                score += reward
-
-                if done:
-                    recent_rewards.append(score)
+    # epochs run and skipped, approximate KL and clip fraction of the last update
+    update_stats = {}
 
+    def learner(memory):
         actor.train(), critic.train()
-        train_model(actor, critic, actor_optimizer, critic_optimizer, 
-                    trajectories, state_size, action_size)
-        
-        writer.add_scalar('log/score', float(score), episodes)
-        
-        if iter % args.log_interval == 0:
-            print('{} iter | {} episode | score_avg: {:.2f}'.format(iter, episodes, np.mean(recent_rewards)))
-
-        if np.mean(recent_rewards) > args.goal_score:
-            if not os.path.isdir(args.save_path):
-                os.makedirs(args.save_path)
-            
-            ckpt_path = args.save_path + 'model.pth.tar'
-            torch.save(actor.state_dict(), ckpt_path)
-            print('Recent rewards exceed -300. So end')
-            break  
+        update_stats.update(train_model(actor, critic, actor_optimizer, critic_optimizer,
+                                        memory, state_size, action_size, args))
+
+    def save(runner):
+        save_state_dict(actor, args.save_path + 'model.pth.tar')
+
+    collector = EpisodeCollector(env, policy, render=args.render,
+                                 preprocess=lambda state: np.reshape(state, [1, state_size]))
+    goal = GoalCallback(args.goal_score, save=save)
+    snapshot = SnapshotCallback(args.snapshot_dir, args.snapshot_interval,
+                                {'actor': actor, 'critic': critic, 'actor_optimizer': actor_optimizer,
+                                 'critic_optimizer': critic_optimizer}, resume=args.resume)
+    runner = OnPolicyRunner(collector, learner, args.total_sample_size, args.max_iter_num,
+                            callbacks=[snapshot, LogCallback(writer, args.log_interval, lambda: update_stats),
+                                       ProfileCallback(profiler), goal])
+    runner.run()
+    writer.close()
+
+    return {'iterations': runner.iteration + 1, 'episodes': runner.episodes, 'score': runner.score_avg,
+            'solved': goal.reached, 'actor': actor, 'critic': critic}
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    train(parser.parse_args())
\ No newline at end of file
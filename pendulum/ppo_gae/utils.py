@@ -38,11 +38,9 @@ def get_log_prob(actions, mu, std):
 
     return log_prob
 
-def surrogate_loss(actor, advantages, states, old_policy, actions, batch_index):
-    mu, std = actor(torch.Tensor(states))
+def surrogate_loss(actor, advantages, states, old_policy, actions):
+    mu, std = actor(states)
     new_policy = get_log_prob(actions, mu, std)
-    
-    old_policy = old_policy[batch_index]
 
     ratio = torch.exp(new_policy - old_policy)
     surrogate_loss = ratio * advantages
@@ -1,15 +1,26 @@
 import os
-import gym
+import sys
 import argparse
 import numpy as np
-from collections import deque
 
 import torch
 import torch.optim as optim
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.checkpoint import load_checkpoint
+from common.config import config_class
+from common.conjugate_gradient import ConjugateGradient
+from common.critic_fit import fit_critic, value_loss
+from common.metrics import make_writer
+from common.natural_gradient import fisher_diagonal, fisher_solve, use_direct_solver
+from common.profiling import timers, Profiler
+from common.rollout_policy import RolloutPolicy
+from common.runner import (EpisodeCollector, OnPolicyRunner, LogCallback,
+                           ProfileCallback, GoalCallback, save_state_dict)
+from common.snapshot import SnapshotCallback
+
 from utils import *
 from model import Actor, Critic
-from tensorboardX import SummaryWriter
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--env_name', type=str, default="Pendulum-v0")
@@ -19,16 +30,46 @@ parser.add_argument('--render', action="store_true", default=False)
 parser.add_argument('--gamma', type=float, default=0.99)
 parser.add_argument('--hidden_size', type=int, default=64)
 parser.add_argument('--critic_lr', type=float, default=1e-3)
+parser.add_argument('--critic_fit', type=str, default='adam', choices=['adam', 'lbfgs', 'early_stop'],
+                    help='critic update: the usual Adam steps, full-batch L-BFGS or minibatch epochs '
+                         'stopped on a held-out loss (default: adam)')
+parser.add_argument('--critic_fit_iters', type=int, default=20,
+                    help='L-BFGS iterations or early_stop epochs at most (default: 20)')
+parser.add_argument('--batch_size', type=int, default=64,
+                    help='minibatch size of the early_stop critic fit (default: 64)')
 parser.add_argument('--max_kl', type=float, default=1e-2)
+parser.add_argument('--natural_grad_solver', type=str, default='auto', choices=['cg', 'direct', 'auto'],
+                    help='10 conjugate gradient steps, an explicit Fisher matrix and Cholesky, or direct '
+                         'for small actors and batches (default: auto)')
+parser.add_argument('--cg_max_steps', type=int, default=10,
+                    help='conjugate gradient steps per update at most (default: 10)')
+parser.add_argument('--cg_rtol', type=float, default=0.0,
+                    help='stop conjugate gradient once |g - F x| <= cg_rtol |g|, 0 runs all steps (default: 0)')
+parser.add_argument('--cg_warm_start', action="store_true", default=False,
+                    help='start conjugate gradient from the previous update\'s solution')
+parser.add_argument('--cg_preconditioner', type=str, default='none', choices=['none', 'diagonal'],
+                    help='precondition conjugate gradient with the Fisher diagonal (default: none)')
 parser.add_argument('--max_iter_num', type=int, default=1000)
 parser.add_argument('--total_sample_size', type=int, default=2048)
 parser.add_argument('--log_interval', type=int, default=5)
 parser.add_argument('--goal_score', type=int, default=-300)
 parser.add_argument('--logdir', type=str, default='./logs',
                     help='tensorboardx logs directory')
-args = parser.parse_args()
-
-def train_model(actor, critic, critic_optimizer, trajectories):
+parser.add_argument('--log_backend', type=str, default='tensorboard',
+                    help='tensorboard, csv, jsonl or none (comma separated for several)')
+parser.add_argument('--profile', type=str, default='none', choices=['none', 'torch', 'cprofile'],
+                    help='capture a torch.profiler or cProfile trace (default: none)')
+parser.add_argument('--profile_iters', type=int, default=5,
+                    help='number of iterations to profile (default: 5)')
+parser.add_argument('--snapshot_dir', type=str, default='./snapshot',
+                    help='directory of the resumable training snapshot (default: ./snapshot)')
+parser.add_argument('--snapshot_interval', type=int, default=0,
+                    help='iterations between training snapshots, 0 to disable (default: 0)')
+parser.add_argument('--resume', action="store_true", default=False,
+                    help='continue from the snapshot in snapshot_dir if there is one')
+Config = config_class(parser, __name__)
+
+def train_model(actor, critic, critic_optimizer, trajectories, args, cg):
     trajectories = np.array(trajectories)
     states = np.vstack(trajectories[:, 0])
     actions = list(trajectories[:, 1])
@@ -41,7 +82,8 @@ def train_model(actor, critic, critic_optimizer, trajectories):
 
     # ----------------------------
     # step 1: get returns
-    returns = get_returns(rewards, masks, args.gamma)
+    with timers('gae'):
+        returns = get_returns(rewards, masks, args.gamma)
 
     # ----------------------------
     # step 2: update ciritic
@@ -50,10 +92,16 @@ def train_model(actor, critic, critic_optimizer, trajectories):
     values = critic(torch.Tensor(states))
     targets = returns.unsqueeze(1)
 
-    critic_loss = criterion(values, targets)
-    critic_optimizer.zero_grad()
-    critic_loss.backward()
-    critic_optimizer.step()
+    with timers('critic'):
+        if args.critic_fit == 'adam':
+            critic_loss = criterion(values, targets)
+            critic_optimizer.zero_grad()
+            critic_loss.backward()
+            critic_optimizer.step()
+            critic_stats = {'critic_loss': value_loss(critic, torch.Tensor(states), targets)}
+        else:
+            critic_stats = fit_critic(args.critic_fit, critic, critic_optimizer, states, targets,
+                                      args.batch_size, args.critic_fit_iters)
 
     # ----------------------------
     # step 3: get gradient of actor loss
@@ -65,8 +113,14 @@ def train_model(actor, critic, critic_optimizer, trajectories):
     actor_loss_grad = flat_grad(actor_loss_grad)
 
     # ----------------------------
-    # step 4: get search direction through conjugate gradient method
-    search_dir = conjugate_gradient(actor, states, actor_loss_grad.data, nsteps=10)
+    # step 4: get search direction through conjugate gradient method or an
+    # explicit Fisher solve
+    if use_direct_solver(args.natural_grad_solver, actor, states):
+        search_dir = fisher_solve(actor, states, actor_loss_grad.data)
+    else:
+        diagonal = fisher_diagonal(actor, states) if args.cg_preconditioner == 'diagonal' else None
+        search_dir = cg.solve(lambda p: hessian_vector_product(actor, states, p),
+                              actor_loss_grad.data, diagonal)
     
     # ----------------------------
     # step 5: get step size and maximal step
@@ -80,9 +134,15 @@ def train_model(actor, critic, critic_optimizer, trajectories):
 
     new_params = params + maximal_step
     update_model(actor, new_params)
+    return critic_stats
     
 
-def main():
+def train(args=None):
+    # args is a Config or an argparse Namespace with the same fields
+    if args is None:
+        args = Config()
+    import gym
+
     env = gym.make(args.env_name)
     env.seed(500)
     torch.manual_seed(500)
@@ -96,61 +156,41 @@ def main():
     critic = Critic(state_size, args)
     critic_optimizer = optim.Adam(critic.parameters(), lr=args.critic_lr)
 
-    writer = SummaryWriter(args.logdir)
-
-    recent_rewards = deque(maxlen=100)
-    episodes = 0
-
-    for iter in range(args.max_iter_num):
-        trajectories = deque()
-        steps = 0
-
-        while steps < args.total_sample_size:
-            done = False
-            score = 0
-            episodes += 1
-
-            state = env.reset()
-            state = np.reshape(state, [1, state_size])
-
-            while not done:
-                if args.render:
-                    env.render()
+    if args.load_model is not None:
+        actor.load_state_dict(load_checkpoint(os.path.join(args.save_path, args.load_model)))
 
-                steps += 1
+    writer = make_writer(args.logdir, args.log_backend)
+    profiler = Profiler(args.profile, args.profile_iters, args.logdir)
 
-                mu, std = actor(torch.Tensor(state))
-                action = get_action(mu, std)
+    cg = ConjugateGradient(args.cg_max_steps, args.cg_rtol, args.cg_warm_start, writer=writer)
+    policy = RolloutPolicy(actor, 'gaussian', (1, state_size))
 
-                next_state, reward, done, _ = env.step(action)
-                
-                mask = 0 if done else 1
+    # full-batch critic loss after the fit, and the fit's iterations
+    critic_stats = {}
 
-                trajectories.append((state, action, reward, mask))
-                
-                next_state = np.reshape(next_state, [1, state_size])
-                state = next_state
-                score += reward
+    def learner(memory):
+        actor.train(), critic.train()
+        critic_stats.update(train_model(actor, critic, critic_optimizer, memory, args, cg))
+        timers.count('updates')
 
-                if done:
-                    recent_rewards.append(score)
+    def save(runner):
+        save_state_dict(actor, args.save_path + 'model.pth.tar')
 
-        actor.train()
-        train_model(actor, critic, critic_optimizer, trajectories)
-        
-        writer.add_scalar('log/score', float(score), episodes)
-        
-        if iter % args.log_interval == 0:
-            print('{} iter | {} episode | score_avg: {:.2f}'.format(iter, episodes, np.mean(recent_rewards)))
+    collector = EpisodeCollector(env, policy, render=args.render,
+                                 preprocess=lambda state: np.reshape(state, [1, state_size]))
+    goal = GoalCallback(args.goal_score, save=save)
+    objects = {'actor': actor, 'critic': critic, 'critic_optimizer': critic_optimizer}
+    if args.cg_warm_start:
+        objects.update(conjugate_gradient=cg)
+    snapshot = SnapshotCallback(args.snapshot_dir, args.snapshot_interval, objects, resume=args.resume)
+    log = LogCallback(writer, args.log_interval, extra=lambda: dict(cg.stats(), **critic_stats))
+    runner = OnPolicyRunner(collector, learner, args.total_sample_size, args.max_iter_num,
+                            callbacks=[snapshot, log, ProfileCallback(profiler), goal])
+    runner.run()
+    writer.close()
 
-        if np.mean(recent_rewards) > args.goal_score:
-            if not os.path.isdir(args.save_path):
-                os.makedirs(args.save_path)
-            
-            ckpt_path = args.save_path + 'model.pth.tar'
-            torch.save(actor.state_dict(), ckpt_path)
-            print('Recent rewards exceed -300. So end')
-            break  
+    return {'iterations': runner.iteration + 1, 'episodes': runner.episodes, 'score': runner.score_avg,
+            'solved': goal.reached, 'actor': actor, 'critic': critic}
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    train(parser.parse_args())
\ No newline at end of file
@@ -35,32 +35,6 @@ def get_log_prob(actions, mu, std):
     return log_prob
 
 
-# from openai baseline code
-# https://github.com/openai/baselines/blob/master/baselines/common/cg.py
-def conjugate_gradient(actor, states, b, nsteps, residual_tol=1e-10):
-    x = torch.zeros(b.size())
-    r = b.clone()
-    p = b.clone()
-    rdotr = torch.dot(r, r)
-
-    for i in range(nsteps): # nsteps = 10
-        f_Ax = hessian_vector_product(actor, states, p, cg_damping=1e-1)
-        alpha = rdotr / torch.dot(p, f_Ax)
-
-        x += alpha * p
-        r -= alpha * f_Ax
-        
-        new_rdotr = torch.dot(r, r)
-        betta = new_rdotr / rdotr
-
-        p = r + betta * p
-        rdotr = new_rdotr
-        
-        if rdotr < residual_tol: # residual_tol = 0.0000000001
-            break
-
-    return x
-
 def hessian_vector_product(actor, states, p, cg_damping=1e-1):
     p.detach() 
     kl = kl_divergence(new_actor=actor, old_actor=actor, states=states)
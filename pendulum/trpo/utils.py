@@ -38,31 +38,6 @@ def surrogate_loss(actor, values, targets, states, old_policy, actions):
     return surrogate_loss
 
 
-# from openai baseline code
-# https://github.com/openai/baselines/blob/master/baselines/common/cg.py
-def conjugate_gradient(actor, states, b, nsteps, residual_tol=1e-10):
-    x = torch.zeros(b.size())
-    r = b.clone()
-    p = b.clone()
-    rdotr = torch.dot(r, r)
-
-    for i in range(nsteps): # nsteps = 10
-        Ap = hessian_vector_product(actor, states, p, cg_damping=1e-1)
-        alpha = rdotr / torch.dot(p, Ap)
-        
-        x += alpha * p
-        r -= alpha * Ap
-        
-        new_rdotr = torch.dot(r, r)
-        betta = new_rdotr / rdotr
-        
-        p = r + betta * p
-        rdotr = new_rdotr
-        
-        if rdotr < residual_tol: # residual_tol = 0.0000000001
-            break
-    return x
-
 def hessian_vector_product(actor, states, p, cg_damping=1e-1):
     p.detach() 
     kl = kl_divergence(new_actor=actor, old_actor=actor, states=states)